@@ -0,0 +1,304 @@
+"""Columnar analytics for the admin dashboard.
+
+Orders and order items are read page by page and each page is folded straight
+into NumPy columns, so only one page of row dicts is alive at a time. Every
+metric is then a vectorised group-by (``bincount`` / ``unique`` /
+``reduceat``) over those columns:
+
+* ``revenue_series`` — revenue and order count per hour/day/week/month bucket
+* ``top_products``   — quantity and revenue per product
+* ``peak_hours``     — orders per local hour of day
+* ``rfm``            — recency / frequency / monetary scores and segments
+* ``cohorts``        — monthly acquisition cohorts and their retention
+
+All calendar maths happens in a real ``zoneinfo`` timezone, so hours and days
+are local wall-clock time (DST included) rather than a fixed offset.
+"""
+from datetime import datetime, timezone
+from operator import itemgetter
+from typing import Iterable, Optional
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+BUCKETS = ("hour", "day", "week", "month")
+MAX_BUCKETS = 2000                        # longest revenue series one request may build
+CANCELLED = "cancelled"
+
+_ID, _ORDER_ID, _PRODUCT_ID = itemgetter("id"), itemgetter("order_id"), itemgetter("product_id")
+
+
+# ── Loading ────────────────────────────────────────────────────────────────────
+
+def _parse_timestamps(values: list) -> np.ndarray:
+    """ISO-8601 strings -> int64 epoch seconds (UTC)."""
+    if not values:
+        return np.zeros(0, dtype=np.int64)
+    # Supabase returns timestamptz in UTC; strip the offset and let NumPy parse
+    # the whole page at once. Anything else goes through fromisoformat.
+    if all(v and (v.endswith("+00:00") or v.endswith("Z")) for v in values):
+        naive = [v[:-6] if v.endswith("+00:00") else v[:-1] for v in values]
+        return np.array(naive, dtype="datetime64[s]").astype(np.int64)
+    out = np.empty(len(values), dtype=np.int64)
+    for i, v in enumerate(values):
+        try:
+            dt = datetime.fromisoformat((v or "").replace("Z", "+00:00"))
+        except ValueError:
+            out[i] = 0
+            continue
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        out[i] = int(dt.timestamp())
+    return out
+
+
+class OrderColumns:
+    """One array per order attribute; customers are factorised to int codes."""
+
+    def __init__(self, pages: Iterable[list]):
+        self.index: dict = {}              # order id -> row number
+        self.emails: list = []             # customer code -> email
+        email_codes: dict = {}
+        totals, created, cancelled, customers = [], [], [], []
+        for page in pages:
+            if not page:
+                continue
+            base = len(self.index)
+            self.index.update(zip(map(_ID, page), range(base, base + len(page))))
+            totals.append(np.array([r.get("total") or 0 for r in page], dtype=np.float64))
+            created.append(_parse_timestamps([r.get("created_at") or "" for r in page]))
+            cancelled.append(np.array([r.get("status") == CANCELLED for r in page], dtype=np.bool_))
+            emails = [r.get("customer_email") or "" for r in page]
+            for email in emails:
+                if email not in email_codes:
+                    email_codes[email] = len(self.emails)
+                    self.emails.append(email)
+            customers.append(np.array([email_codes[e] for e in emails], dtype=np.int32))
+        self.total = np.concatenate(totals) if totals else np.zeros(0)
+        self.created = np.concatenate(created) if created else np.zeros(0, dtype=np.int64)
+        self.cancelled = np.concatenate(cancelled) if cancelled else np.zeros(0, dtype=np.bool_)
+        self.customer = np.concatenate(customers) if customers else np.zeros(0, dtype=np.int32)
+        self._local: dict = {}
+
+    def local_created(self, tz: ZoneInfo) -> np.ndarray:
+        """``created`` as local wall-clock seconds in `tz` (computed once per zone)."""
+        key = str(tz)
+        if key not in self._local:
+            self._local[key] = local_seconds(self.created, tz)
+        return self._local[key]
+
+    def __len__(self) -> int:
+        return len(self.total)
+
+    def mask(self, start: Optional[int] = None, end: Optional[int] = None, include_cancelled: bool = False) -> np.ndarray:
+        m = np.ones(len(self), dtype=np.bool_) if include_cancelled else ~self.cancelled
+        if start is not None:
+            m &= self.created >= start
+        if end is not None:
+            m &= self.created < end
+        return m
+
+
+class ItemColumns:
+    """Order lines joined to ``OrderColumns`` rows; lines of unknown orders are dropped."""
+
+    def __init__(self, pages: Iterable[list], orders: OrderColumns):
+        order_rows, products, qty, price = [], [], [], []
+        for page in pages:
+            if not page:
+                continue
+            index = orders.index
+            rows = np.array([index.get(oid, -1) for oid in map(_ORDER_ID, page)], dtype=np.int64)
+            keep = rows >= 0
+            order_rows.append(rows[keep])
+            products.append(np.array(list(map(_PRODUCT_ID, page)), dtype=np.int64)[keep])
+            qty.append(np.array([r.get("quantity") or 1 for r in page], dtype=np.int64)[keep])
+            price.append(np.array([r.get("price") or 0 for r in page], dtype=np.float64)[keep])
+        self.order_row = np.concatenate(order_rows) if order_rows else np.zeros(0, dtype=np.int64)
+        self.product_id = np.concatenate(products) if products else np.zeros(0, dtype=np.int64)
+        self.quantity = np.concatenate(qty) if qty else np.zeros(0, dtype=np.int64)
+        self.price = np.concatenate(price) if price else np.zeros(0)
+
+    def __len__(self) -> int:
+        return len(self.order_row)
+
+
+# ── Calendar helpers ───────────────────────────────────────────────────────────
+
+def local_seconds(ts: np.ndarray, tz: ZoneInfo) -> np.ndarray:
+    """UTC epoch seconds -> local wall-clock seconds, honouring DST transitions."""
+    if len(ts) == 0:
+        return ts
+    # Offsets only change on hour boundaries, so resolve one offset per distinct hour.
+    hours, inverse = np.unique(ts // 3600, return_inverse=True)
+    offsets = np.fromiter(
+        (datetime.fromtimestamp(int(h) * 3600, tz).utcoffset().total_seconds() for h in hours),
+        np.int64, len(hours),
+    )
+    return ts + offsets[inverse]
+
+
+def bucket_ids(local: np.ndarray, bucket: str) -> np.ndarray:
+    days = local // 86400
+    if bucket == "hour":
+        return local // 3600
+    if bucket == "day":
+        return days
+    if bucket == "week":
+        return (days + 3) // 7            # 1970-01-01 was a Thursday; weeks start Monday
+    if bucket == "month":
+        return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+
+
+def bucket_label(bucket_id: int, bucket: str) -> str:
+    if bucket == "hour":
+        return str(np.datetime64(int(bucket_id), "h"))[:13] + ":00"
+    if bucket == "day":
+        return str(np.datetime64(int(bucket_id), "D"))
+    if bucket == "week":
+        return str(np.datetime64(int(bucket_id) * 7 - 3, "D"))
+    return str(np.datetime64(int(bucket_id), "M"))
+
+
+def _bucket_span(start: int, end: int, bucket: str, tz: ZoneInfo) -> tuple:
+    """(first bucket id, number of buckets) covering [start, end)."""
+    first = int(bucket_ids(local_seconds(np.array([start]), tz), bucket)[0])
+    last = int(bucket_ids(local_seconds(np.array([max(start, end - 1)]), tz), bucket)[0])
+    return first, last - first + 1
+
+
+def fit_bucket(start: int, end: int, bucket: str, tz: ZoneInfo) -> Optional[str]:
+    """`bucket`, or the next coarser one, whose series over [start, end) has at most
+    ``MAX_BUCKETS`` points; None if even months are too many."""
+    for b in BUCKETS[BUCKETS.index(bucket):]:
+        if _bucket_span(start, end, b, tz)[1] <= MAX_BUCKETS:
+            return b
+    return None
+
+
+# ── Metrics ────────────────────────────────────────────────────────────────────
+
+def revenue_series(orders: OrderColumns, start: int, end: int, bucket: str, tz: ZoneInfo) -> list:
+    """Revenue and order count per bucket over [start, end), empty buckets included."""
+    m = orders.mask(start, end)
+    first, n = _bucket_span(start, end, bucket, tz)
+    b = bucket_ids(orders.local_created(tz)[m], bucket) - first
+    revenue = np.bincount(b, weights=orders.total[m], minlength=n)[:n]
+    counts = np.bincount(b, minlength=n)[:n]
+    return [
+        {"date": bucket_label(first + i, bucket), "revenue": round(float(revenue[i]), 2), "orders": int(counts[i])}
+        for i in range(n)
+    ]
+
+
+def top_products(items: ItemColumns, order_mask: np.ndarray, k: int = 10) -> list:
+    """[(product_id, qty, revenue)] for the k highest-revenue products."""
+    keep = order_mask[items.order_row]
+    if not keep.any():
+        return []
+    ids, inverse = np.unique(items.product_id[keep], return_inverse=True)
+    qty = items.quantity[keep]
+    qty_total = np.bincount(inverse, weights=qty)
+    revenue = np.bincount(inverse, weights=qty * items.price[keep])
+    top = np.argsort(-revenue, kind="stable")[:k]
+    return [(int(ids[i]), int(qty_total[i]), round(float(revenue[i]), 2)) for i in top]
+
+
+def peak_hours(orders: OrderColumns, order_mask: np.ndarray, tz: ZoneInfo) -> list:
+    hours = (orders.local_created(tz)[order_mask] // 3600) % 24
+    counts = np.bincount(hours, minlength=24)
+    return [{"hour": h, "count": int(counts[h])} for h in range(24)]
+
+
+def _per_customer(orders: OrderColumns, order_mask: np.ndarray):
+    """Sort the selected orders by customer; returns (customers, run starts, sorted ts, sorted totals)."""
+    cust = orders.customer[order_mask]
+    order = np.argsort(cust, kind="stable")
+    cust = cust[order]
+    starts = np.flatnonzero(np.r_[True, cust[1:] != cust[:-1]]) if len(cust) else np.zeros(0, dtype=np.int64)
+    return cust[starts], starts, orders.created[order_mask][order], orders.total[order_mask][order]
+
+
+def _quintile(values: np.ndarray) -> np.ndarray:
+    """Score 1-5 by rank; ties share the lower rank."""
+    if len(values) == 0:
+        return np.zeros(0, dtype=np.int64)
+    ranks = np.searchsorted(np.sort(values), values, side="left")
+    return 1 + (ranks * 5) // len(values)
+
+
+RFM_SEGMENTS = (
+    # (name, R range, F range) — first match wins
+    ("champions",   (4, 5), (4, 5)),
+    ("loyal",       (3, 5), (3, 5)),
+    ("new",         (4, 5), (1, 2)),
+    ("at_risk",     (1, 2), (3, 5)),
+    ("hibernating", (1, 2), (1, 2)),
+)
+
+
+def rfm(orders: OrderColumns, order_mask: np.ndarray, now: int, top: int = 10) -> dict:
+    customers, starts, ts, totals = _per_customer(orders, order_mask)
+    if len(customers) == 0:
+        return {"customers": 0, "segments": {}, "top_customers": []}
+    frequency = np.diff(np.r_[starts, len(ts)])
+    monetary = np.add.reduceat(totals, starts)
+    recency_days = (now - np.maximum.reduceat(ts, starts)) / 86400
+    r = 6 - _quintile(recency_days)           # most recent -> 5
+    f = _quintile(frequency)
+    m = _quintile(monetary)
+    segment = np.full(len(customers), "other", dtype=object)
+    assigned = np.zeros(len(customers), dtype=np.bool_)
+    for name, (rlo, rhi), (flo, fhi) in RFM_SEGMENTS:
+        hit = ~assigned & (r >= rlo) & (r <= rhi) & (f >= flo) & (f <= fhi)
+        segment[hit] = name
+        assigned |= hit
+    names, counts = np.unique(segment.astype(str), return_counts=True)
+    best = np.argsort(-monetary, kind="stable")[:top]
+    return {
+        "customers": int(len(customers)),
+        "avg_recency_days": round(float(recency_days.mean()), 1),
+        "avg_frequency": round(float(frequency.mean()), 2),
+        "avg_monetary": round(float(monetary.mean()), 2),
+        "segments": {str(n): int(c) for n, c in zip(names, counts)},
+        "top_customers": [
+            {
+                "email": orders.emails[customers[i]],
+                "recency_days": round(float(recency_days[i]), 1),
+                "frequency": int(frequency[i]),
+                "monetary": round(float(monetary[i]), 2),
+                "score": f"{r[i]}{f[i]}{m[i]}",
+            }
+            for i in best
+        ],
+    }
+
+
+def cohorts(orders: OrderColumns, order_mask: np.ndarray, tz: ZoneInfo) -> list:
+    """Monthly cohorts by first order; retention[i] = customers ordering i months later."""
+    cust = orders.customer[order_mask]
+    if len(cust) == 0:
+        return []
+    month = bucket_ids(orders.local_created(tz)[order_mask], "month")
+    first = np.full(len(orders.emails), np.iinfo(np.int64).max)
+    np.minimum.at(first, cust, month)
+    cohort = first[cust]
+    offset = month - cohort
+    # Distinct (customer, months-since-first) pairs, then count them per (cohort, offset)
+    span = int(offset.max()) + 1
+    pairs = np.unique(cust.astype(np.int64) * span + offset)
+    pair_cust, pair_offset = pairs // span, pairs % span
+    pair_cohort = first[pair_cust]
+    cohort_ids, cohort_idx = np.unique(pair_cohort, return_inverse=True)
+    grid = np.zeros((len(cohort_ids), span), dtype=np.int64)
+    np.add.at(grid, (cohort_idx, pair_offset), 1)
+    last_month = int(month.max())
+    return [
+        {
+            "cohort": bucket_label(int(c), "month"),
+            "size": int(grid[i, 0]),
+            "retention": [int(x) for x in grid[i, : last_month - int(c) + 1]],
+        }
+        for i, c in enumerate(cohort_ids)
+    ]
@@ -0,0 +1,135 @@
+"""Benchmark: columnar analytics vs. the old list-of-dicts aggregation.
+
+Synthetic orders and order lines are produced page by page, the way
+``iter_pages`` reads them from PostgREST. The legacy path materialises every
+row as a dict before aggregating (what ``admin_analytics`` used to do); the
+columnar path folds each page into NumPy arrays as it arrives.
+
+    python benchmarks/bench_analytics.py --items 1000000
+
+Reports wall time and peak traced memory for each path. Producing the
+synthetic rows costs the same for both paths, so it is measured on its own
+("generate") and subtracted to give the aggregation time ("net").
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import analytics  # noqa: E402
+
+STATUSES = ["confirmed", "preparing", "out_for_delivery", "delivered", "cancelled"]
+PAGE = 1000
+
+
+def order_pages(n_orders: int, seed: int = 7):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    span = 2 * 365 * 86400
+    for base in range(0, n_orders, PAGE):
+        yield [
+            {
+                "id": f"FLR{i:08X}",
+                "customer_email": f"customer{rng.randrange(n_orders // 4 + 1)}@example.com",
+                "total": round(rng.uniform(15, 400), 2),
+                "status": rng.choice(STATUSES),
+                "created_at": (start + timedelta(seconds=rng.randrange(span))).isoformat(),
+            }
+            for i in range(base, min(base + PAGE, n_orders))
+        ]
+
+
+def item_pages(n_items: int, n_orders: int, seed: int = 11):
+    rng = random.Random(seed)
+    for base in range(0, n_items, PAGE):
+        yield [
+            {
+                "id": i,
+                "order_id": f"FLR{rng.randrange(n_orders):08X}",
+                "product_id": rng.randrange(1, 101),
+                "name": "Product",
+                "quantity": rng.randint(1, 4),
+                "price": round(rng.uniform(15, 150), 2),
+            }
+            for i in range(base, min(base + PAGE, n_items))
+        ]
+
+
+def legacy(n_orders: int, n_items: int):
+    all_orders = [row for page in order_pages(n_orders) for row in page]
+    all_items = [row for page in item_pages(n_items, n_orders) for row in page]
+    revenue_by_day: dict = {}
+    for o in all_orders:
+        if o["status"] != "cancelled":
+            day = o["created_at"][:10]
+            revenue_by_day[day] = revenue_by_day.get(day, 0) + o["total"]
+    product_totals: dict = {}
+    for item in all_items:
+        t = product_totals.setdefault(item["product_id"], {"qty": 0, "revenue": 0.0})
+        t["qty"] += item["quantity"]
+        t["revenue"] += item["price"] * item["quantity"]
+    top = sorted(product_totals.values(), key=lambda x: x["revenue"], reverse=True)[:10]
+    hours = Counter()
+    for o in all_orders:
+        dt = datetime.fromisoformat(o["created_at"])
+        hours[(dt.hour + 5) % 24] += 1
+    return len(revenue_by_day), top, hours
+
+
+def generate(n_orders: int, n_items: int):
+    for _ in order_pages(n_orders):
+        pass
+    for _ in item_pages(n_items, n_orders):
+        pass
+
+
+def columnar(n_orders: int, n_items: int):
+    tz = ZoneInfo("Asia/Kolkata")
+    orders = analytics.OrderColumns(order_pages(n_orders))
+    items = analytics.ItemColumns(item_pages(n_items, n_orders), orders)
+    selected = orders.mask()
+    start, end = int(orders.created.min()), int(orders.created.max()) + 1
+    series = analytics.revenue_series(orders, start, end, "day", tz)
+    top = analytics.top_products(items, selected, 10)
+    peaks = analytics.peak_hours(orders, selected, tz)
+    segments = analytics.rfm(orders, selected, end)
+    cohort_rows = analytics.cohorts(orders, selected, tz)
+    return len(series), top, peaks, segments["segments"], len(cohort_rows)
+
+
+def measure(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1_000_000, help="order lines to generate")
+    parser.add_argument("--lines-per-order", type=float, default=2.5)
+    parser.add_argument("--skip-legacy", action="store_true", help="only run the columnar path")
+    args = parser.parse_args()
+    n_orders = max(1, int(args.items / args.lines_per_order))
+    print(f"{n_orders:,} orders, {args.items:,} order lines\n")
+    print(f"{'path':<10} {'time (s)':>10} {'net (s)':>10} {'peak MiB':>10}")
+    baseline, peak = measure(generate, n_orders, args.items)
+    print(f"{'generate':<10} {baseline:>10.2f} {'':>10} {peak / 2**20:>10.1f}")
+    paths = [("columnar", columnar)] if args.skip_legacy else [("legacy", legacy), ("columnar", columnar)]
+    for name, fn in paths:
+        elapsed, peak = measure(fn, n_orders, args.items)
+        print(f"{name:<10} {elapsed:>10.2f} {elapsed - baseline:>10.2f} {peak / 2**20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
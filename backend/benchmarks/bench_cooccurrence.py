@@ -0,0 +1,94 @@
+"""Benchmark: building the co-occurrence model and looking up neighbours.
+
+Synthetic order lines arrive page by page the way ``iter_pages`` reads them.
+Baskets have structure so neighbours mean something: each order draws most of
+its products from one of ``--groups`` related groups.
+
+    python benchmarks/bench_cooccurrence.py --items 1000000 --products 500
+
+Reports the generation time, the build time (excluding generation), the saved
+file size, and lookup latency percentiles for baskets of 1–4 products.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cooccurrence  # noqa: E402
+
+PAGE = 1000
+
+
+def item_pages(n_items: int, n_products: int, groups: int, lines_per_order: float, seed: int = 5):
+    rng = random.Random(seed)
+    size = max(1, n_products // groups)
+    order, left, group = 0, 0, 0
+    for base in range(0, n_items, PAGE):
+        page = []
+        for _ in range(min(PAGE, n_items - base)):
+            if left == 0:
+                order += 1
+                left = max(1, round(rng.expovariate(1 / lines_per_order)))
+                group = rng.randrange(groups)
+            left -= 1
+            if rng.random() < 0.8:
+                pid = 1 + group * size + rng.randrange(size)
+            else:
+                pid = 1 + rng.randrange(n_products)
+            page.append({"order_id": f"FLR{order:08X}", "product_id": pid})
+        yield page
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1_000_000, help="order lines to generate")
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--groups", type=int, default=25)
+    parser.add_argument("--lines-per-order", type=float, default=2.5)
+    parser.add_argument("--top-n", type=int, default=cooccurrence.DEFAULT_TOP_N)
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+    gen = (args.items, args.products, args.groups, args.lines_per_order)
+
+    t0 = time.perf_counter()
+    for _ in item_pages(*gen):
+        pass
+    generate = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    model = cooccurrence.build(item_pages(*gen), top_n=args.top_n)
+    build = time.perf_counter() - t0 - generate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cooccurrence.npz")
+        cooccurrence.save(model, path)
+        size = os.path.getsize(path)
+        loaded = cooccurrence.CooccurrenceModel(path)
+        t0 = time.perf_counter()
+        loaded.reload_if_changed()
+        load = time.perf_counter() - t0
+
+    rng = random.Random(9)
+    latencies = []
+    for _ in range(args.lookups):
+        basket = [1 + rng.randrange(args.products) for _ in range(rng.randint(1, 4))]
+        t0 = time.perf_counter()
+        loaded.neighbours(basket, 6)
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1e6
+
+    print(f"order lines  {args.items:,}  orders {int(model['orders']):,}  products {len(model['products']):,}")
+    print(f"generate     {generate:7.2f}s")
+    print(f"build        {build:7.2f}s (net of generation)")
+    print(f"file         {size / 1024:7.1f} KB ({len(model['neighbours']):,} neighbour entries), loaded in {load * 1000:.1f} ms")
+    print(f"lookup       p50 {pct(50):.1f} us  p99 {pct(99):.1f} us  over {args.lookups:,} baskets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Benchmark: the hot API endpoints end to end, against in-process fakes.
+
+The module-level ``supabase`` / ``asupabase`` clients, ``_twilio`` and
+``_resend_lib`` are swapped for the stand-ins in ``fake_supabase.py`` (every
+PostgREST call sleeps ``--latency`` plus up to ``--jitter``; every SMS, WhatsApp
+message or email ``--send-latency``), the tables are seeded with ``--orders``
+orders from ``--customers`` customers, and the app is started with its normal
+startup hooks in a throwaway DATA_DIR. Each scenario is then driven through the
+ASGI app by ``--concurrency`` clients until ``--requests`` requests have been
+made.
+
+    python benchmarks/bench_endpoints.py --requests 200 --concurrency 16 --latency 0.02
+
+Reports throughput, p50/p99 latency and mean Supabase queries per request (the
+``X-DB-Queries`` header) per scenario. ``--save FILE`` writes the results as
+JSON; ``--compare FILE`` prints the change against a saved run, so a
+regression in latency or query count shows up before it ships.
+
+Reminders run one request at a time with ``reminder_logs`` cleared first, so
+each request sends the full batch rather than finding it already sent.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_supabase import FakeResend, FakeSupabase, FakeTwilio, seed  # noqa: E402
+
+SCENARIOS = ["create_order", "user_orders", "admin_orders", "admin_customers", "admin_stats",
+             "admin_analytics", "recommendations", "reminders"]
+
+
+def load_app(args, db: FakeSupabase):
+    """Import main against the fakes (before its startup hooks run)."""
+    os.environ["DATA_DIR"] = args.data_dir or tempfile.mkdtemp(prefix="bench-endpoints-")
+    os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+    os.environ.setdefault("SUPABASE_KEY", "bench")
+    os.environ["TWILIO_RATE_PER_SECOND"] = str(args.twilio_rate)
+    os.environ["TWILIO_BURST"] = str(args.twilio_rate)
+    import main
+    from instrumentation import instrument
+    from twilio_dispatch import SDKTransport
+
+    async def acreate_client(*_, **__):
+        return db.async_view()
+
+    main.supabase = instrument(db)
+    main.acreate_client = acreate_client
+    main.ledger.client = main.supabase
+    main._twilio = FakeTwilio(args.send_latency)
+    main.twilio_dispatcher.transport = SDKTransport(main._twilio)
+    main._resend_lib = FakeResend(args.send_latency)
+    main._resend_api_key = "bench"
+    return main
+
+
+def order_body(rng: random.Random, emails: list, product_ids: list) -> dict:
+    items = [{"productId": pid, "name": "Bouquet", "price": 499.0, "quantity": rng.randint(1, 3)}
+             for pid in rng.sample(product_ids, rng.randint(1, 3))]
+    return {
+        "items": items,
+        "total": sum(i["price"] * i["quantity"] for i in items),
+        "customer": {"email": rng.choice(emails), "name": "Bench Customer", "phone": "+919800000000",
+                     "address": "12 Main Road", "city": rng.choice(["Mumbai", "Pune", "Delhi"]),
+                     "state": "MH", "zip": "400001"},
+        "payment_method": "cod",
+    }
+
+
+def requests_for(name: str, rng: random.Random, emails: list, product_ids: list, token: str):
+    """(method, url, params, json) for one request of scenario `name`."""
+    admin = {"token": token}
+    return {
+        "create_order": lambda: ("POST", "/api/orders", None, order_body(rng, emails, product_ids)),
+        "user_orders": lambda: ("GET", "/api/orders", {"email": rng.choice(emails)}, None),
+        "admin_orders": lambda: ("GET", "/api/admin/orders", admin, None),
+        "admin_customers": lambda: ("GET", "/api/admin/customers", admin, None),
+        "admin_stats": lambda: ("GET", "/api/admin/stats", admin, None),
+        "admin_analytics": lambda: ("GET", "/api/admin/analytics", admin, None),
+        "recommendations": lambda: ("GET", "/api/recommendations", {"email": rng.choice(emails)}, None),
+        "reminders": lambda: ("POST", "/api/reminders/send", None, None),
+    }[name]
+
+
+def percentile(ordered: list, p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+
+async def drive(client, name: str, make, total: int, concurrency: int, before=None) -> dict:
+    latencies, queries, errors = [], [], []
+    issued = 0
+
+    async def worker():
+        nonlocal issued
+        while issued < total:
+            issued += 1
+            if before:
+                before()
+            method, url, params, body = make()
+            t0 = time.perf_counter()
+            r = await client.request(method, url, params=params, json=body)
+            latencies.append(time.perf_counter() - t0)
+            queries.append(int(r.headers.get("x-db-queries", 0)))
+            if r.status_code >= 400:
+                errors.append(f"{r.status_code} {r.text[:120]}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    if errors:
+        print(f"  {name}: {len(errors)} errors, first: {errors[0]}")
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "queries": round(sum(queries) / len(queries), 1) if queries else 0.0,
+    }
+
+
+def print_results(results: dict, baseline: dict):
+    print(f"{'scenario':<16} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'queries':>8}  errors")
+    for name, r in results.items():
+        print(f"{name:<16} {r['rps']:8.1f} {r['p50_ms']:9.1f} {r['p99_ms']:9.1f} {r['queries']:8.1f}  {r['errors']}")
+        old = baseline.get(name)
+        if old:
+            change = lambda key: f"{(r[key] - old[key]) / old[key] * 100:+.0f}%" if old[key] else "n/a"  # noqa: E731
+            print(f"{'  vs baseline':<16} {change('rps'):>8} {change('p50_ms'):>9} {change('p99_ms'):>9} "
+                  f"{r['queries'] - old['queries']:+8.1f}")
+
+
+async def run(args):
+    db = FakeSupabase(args.latency, args.jitter)
+    main = load_app(args, db)
+    data = seed(db, args.customers, args.orders, [p["id"] for p in main.PRODUCTS])
+    product_ids = [p["id"] for p in main.PRODUCTS if p.get("inStock", True)]
+    token = secrets.token_urlsafe(32)
+    main.sessions.set(token, {"email": data["admin_email"], "is_admin": True, "role_expires": time.time() + 86400})
+
+    import httpx
+    rng = random.Random(args.seed)
+    results = {}
+    async with main.app.router.lifespan_context(main.app):
+        main.outbox.stop()  # confirmation emails are queued, not sent; the bench measures the request path
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for name in args.scenarios:
+                make = requests_for(name, rng, data["emails"], product_ids, token)
+                if name == "reminders":
+                    clear = lambda: db.tables["reminder_logs"].clear()  # noqa: E731
+                    results[name] = await drive(client, name, make, max(1, args.requests // 20), 1, clear)
+                else:
+                    results[name] = await drive(client, name, make, args.requests, args.concurrency)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per Supabase call")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--send-latency", type=float, default=0.05, help="seconds per SMS/WhatsApp/email")
+    parser.add_argument("--twilio-rate", type=float, default=1000.0, help="dispatcher messages per second")
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--data-dir", help="DATA_DIR for the app (default: a new temporary directory)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="print the change against saved results")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print(f"\nlatency={args.latency}s jitter={args.jitter}s concurrency={args.concurrency} "
+          f"requests={args.requests} orders={args.orders}")
+    print_results(results, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k not in ("save", "compare")},
+                       "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Benchmark: review photo processing, in the request thread vs the process pool.
+
+Generates phone-sized JPEGs (with EXIF) and runs them through
+``review_photos.process`` one after another — what decoding in the request
+thread amounted to — and then through ``PhotoPipeline`` concurrently.
+
+    python benchmarks/bench_review_photos.py --photos 24 --size 4032x3024
+
+Reports photos per second for both, and input vs output bytes per photo.
+"""
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import review_photos  # noqa: E402
+
+
+def make_jpeg(width: int, height: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    # Noise at low resolution, scaled up: compresses like a photo rather than a flat fill
+    small = Image.frombytes("RGB", (width // 16, height // 16), rng.randbytes(width // 16 * height // 16 * 3))
+    img = small.resize((width, height), Image.BILINEAR)
+    exif = Image.Exif()
+    exif[0x010F] = "Benchmark Phone"
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=90, exif=exif)
+    return out.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--photos", type=int, default=24)
+    parser.add_argument("--size", default="4032x3024", help="WIDTHxHEIGHT of the generated photos")
+    parser.add_argument("--workers", type=int, default=None, help="pool size (default: one per CPU)")
+    args = parser.parse_args()
+    width, height = map(int, args.size.split("x"))
+    photos = [make_jpeg(width, height, i) for i in range(args.photos)]
+
+    t0 = time.perf_counter()
+    serial = [review_photos.process(p) for p in photos]
+    serial_s = time.perf_counter() - t0
+
+    pipeline = review_photos.PhotoPipeline(args.workers)
+    asyncio.run(pipeline.process_many(photos[:1]))  # start the workers outside the timing
+    t0 = time.perf_counter()
+    asyncio.run(pipeline.process_many(photos))
+    pool_s = time.perf_counter() - t0
+    pipeline.shutdown()
+
+    avg = lambda xs: sum(xs) / len(xs) / 1024  # noqa: E731
+    print(f"photos       {args.photos} x {width}x{height}, pool of {args.workers or os.cpu_count()}")
+    print(f"serial       {args.photos / serial_s:7.1f} photos/s")
+    print(f"pool         {args.photos / pool_s:7.1f} photos/s")
+    print(f"bytes/photo  in {avg([len(p) for p in photos]):.0f} KB -> full {avg([len(r['full']) for r in serial]):.0f} KB,"
+          f" thumb {avg([len(r['thumb']) for r in serial]):.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
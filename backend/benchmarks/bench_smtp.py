@@ -0,0 +1,65 @@
+"""Benchmark: pooled SMTP connections vs. a fresh login per message.
+
+Both paths send the same messages to the local stand-in server, which sleeps
+``--connect-delay`` before its greeting and ``--auth-delay`` before accepting
+AUTH to mimic the TLS handshake and login of a real provider.
+
+    python benchmarks/bench_smtp.py --messages 200 --threads 4
+
+Reports wall time, messages per second and how many logins each path needed.
+"""
+import argparse
+import os
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mailer import SMTPPool  # noqa: E402
+from smtp_stub import SMTPStub  # noqa: E402
+
+MESSAGE = "Subject: Your order is confirmed\r\nFrom: shop@example.com\r\n\r\nThanks for your order!\r\n"
+
+
+def per_message(stub: SMTPStub, n: int, threads: int):
+    def send(i):
+        with smtplib.SMTP(stub.host, stub.port, timeout=10) as server:
+            server.login("user", "secret")
+            server.sendmail("shop@example.com", f"customer{i}@example.com", MESSAGE)
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(send, range(n)))
+
+
+def pooled(stub: SMTPStub, n: int, threads: int):
+    pool = SMTPPool(stub.host, stub.port, "user", "secret", size=threads, use_ssl=False)
+    with ThreadPoolExecutor(threads) as ex:
+        list(ex.map(lambda i: pool.send("shop@example.com", f"customer{i}@example.com", MESSAGE), range(n)))
+    pool.close()
+    return pool.stats()
+
+
+def run(name, fn, args):
+    with SMTPStub(connect_delay=args.connect_delay, auth_delay=args.auth_delay) as stub:
+        t0 = time.perf_counter()
+        extra = fn(stub, args.messages, args.threads)
+        elapsed = time.perf_counter() - t0
+        assert len(stub.messages) == args.messages
+        print(f"{name:<12} {elapsed:7.2f}s  {args.messages / elapsed:8.1f} msg/s  logins={stub.logins}")
+        if extra:
+            print(f"{'':<12} {extra}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--connect-delay", type=float, default=0.1)
+    parser.add_argument("--auth-delay", type=float, default=0.1)
+    args = parser.parse_args()
+    run("per-message", per_message, args)
+    run("pooled", pooled, args)
+
+
+if __name__ == "__main__":
+    main()
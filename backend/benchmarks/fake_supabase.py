@@ -0,0 +1,427 @@
+"""In-process stand-ins for Supabase, Twilio and Resend, for benchmarks.
+
+``FakeSupabase`` keeps tables as lists of dicts and implements the parts of the
+PostgREST query builder ``main.py`` uses: ``select`` (with ``count="exact"`` and
+``head``), ``eq``/``neq``/``gt``/``gte``/``lt``/``lte``/``in_``/``like``/``ilike``,
+``not_``, ``or_`` (including nested ``and(...)``), ``order``, ``limit``, ``range``,
+``insert``/``update``/``upsert``/``delete``, plus the ``commit_order`` and
+``apply_loyalty_points`` RPCs. ``execute()`` sleeps ``latency`` seconds (plus
+up to ``jitter``) to stand in for the PostgREST round trip; ``async_view()``
+returns a client over the same tables that awaits instead of sleeping.
+
+``FakeTwilio`` and ``FakeResend`` accept every message after ``latency``.
+``seed`` fills the tables with a realistic catalog of users, orders, items,
+reminder logs and loyalty accounts.
+"""
+import asyncio
+import itertools
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+
+class Result:
+    def __init__(self, data, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _coerce(value, like):
+    """A filter value (often a string from a PostgREST expression) as the type of the column value `like`."""
+    if isinstance(like, bool):
+        return value if isinstance(value, bool) else str(value).lower() == "true"
+    if isinstance(like, (int, float)) and isinstance(value, str):
+        try:
+            return type(like)(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _compare(op: str, actual, expected) -> bool:
+    if op == "is":
+        return actual is None if str(expected).lower() == "null" else actual == _coerce(expected, True)
+    if actual is None:
+        return op == "neq" and expected is not None
+    expected = _coerce(expected, actual)
+    try:
+        return {
+            "eq": actual == expected, "neq": actual != expected,
+            "gt": actual > expected, "gte": actual >= expected,
+            "lt": actual < expected, "lte": actual <= expected,
+        }[op]
+    except TypeError:
+        return False
+
+
+def _like(pattern: str, case: bool):
+    regex = "^" + ".*".join(re.escape(part) for part in pattern.split("%")) + "$"
+    return re.compile(regex, 0 if case else re.IGNORECASE)
+
+
+def _split(expr: str) -> list:
+    """Top-level comma-separated parts of a PostgREST logic expression."""
+    parts, depth, quoted, current = [], 0, False, ""
+    for ch in expr:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and ch == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        current += ch
+    parts.append(current)
+    return parts
+
+
+def _logic(expr: str):
+    """Row predicate for an ``or_`` argument such as ``a.lt."x",and(a.eq."x",id.lt."y")``."""
+    clauses = []
+    for part in _split(expr):
+        part = part.strip()
+        if part.startswith(("and(", "or(")):
+            inner = [_logic(p) for p in _split(part[part.index("(") + 1:-1])]
+            combine = all if part.startswith("and(") else any
+            clauses.append(lambda row, inner=inner, combine=combine: combine(f(row) for f in inner))
+            continue
+        column, op, value = part.split(".", 2)
+        value = value[1:-1] if value.startswith('"') and value.endswith('"') else value
+        clauses.append(lambda row, c=column, o=op, v=value: _compare(o, row.get(c), v))
+    return lambda row: any(f(row) for f in clauses)
+
+
+class FakeQuery:
+    def __init__(self, db: "FakeSupabase", table: str, is_async: bool):
+        self.db = db
+        self.table = table
+        self.is_async = is_async
+        self.op = "select"
+        self.columns = "*"
+        self.payload = None
+        self.filters: list = []
+        self.ordering: list = []
+        self.window: Optional[tuple] = None
+        self.row_limit: Optional[int] = None
+        self.count_mode: Optional[str] = None
+        self.head = False
+        self._negate = False
+
+    # ── Builder ──────────────────────────────────────────────────────────────
+    def select(self, columns: str = "*", count: Optional[str] = None, head: bool = False):
+        self.columns, self.count_mode, self.head = columns, count, head
+        return self
+
+    def insert(self, payload, **_):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, **_):
+        self.op, self.payload = "upsert", payload
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    @property
+    def not_(self):
+        self._negate = True
+        return self
+
+    def _where(self, predicate):
+        if self._negate:
+            self._negate = False
+            self.filters.append(lambda row: not predicate(row))
+        else:
+            self.filters.append(predicate)
+        return self
+
+    def eq(self, column, value):
+        return self._where(lambda row: row.get(column) == value)
+
+    def neq(self, column, value):
+        return self._where(lambda row: row.get(column) != value)
+
+    def gt(self, column, value):
+        return self._where(lambda row: _compare("gt", row.get(column), value))
+
+    def gte(self, column, value):
+        return self._where(lambda row: _compare("gte", row.get(column), value))
+
+    def lt(self, column, value):
+        return self._where(lambda row: _compare("lt", row.get(column), value))
+
+    def lte(self, column, value):
+        return self._where(lambda row: _compare("lte", row.get(column), value))
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._where(lambda row: row.get(column) in values)
+
+    def like(self, column, pattern):
+        regex = _like(pattern, case=True)
+        return self._where(lambda row: bool(regex.match(str(row.get(column) or ""))))
+
+    def ilike(self, column, pattern):
+        regex = _like(pattern, case=False)
+        return self._where(lambda row: bool(regex.match(str(row.get(column) or ""))))
+
+    def or_(self, expr):
+        return self._where(_logic(expr))
+
+    def order(self, column, desc: bool = False):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, n: int):
+        self.row_limit = n
+        return self
+
+    def range(self, start: int, end: int):
+        self.window = (start, end)
+        return self
+
+    # ── Execution ────────────────────────────────────────────────────────────
+    def _project(self, row: dict) -> dict:
+        if self.columns.strip() == "*":
+            return dict(row)
+        return {c.strip(): row.get(c.strip()) for c in self.columns.split(",")}
+
+    def _run(self) -> Result:
+        with self.db.lock:
+            rows = self.db.tables.setdefault(self.table, [])
+            if self.op in ("insert", "upsert"):
+                payload = self.payload if isinstance(self.payload, list) else [self.payload]
+                out = []
+                for new in payload:
+                    new = dict(new)
+                    new.setdefault("id", next(self.db.ids))
+                    new.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+                    existing = next((r for r in rows if r.get("id") == new["id"]), None) if self.op == "upsert" else None
+                    if existing is not None:
+                        existing.update(new)
+                    else:
+                        rows.append(new)
+                    out.append(dict(existing or new))
+                return Result(out)
+            matched = rows
+            for f in self.filters:
+                matched = [r for r in matched if f(r)]
+            if self.op == "update":
+                for r in matched:
+                    r.update(self.payload)
+                return Result([dict(r) for r in matched])
+            if self.op == "delete":
+                gone = {id(r) for r in matched}
+                rows[:] = [r for r in rows if id(r) not in gone]
+                return Result([dict(r) for r in matched])
+            for column, desc in reversed(self.ordering):
+                matched.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+            count = len(matched) if self.count_mode else None
+            if self.window:
+                matched = matched[self.window[0]:self.window[1] + 1]
+            if self.row_limit is not None:
+                matched = matched[:self.row_limit]
+            return Result([] if self.head else [self._project(r) for r in matched], count)
+
+    def execute(self):
+        delay = self.db.delay()
+        if self.is_async:
+            async def run():
+                await asyncio.sleep(delay)
+                return self._run()
+            return run()
+        time.sleep(delay)
+        return self._run()
+
+
+class FakeRPC:
+    def __init__(self, db: "FakeSupabase", fn: str, params: dict, is_async: bool):
+        self.db, self.fn, self.params, self.is_async = db, fn, params, is_async
+
+    def _run(self) -> Result:
+        handler = getattr(self.db, f"_rpc_{self.fn}", None)
+        if handler is None:
+            raise RuntimeError(f"fake Supabase has no RPC {self.fn!r}")
+        with self.db.lock:
+            return Result(handler(**self.params))
+
+    def execute(self):
+        delay = self.db.delay()
+        if self.is_async:
+            async def run():
+                await asyncio.sleep(delay)
+                return self._run()
+            return run()
+        time.sleep(delay)
+        return self._run()
+
+
+class FakeSupabase:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = 1,
+                 tables: Optional[dict] = None, lock: Optional[threading.RLock] = None, ids=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.tables: dict = {} if tables is None else tables
+        self.lock = lock or threading.RLock()
+        self.ids = ids or itertools.count(1_000_000)
+        self._rng = random.Random(seed)
+        self.is_async = False
+
+    def delay(self) -> float:
+        return self.latency + (self._rng.random() * self.jitter if self.jitter else 0.0)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name, self.is_async)
+
+    def rpc(self, fn: str, params: Optional[dict] = None) -> FakeRPC:
+        return FakeRPC(self, fn, params or {}, self.is_async)
+
+    def async_view(self) -> "FakeSupabase":
+        """An async client over the same tables (for ``main.asupabase``)."""
+        view = FakeSupabase(self.latency, self.jitter, tables=self.tables, lock=self.lock, ids=self.ids)
+        view.is_async = True
+        return view
+
+    # ── RPCs (same results as the Postgres functions in ledger.py / checkout.py) ──
+    def _rpc_apply_loyalty_points(self, p_email, p_points, p_type, p_description, p_order_id=None,
+                                  p_require_balance=False):
+        accounts = self.tables.setdefault("loyalty_accounts", [])
+        acct = next((a for a in accounts if a["user_email"] == p_email), None)
+        if acct is None:
+            acct = {"id": next(self.ids), "user_email": p_email, "points_balance": 0, "points_earned_total": 0,
+                    "referral_code": f"REF{next(self.ids):06X}"[:9], "referred_by_code": None}
+            accounts.append(acct)
+        if p_require_balance and acct["points_balance"] < -p_points:
+            return [{"applied": False, "balance": acct["points_balance"],
+                     "referred_by_code": acct.get("referred_by_code"), "first_of_type": False}]
+        acct["points_balance"] = max(0, acct["points_balance"] + p_points)
+        acct["points_earned_total"] += max(p_points, 0)
+        txns = self.tables.setdefault("loyalty_transactions", [])
+        first = not any(t["user_email"] == p_email and t["type"] == p_type for t in txns)
+        txns.append({"id": next(self.ids), "user_email": p_email, "type": p_type, "points": p_points,
+                     "description": p_description, "order_id": p_order_id,
+                     "created_at": datetime.now(timezone.utc).isoformat()})
+        return [{"applied": True, "balance": acct["points_balance"],
+                 "referred_by_code": acct.get("referred_by_code"), "first_of_type": first}]
+
+    def _rpc_commit_order(self, p_order, p_items, p_points_redeemed=0, p_points_earned=0, p_loyalty=True):
+        self.tables.setdefault("orders", []).append(
+            {**p_order, "created_at": datetime.now(timezone.utc).isoformat()})
+        for item in p_items:
+            self.tables.setdefault("order_items", []).append({"id": next(self.ids), **item})
+        balance, redeemed = 0, 0
+        email = p_order.get("customer_email") or ""
+        if p_loyalty and email:
+            if p_points_redeemed > 0:
+                r = self._rpc_apply_loyalty_points(email, -p_points_redeemed, "redeemed", "", p_order["id"], True)[0]
+                redeemed = p_points_redeemed if r["applied"] else 0
+            balance = self._rpc_apply_loyalty_points(email, p_points_earned, "earned_purchase", "", p_order["id"])[0]["balance"]
+        return [{"new_balance": balance, "points_redeemed": redeemed, "referral_bonus_to": None}]
+
+
+# ── Messaging ──────────────────────────────────────────────────────────────────
+
+class _FakeMessages:
+    def __init__(self, owner: "FakeTwilio"):
+        self.owner = owner
+
+    def create(self, body: str, from_: str, to: str):
+        time.sleep(self.owner.latency)
+        with self.owner.lock:
+            self.owner.sent.append((from_, to, body))
+            return type("Message", (), {"sid": f"SM{len(self.owner.sent):032d}"})()
+
+
+class FakeTwilio:
+    """Stands in for ``twilio.rest.Client``: ``messages.create`` always succeeds after `latency`."""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.sent: list = []
+        self.messages = _FakeMessages(self)
+
+
+class FakeResend:
+    """Stands in for the ``resend`` module: ``Emails.send`` always succeeds after `latency`."""
+
+    def __init__(self, latency: float = 0.05):
+        owner = self
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.sent: list = []
+
+        class Emails:
+            @staticmethod
+            def send(params: dict):
+                time.sleep(owner.latency)
+                with owner.lock:
+                    owner.sent.append(params)
+                return {"id": f"email-{len(owner.sent)}"}
+
+        self.Emails = Emails
+
+
+# ── Data ───────────────────────────────────────────────────────────────────────
+
+CITIES = ["Mumbai", "Delhi", "Bengaluru", "Pune", "Chennai", "Hyderabad", "Kolkata", "Jaipur"]
+STATUSES = ["confirmed", "preparing", "out_for_delivery", "delivered", "delivered", "delivered", "cancelled"]
+
+
+def seed(db: FakeSupabase, customers: int = 500, orders: int = 5000, products=range(1, 101), seed: int = 7,
+         now: Optional[datetime] = None) -> dict:
+    """Fill `db` with customers, their orders and items, loyalty accounts and reminder logs.
+
+    Some orders are scheduled for delivery 1 and 3 days from `now` so the reminders
+    endpoint has work. Returns {"emails": [...], "admin_email": ...}.
+    """
+    rng = random.Random(seed)
+    products = list(products)
+    now = now or datetime.now(timezone.utc)
+    t = db.tables
+    emails = [f"customer{i}@example.com" for i in range(customers)]
+    admin_email = "admin@example.com"
+    t["users"] = [{"id": i + 1, "email": e, "password": "!", "first_name": f"Customer{i}", "last_name": "Test",
+                   "is_verified": True, "is_admin": False,
+                   "created_at": (now - timedelta(days=rng.randint(1, 400))).isoformat()}
+                  for i, e in enumerate(emails)]
+    t["users"].append({"id": customers + 1, "email": admin_email, "password": "!", "first_name": "Admin",
+                       "last_name": "User", "is_verified": True, "is_admin": True, "created_at": now.isoformat()})
+    t["loyalty_accounts"] = [{"id": i + 1, "user_email": e, "points_balance": rng.randint(0, 2000),
+                              "points_earned_total": rng.randint(0, 5000), "referral_code": f"REF{i:06d}",
+                              "referred_by_code": None} for i, e in enumerate(emails)]
+    t["orders"], t["order_items"], t["reminder_logs"] = [], [], []
+    for i in range(orders):
+        created = now - timedelta(minutes=rng.randint(0, 60 * 24 * 180))
+        status = rng.choice(STATUSES)
+        delivery = None
+        if rng.random() < 0.1:
+            delivery = (now + timedelta(days=rng.choice([1, 3]), hours=rng.randint(0, 8))).strftime("%Y-%m-%dT%H:%M")
+            status = rng.choice(["confirmed", "preparing"])
+        city = rng.choice(CITIES)
+        order_id = f"FLR{i:08X}"
+        items = [{"id": next(db.ids), "order_id": order_id, "product_id": rng.choice(products), "name": "Bouquet",
+                  "price": 499.0, "quantity": rng.randint(1, 3)} for _ in range(rng.randint(1, 4))]
+        t["order_items"].extend(items)
+        t["orders"].append({
+            "id": order_id, "customer_email": rng.choice(emails), "customer_name": "Test Customer",
+            "customer_phone": f"+9198{rng.randint(10000000, 99999999)}",
+            "customer_address": f"{rng.randint(1, 200)} Main Road, {city}, State, 400001", "city": city,
+            "total": round(sum(it["price"] * it["quantity"] for it in items), 2), "status": status,
+            "delivery_type": "scheduled" if delivery else "immediate", "delivery_datetime": delivery,
+            "is_recurring": False, "recurrence_type": None, "next_recurrence_date": None,
+            "payment_method": rng.choice(["cod", "credit_card", "google_pay"]), "created_at": created.isoformat(),
+        })
+    return {"emails": emails, "admin_email": admin_email}
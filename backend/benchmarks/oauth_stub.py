@@ -0,0 +1,127 @@
+"""A local stand-in for the Google and Facebook token verification endpoints.
+
+Serves ``GET /oauth2/v2/userinfo`` (token in ``Authorization: Bearer``) and
+``GET /me`` (token in ``access_token``) over plain HTTP/1.1 with keep-alive.
+Tokens registered with ``add_token`` return that profile; any other token of
+the form ``valid:<email>`` returns a generated one; everything else gets the
+provider-style 401 error body. ``delay`` is slept before each answer to stand in
+for a real provider's round trip.
+
+    python benchmarks/oauth_stub.py --port 8765 --delay 0.12
+
+then run the API with GOOGLE_USERINFO_URL=http://localhost:8765/oauth2/v2/userinfo
+FACEBOOK_ME_URL=http://localhost:8765/me.
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.stub.lock:
+            self.server.stub.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        stub: "OAuthStub" = self.server.stub
+        url = urlparse(self.path)
+        if url.path.endswith("/userinfo"):
+            provider = "google"
+            token = self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        elif url.path.endswith("/me"):
+            provider = "facebook"
+            token = parse_qs(url.query).get("access_token", [""])[0]
+        else:
+            self._send(404, {"error": "not found"})
+            return
+        with stub.lock:
+            stub.requests += 1
+        time.sleep(stub.delay)
+        profile = stub.profile(token)
+        if profile is None:
+            self._send(401, {"error": {"message": "Invalid OAuth access token.", "code": 190}})
+            return
+        first, last, email = profile
+        if provider == "google":
+            self._send(200, {"id": "1", "email": email, "verified_email": True, "name": f"{first} {last}".strip(),
+                             "given_name": first, "family_name": last})
+        else:
+            self._send(200, {"id": "1", "email": email, "name": f"{first} {last}".strip(),
+                             "first_name": first, "last_name": last})
+
+
+class OAuthStub:
+    """Run with ``with OAuthStub() as stub:``; the endpoints are ``stub.google_url`` and ``stub.facebook_url``."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.tokens: dict = {}
+        self.requests = 0
+        self.connections = 0
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self.host, self.port = self._server.server_address[:2]
+        self.google_url = f"http://{self.host}:{self.port}/oauth2/v2/userinfo"
+        self.facebook_url = f"http://{self.host}:{self.port}/me"
+        self._thread = None
+
+    def add_token(self, token: str, email: str, first_name: str = "Test", last_name: str = "User"):
+        with self.lock:
+            self.tokens[token] = (first_name, last_name, email)
+
+    def profile(self, token: str):
+        with self.lock:
+            if token in self.tokens:
+                return self.tokens[token]
+        if token.startswith("valid:") and "@" in token:
+            email = token[len("valid:"):]
+            return email.split("@")[0].capitalize(), "User", email
+        return None
+
+    def start(self) -> "OAuthStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in OAuth provider")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0)
+    args = parser.parse_args()
+    stub = OAuthStub(args.host, args.port, args.delay)
+    print(f"OAuth stub listening on {stub.google_url} and {stub.facebook_url}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
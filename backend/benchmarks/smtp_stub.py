@@ -0,0 +1,125 @@
+"""A local stand-in SMTP server for tests and benchmarks.
+
+Speaks just enough plain SMTP (EHLO/HELO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA,
+NOOP, RSET, QUIT) for ``smtplib`` and accepts every message, keeping it in
+memory. ``connect_delay`` is slept before the greeting and ``auth_delay`` before
+answering AUTH, to stand in for the TLS handshake and login round trip a real
+provider costs.
+
+    python benchmarks/smtp_stub.py --port 2525 --connect-delay 0.15 --auth-delay 0.15
+
+then run the API with SMTP_HOST=localhost SMTP_PORT=2525 SMTP_SSL=false.
+"""
+import argparse
+import socketserver
+import threading
+import time
+
+
+class _Session(socketserver.StreamRequestHandler):
+    def _reply(self, line: str):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        server: "SMTPStub" = self.server.stub
+        with server.lock:
+            server.connections += 1
+        time.sleep(server.connect_delay)
+        self._reply("220 stub ESMTP ready")
+        mail_from, rcpts = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            verb = line.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.wfile.write(b"250-stub\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif verb == "HELO":
+                self._reply("250 stub")
+            elif verb == "AUTH":
+                parts = line.split()
+                if len(parts) > 1 and parts[1].upper() == "LOGIN":
+                    for prompt in ("VXNlcm5hbWU6", "UGFzc3dvcmQ6"):
+                        self._reply(f"334 {prompt}")
+                        self.rfile.readline()
+                time.sleep(server.auth_delay)
+                with server.lock:
+                    server.logins += 1
+                self._reply("235 Authentication successful")
+            elif verb == "MAIL":
+                mail_from, rcpts = line[10:].strip("<> "), []
+                self._reply("250 OK")
+            elif verb == "RCPT":
+                rcpts.append(line[8:].strip("<> "))
+                self._reply("250 OK")
+            elif verb == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b".\r\n", b".\n"):
+                        break
+                    body.append(chunk[1:] if chunk.startswith(b"..") else chunk)
+                with server.lock:
+                    server.messages.append((mail_from, rcpts, b"".join(body)))
+                self._reply("250 OK queued")
+            elif verb in ("NOOP", "RSET"):
+                self._reply("250 OK")
+            elif verb == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPStub:
+    """Run with ``with SMTPStub() as stub:`` and point an SMTP client at ``stub.port``."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 connect_delay: float = 0.0, auth_delay: float = 0.0):
+        self.connect_delay = connect_delay
+        self.auth_delay = auth_delay
+        self.lock = threading.Lock()
+        self.messages: list = []
+        self.connections = 0
+        self.logins = 0
+        self._server = _Server((host, port), _Session)
+        self._server.stub = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    def start(self) -> "SMTPStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in SMTP server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--connect-delay", type=float, default=0.0)
+    parser.add_argument("--auth-delay", type=float, default=0.0)
+    args = parser.parse_args()
+    stub = SMTPStub(args.host, args.port, args.connect_delay, args.auth_delay)
+    print(f"SMTP stub listening on {stub.host}:{stub.port}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,208 @@
+"""Order commit for checkout.
+
+``commit_order`` sends an order, its items and its loyalty effects (points
+redeemed, points earned, the referrer's first-purchase bonus) to the
+``commit_order`` Postgres function in a single RPC. The function runs as one
+transaction, so a failure anywhere leaves no half-written order behind, and
+checkout costs one database round trip. Install it together with the ledger
+function: ``python manage.py supabase-sql`` prints the SQL.
+
+Until that SQL has been applied (deploys don't run it), the function or the
+``orders.city`` column is missing; ``commit_order`` then logs it once and falls
+back to plain inserts of the order and its items, leaving loyalty points to the
+caller, so checkout keeps working on a database that hasn't been migrated yet.
+
+``StageTimer`` measures the stages of one checkout for the ``Server-Timing``
+header; ``LatencyStats`` keeps recent timings for percentile reporting.
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+from postgrest.exceptions import APIError
+
+# Delivery city as its own column (normalized like main.normalize_city), backfilled
+# from the second part of customer_address for existing orders.
+ORDERS_CITY_SQL = """
+alter table orders add column if not exists city text;
+update orders set city = initcap(regexp_replace(trim(split_part(customer_address, ',', 2)), '\\s+', ' ', 'g'))
+ where city is null and customer_address like '%,%';
+create index if not exists orders_city_idx on orders (lower(city));
+"""
+
+# Needs apply_loyalty_points from ledger.POSTGRES_FUNCTION and orders.city.
+POSTGRES_FUNCTION = """
+create or replace function commit_order(
+    p_order jsonb,
+    p_items jsonb,
+    p_points_redeemed integer default 0,
+    p_points_earned integer default 0,
+    p_loyalty boolean default true
+) returns table (new_balance integer, points_redeemed integer, referral_bonus_to text)
+language plpgsql as $$
+declare
+    v_id text := p_order->>'id';
+    v_email text := coalesce(p_order->>'customer_email', '');
+    v_balance integer := 0;
+    v_redeemed integer := 0;
+    v_referrer text;
+    r record;
+begin
+    insert into orders (id, customer_email, customer_name, customer_phone, customer_address, city, total, status,
+                        delivery_type, delivery_datetime, is_recurring, recurrence_type, next_recurrence_date,
+                        payment_method)
+    select id, customer_email, customer_name, customer_phone, customer_address, city, total, status,
+           delivery_type, delivery_datetime, is_recurring, recurrence_type, next_recurrence_date,
+           payment_method
+      from jsonb_populate_record(null::orders, p_order);
+
+    insert into order_items (order_id, product_id, name, price, quantity)
+    select order_id, product_id, name, price, quantity
+      from jsonb_populate_recordset(null::order_items, p_items);
+
+    if p_loyalty and v_email <> '' then
+        if p_points_redeemed > 0 then
+            select * into r from apply_loyalty_points(
+                v_email, -p_points_redeemed, 'redeemed', 'Points redeemed at checkout for order ' || v_id, v_id, true);
+            if r.applied then
+                v_redeemed := p_points_redeemed;
+            end if;
+        end if;
+
+        select * into r from apply_loyalty_points(
+            v_email, p_points_earned, 'earned_purchase', 'Points earned for order ' || v_id, v_id);
+        v_balance := r.balance;
+
+        if r.first_of_type and r.referred_by_code is not null then
+            select user_email into v_referrer from loyalty_accounts where referral_code = r.referred_by_code limit 1;
+            if v_referrer is not null then
+                perform apply_loyalty_points(v_referrer, 150, 'earned_referral_purchase',
+                    'Referral first-purchase bonus — ' || v_email || ' made their first order', null);
+            end if;
+        end if;
+    end if;
+
+    return query select v_balance, v_redeemed, v_referrer;
+end;
+$$;
+"""
+
+
+# PostgREST / Postgres error codes for "function not found" and "column does not exist"
+_MISSING_FUNCTION = "PGRST202"
+_MISSING_COLUMN = "42703"
+
+# Set once the database is found to lack the commit_order function or orders.city
+_missing = {"function": False, "city": False}
+
+
+def _insert_order(client, order: dict, items: list):
+    """The order, then its items, as plain inserts; the order is removed again if the items fail."""
+    row = order
+    if _missing["city"]:
+        row = {k: v for k, v in order.items() if k != "city"}
+    try:
+        client.table("orders").insert(row).execute()
+    except APIError as e:
+        if e.code != _MISSING_COLUMN or "city" not in row:
+            raise
+        _missing["city"] = True
+        print("[Checkout] orders.city is missing; run `python manage.py supabase-sql` to add it")
+        row = {k: v for k, v in order.items() if k != "city"}
+        client.table("orders").insert(row).execute()
+    try:
+        client.table("order_items").insert(items).execute()
+    except Exception:
+        client.table("orders").delete().eq("id", order["id"]).execute()
+        raise
+
+
+def commit_order(client, order: dict, items: list, points_redeemed: int = 0, points_earned: int = 0,
+                 loyalty: bool = True) -> dict:
+    """Insert `order` and `items` and apply its loyalty points in one transaction.
+
+    Pass ``loyalty=False`` when points live outside Supabase (``SQLiteLedger``);
+    only the order and items are written then. Returns ``{"new_balance", "points_redeemed", "referral_bonus_to",
+    "loyalty_applied"}``; raises (with nothing written) if any part fails. When the function isn't installed
+    the order and items are inserted directly and ``loyalty_applied`` is False.
+    """
+    if not _missing["function"]:
+        try:
+            rows = client.rpc("commit_order", {
+                "p_order": order,
+                "p_items": items,
+                "p_points_redeemed": points_redeemed,
+                "p_points_earned": points_earned,
+                "p_loyalty": loyalty,
+            }).execute().data
+            row = rows[0] if isinstance(rows, list) else rows
+            return {**row, "loyalty_applied": loyalty}
+        except APIError as e:
+            if e.code not in (_MISSING_FUNCTION, _MISSING_COLUMN):
+                raise
+            _missing["function"] = True
+            print(f"[Checkout] commit_order unavailable ({e.code}: {e.message}); inserting orders directly "
+                  "until `python manage.py supabase-sql` has been applied and the API restarted")
+    _insert_order(client, order, items)
+    return {"new_balance": None, "points_redeemed": 0, "referral_bonus_to": None, "loyalty_applied": False}
+
+
+class StageTimer:
+    """Wall time per named stage, in milliseconds, in the order the stages ran."""
+
+    def __init__(self):
+        self.ms: dict = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.ms[name] = self.ms.get(name, 0.0) + (time.perf_counter() - t0) * 1000
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def header(self) -> str:
+        """Value for a ``Server-Timing`` response header."""
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.ms.items()]
+        return ", ".join(parts + [f"total;dur={self.total_ms():.1f}"])
+
+
+class LatencyStats:
+    """The last `size` stage timings, summarised as percentiles."""
+
+    def __init__(self, size: int = 1000):
+        self._samples: deque = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, stages: dict, total_ms: Optional[float] = None):
+        sample = dict(stages)
+        sample["total"] = total_ms if total_ms is not None else sum(stages.values())
+        with self._lock:
+            self._samples.append(sample)
+
+    @staticmethod
+    def _percentile(ordered: list, p: float) -> float:
+        """Nearest-rank percentile of an already sorted list."""
+        return round(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)], 1)
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = list(self._samples)
+        stages: dict = {}
+        for sample in samples:
+            for name, ms in sample.items():
+                stages.setdefault(name, []).append(ms)
+        out = {}
+        for name, values in stages.items():
+            values.sort()
+            out[name] = {"count": len(values), "p50": self._percentile(values, 50),
+                         "p95": self._percentile(values, 95), "p99": self._percentile(values, 99),
+                         "max": round(values[-1], 1)}
+        return out
@@ -0,0 +1,138 @@
+"""Item-to-item recommendations from order co-occurrence.
+
+``build`` reads order lines page by page into NumPy columns, forms the sparse
+order × product basket matrix ``B`` (1 where an order contains a product) and
+computes ``C = Bᵀ·B`` with SciPy: ``C[i, j]`` is the number of orders containing
+both products. Scores are cosine-normalised, ``C[i, j] / sqrt(C[i, i]·C[j, j])``,
+so best sellers don't become everyone's neighbour.
+
+Only each product's ``top_n`` best neighbours are kept, sorted by score, in a
+CSR matrix saved with ``np.savez`` — a few hundred KB even for large catalogs.
+``CooccurrenceModel.neighbours`` then merges the lists of a basket's products,
+touching only ``top_n`` entries per product.
+
+Build offline (``python manage.py rebuild-recommendations``); the API loads the
+file and reloads it when it changes.
+"""
+import os
+import threading
+from typing import Iterable, Optional
+
+import numpy as np
+from scipy import sparse
+
+DEFAULT_TOP_N = 20
+
+
+def _columns(pages: Iterable[list]) -> tuple:
+    order_cols, product_cols = [], []
+    for page in pages:
+        if not page:
+            continue
+        order_cols.append(np.array([r["order_id"] for r in page]))
+        product_cols.append(np.fromiter((r["product_id"] for r in page), dtype=np.int64, count=len(page)))
+    if not order_cols:
+        return np.array([], dtype=str), np.array([], dtype=np.int64)
+    return np.concatenate(order_cols), np.concatenate(product_cols)
+
+
+def build(pages: Iterable[list], top_n: int = DEFAULT_TOP_N) -> dict:
+    """Neighbour lists from pages of {"order_id", "product_id"} rows (cancelled orders already excluded)."""
+    order_ids, product_ids = _columns(pages)
+    products, p_idx = np.unique(product_ids, return_inverse=True)
+    _, o_idx = np.unique(order_ids, return_inverse=True)
+    n_orders, n_products = (o_idx.max() + 1 if len(o_idx) else 0), len(products)
+
+    baskets = sparse.csr_matrix(
+        (np.ones(len(p_idx), dtype=np.float32), (o_idx, p_idx)), shape=(n_orders, n_products)
+    )
+    baskets.data[:] = 1  # an order counts once per product however many lines it has
+    co = (baskets.T @ baskets).tocsr()
+    support = co.diagonal()
+    co.setdiag(0)
+    co.eliminate_zeros()
+    co = co.tocoo()
+    scores = co.data / np.sqrt(support[co.row] * support[co.col])
+
+    # Keep the top_n neighbours of each product: sort by (row, -score), then cut each row
+    order = np.lexsort((-scores, co.row))
+    rows, cols, scores = co.row[order], co.col[order], scores[order]
+    starts = np.searchsorted(rows, np.arange(n_products))
+    rank = np.arange(len(rows)) - starts[rows]
+    keep = rank < top_n
+    rows, cols, scores = rows[keep], cols[keep], scores[keep]
+    indptr = np.zeros(n_products + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_products), out=indptr[1:])
+    return {
+        "products": products,
+        "support": support.astype(np.int64),
+        "indptr": indptr,
+        "neighbours": cols.astype(np.int32),
+        "scores": scores.astype(np.float32),
+        "orders": np.int64(n_orders),
+    }
+
+
+def save(model: dict, path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **model)
+    os.replace(tmp, path)
+
+
+class CooccurrenceModel:
+    """Neighbour lookups over a saved model; empty (no recommendations) until a file exists."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._set(None)
+
+    def _set(self, data: Optional[dict]):
+        if data is None:
+            data = {"products": np.array([], dtype=np.int64), "orders": 0, "indptr": np.zeros(1, dtype=np.int64),
+                    "neighbours": np.array([], dtype=np.int32), "scores": np.array([], dtype=np.float32)}
+        index = {int(pid): i for i, pid in enumerate(data["products"])}
+        # Swapped in one assignment so a concurrent lookup never mixes two models
+        self._state = (data["products"], data["indptr"], data["neighbours"], data["scores"], index)
+        self.orders = int(data["orders"])
+
+    @property
+    def products(self) -> np.ndarray:
+        return self._state[0]
+
+    def reload_if_changed(self) -> bool:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        with self._lock:
+            if mtime != self._mtime:
+                with np.load(self.path) as f:
+                    self._set({k: f[k] for k in f.files})
+                self._mtime = mtime
+        return True
+
+    def neighbours(self, basket, k: int, exclude=()) -> list:
+        """Up to `k` product ids most often bought with `basket`, best first."""
+        totals: dict = {}
+        products, indptr, neighbours, scores, index = self._state
+        for pid in set(basket):
+            i = index.get(pid)
+            if i is None:
+                continue
+            for j, score in zip(neighbours[indptr[i]:indptr[i + 1]].tolist(), scores[indptr[i]:indptr[i + 1]].tolist()):
+                totals[j] = totals.get(j, 0.0) + score
+        skip = set(basket) | set(exclude)
+        ranked = sorted(totals.items(), key=lambda kv: -kv[1])
+        out = []
+        for j, _ in ranked:
+            pid = int(products[j])
+            if pid not in skip:
+                out.append(pid)
+                if len(out) == k:
+                    break
+        return out
@@ -0,0 +1,150 @@
+"""Per-request Supabase query accounting and Prometheus metrics.
+
+``instrument(client)`` wraps a Supabase client (sync or async) so every
+``table(...)``/``rpc(...)`` chain is timed when it is executed. Each query is
+observed in the ``supabase_query_duration_seconds`` histogram by table and
+operation and, when it runs inside an HTTP request, added to that request's
+``RequestQueries`` (found through a context variable the middleware sets;
+``run_in_threadpool`` carries it into sync endpoints).
+
+A request that repeats the same query shape — same table, operation and chain
+of builder methods, whatever the arguments — more than ``n_plus_one_threshold``
+times is flagged as a likely N+1: logged once and counted in
+``supabase_n_plus_one_total``.
+
+``metrics_response()`` renders everything for ``/metrics``; with
+``PROMETHEUS_MULTIPROC_DIR`` set, the metrics of all uvicorn workers are merged.
+"""
+import contextvars
+import inspect
+import os
+import time
+from collections import Counter
+from typing import Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter as PromCounter, Histogram, generate_latest
+from prometheus_client import REGISTRY, multiprocess
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.",
+    ["method", "route", "status"], buckets=_LATENCY_BUCKETS)
+QUERY_DURATION = Histogram(
+    "supabase_query_duration_seconds", "Supabase (PostgREST) query latency.",
+    ["table", "op"], buckets=_LATENCY_BUCKETS)
+QUERIES_PER_REQUEST = Histogram(
+    "supabase_queries_per_request", "Supabase queries made while serving one request.",
+    ["route"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100, 250))
+QUERY_TIME_PER_REQUEST = Histogram(
+    "supabase_query_seconds_per_request", "Total time spent in Supabase queries while serving one request.",
+    ["route"], buckets=_LATENCY_BUCKETS)
+N_PLUS_ONE = PromCounter(
+    "supabase_n_plus_one_total", "Requests that repeated one query shape more than the N+1 threshold.",
+    ["route", "table"])
+
+_OPS = {"select", "insert", "update", "upsert", "delete"}
+
+
+class RequestQueries:
+    """The queries one request made."""
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.count = 0
+        self.seconds = 0.0
+        self.by_table: Counter = Counter()
+        self.shapes: Counter = Counter()
+        self.flagged: list = []
+
+    def record(self, table: str, op: str, shape: tuple, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.by_table[table] += 1
+        self.shapes[shape] += 1
+        if self.threshold and self.shapes[shape] == self.threshold + 1:
+            self.flagged.append((table, op, shape))
+
+
+current: contextvars.ContextVar[Optional[RequestQueries]] = contextvars.ContextVar("supabase_queries", default=None)
+
+
+def _record(table: str, op: str, shape: tuple, seconds: float):
+    QUERY_DURATION.labels(table, op).observe(seconds)
+    stats = current.get()
+    if stats is not None:
+        stats.record(table, op, shape, seconds)
+
+
+class _Query:
+    """Forwards to a PostgREST request builder, remembering the chain, and times ``execute()``."""
+
+    __slots__ = ("_builder", "_table", "_op", "_chain")
+
+    def __init__(self, builder, table: str, op: str, chain: tuple = ()):
+        self._builder = builder
+        self._table = table
+        self._op = op
+        self._chain = chain
+
+    def _wrap(self, name: str, result):
+        if not hasattr(result, "execute"):
+            return result
+        op = name if self._op == "?" and name in _OPS else self._op
+        return _Query(result, self._table, op, self._chain + (name,))
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return self._wrap(name, attr)  # properties such as `not_`
+
+        def call(*args, **kwargs):
+            return self._wrap(name, attr(*args, **kwargs))
+        return call
+
+    def execute(self):
+        shape = (self._table, self._op) + self._chain
+        started = time.perf_counter()
+        result = self._builder.execute()
+        if inspect.isawaitable(result):
+            async def timed():
+                try:
+                    return await result
+                finally:
+                    _record(self._table, self._op, shape, time.perf_counter() - started)
+            return timed()
+        _record(self._table, self._op, shape, time.perf_counter() - started)
+        return result
+
+
+class InstrumentedClient:
+    """A Supabase client whose ``table()`` and ``rpc()`` chains are measured; everything else passes through."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str):
+        return _Query(self._client.table(name), name, "?")
+
+    def from_(self, name: str):
+        return self.table(name)
+
+    def rpc(self, fn: str, params: Optional[dict] = None, *args, **kwargs):
+        return _Query(self._client.rpc(fn, params or {}, *args, **kwargs), f"rpc:{fn}", "rpc")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrument(client):
+    return client if client is None or isinstance(client, InstrumentedClient) else InstrumentedClient(client)
+
+
+def metrics_response() -> tuple:
+    """(body, content type) for a Prometheus scrape."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,324 @@
+"""Loyalty points ledger.
+
+Every change to a customer's points goes through ``apply``, which adjusts
+``loyalty_accounts`` and appends the matching ``loyalty_transactions`` row in
+one atomic step and returns the new balance. Two concurrent checkouts can no
+longer read the same balance and overwrite each other's update, and a
+redemption is checked against the balance inside the same step.
+
+``SupabaseLedger`` does it with one RPC to the ``apply_loyalty_points``
+Postgres function (``POSTGRES_FUNCTION`` below; print it with
+``python manage.py supabase-sql`` and run it in the Supabase SQL editor).
+Until that has been done the RPC answers PGRST202; the ledger then says so
+loudly, once, and falls back to reading and writing the two tables directly
+(not atomic, as before the function existed) so no points are lost.
+``SQLiteLedger`` keeps the same two tables in a local WAL-mode SQLite file,
+for development without Supabase and for benchmarks.
+"""
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Optional
+
+from postgrest.exceptions import APIError
+
+from localdb import LocalDB
+
+_MISSING_FUNCTION = "PGRST202"
+
+POSTGRES_FUNCTION = """
+-- Accounts duplicated by the old read-then-insert race would make the unique index fail:
+-- the most active row per email absorbs the others' points, and referrals made with a
+-- dropped row's code move to the kept row's code.
+create temporary table loyalty_account_dups as
+select d.ctid as dup, k.ctid as keep, d.points_balance, d.points_earned_total, d.referral_code,
+       d.referred_by_code, k.referral_code as keep_code
+  from loyalty_accounts d
+  join lateral (select ctid, referral_code from loyalty_accounts k
+                 where k.user_email = d.user_email
+                 order by k.points_earned_total desc, k.ctid
+                 limit 1) k on k.ctid <> d.ctid;
+
+delete from loyalty_accounts where ctid in (select dup from loyalty_account_dups);
+
+update loyalty_accounts a
+   set points_balance = a.points_balance + m.balance,
+       points_earned_total = a.points_earned_total + m.earned,
+       referred_by_code = coalesce(a.referred_by_code, m.referred_by_code)
+  from (select keep, sum(points_balance) as balance, sum(points_earned_total) as earned,
+               max(referred_by_code) as referred_by_code
+          from loyalty_account_dups group by keep) m
+ where a.ctid = m.keep;
+
+update loyalty_accounts a
+   set referred_by_code = d.keep_code
+  from loyalty_account_dups d
+ where d.referral_code is not null and a.referred_by_code = d.referral_code;
+
+drop table loyalty_account_dups;
+
+create unique index if not exists loyalty_accounts_user_email_key on loyalty_accounts (user_email);
+
+create or replace function apply_loyalty_points(
+    p_email text,
+    p_points integer,
+    p_type text,
+    p_description text,
+    p_order_id text default null,
+    p_require_balance boolean default false
+) returns table (applied boolean, balance integer, referred_by_code text, first_of_type boolean)
+language plpgsql as $$
+#variable_conflict use_column
+declare
+    acct loyalty_accounts%rowtype;
+    v_first boolean;
+begin
+    insert into loyalty_accounts (user_email, points_balance, points_earned_total, referral_code)
+    values (p_email, 0, 0, 'REF' || upper(substr(md5(random()::text), 1, 6)))
+    on conflict (user_email) do nothing;
+
+    select * into acct from loyalty_accounts where user_email = p_email for update;
+    if p_require_balance and acct.points_balance < -p_points then
+        return query select false, acct.points_balance, acct.referred_by_code, false;
+        return;
+    end if;
+
+    update loyalty_accounts
+       set points_balance = greatest(0, acct.points_balance + p_points),
+           points_earned_total = acct.points_earned_total + greatest(p_points, 0)
+     where user_email = p_email
+    returning * into acct;
+
+    v_first := not exists (select 1 from loyalty_transactions where user_email = p_email and type = p_type);
+    insert into loyalty_transactions (user_email, type, points, description, order_id)
+    values (p_email, p_type, p_points, p_description, p_order_id);
+
+    return query select true, acct.points_balance, acct.referred_by_code, v_first;
+end;
+$$;
+"""
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS loyalty_accounts (
+    user_email          TEXT PRIMARY KEY,
+    points_balance      INTEGER NOT NULL DEFAULT 0,
+    points_earned_total INTEGER NOT NULL DEFAULT 0,
+    referral_code       TEXT,
+    referred_by_code    TEXT,
+    created_at          TEXT
+);
+CREATE TABLE IF NOT EXISTS loyalty_transactions (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_email  TEXT NOT NULL,
+    type        TEXT NOT NULL,
+    points      INTEGER NOT NULL,
+    description TEXT,
+    order_id    TEXT,
+    created_at  TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS loyalty_accounts_referral ON loyalty_accounts (referral_code);
+CREATE INDEX IF NOT EXISTS loyalty_transactions_user ON loyalty_transactions (user_email, type);
+"""
+
+
+def generate_referral_code() -> str:
+    return "REF" + str(uuid.uuid4())[:6].upper()
+
+
+class LoyaltyLedger(ABC):
+    """Interface shared by all ledger backends."""
+
+    # True when accounts live in the same database as orders, so checkout can
+    # apply points in the same transaction as the order (see checkout.py).
+    shares_order_db = False
+
+    @abstractmethod
+    def apply(self, email: str, points: int, type: str, description: str,
+              order_id: Optional[str] = None, require_balance: bool = False) -> Optional[dict]:
+        """Add `points` (negative to spend) and record the transaction, atomically.
+
+        Creates the account if it doesn't exist. The balance never goes below 0;
+        with ``require_balance`` a spend larger than the balance is refused and
+        no points move. Returns ``{"balance", "referred_by_code", "first_of_type"}``
+        (``first_of_type``: no earlier transaction of this type for the customer),
+        or None if the spend was refused.
+        """
+
+    @abstractmethod
+    def open_account(self, email: str, referral_code: str, referred_by_code: Optional[str] = None) -> bool:
+        """Create an empty account; False if it already exists."""
+
+    @abstractmethod
+    def referrer_email(self, referral_code: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def account(self, email: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def transactions(self, email: str, limit: int = 20) -> list:
+        """Most recent first."""
+
+
+class SupabaseLedger(LoyaltyLedger):
+    shares_order_db = True
+
+    def __init__(self, client):
+        self.client = client
+        self.function_missing = False
+
+    def apply(self, email, points, type, description, order_id=None, require_balance=False):
+        if self.function_missing:
+            return self._apply_tables(email, points, type, description, order_id, require_balance)
+        try:
+            rows = self.client.rpc("apply_loyalty_points", {
+                "p_email": email,
+                "p_points": points,
+                "p_type": type,
+                "p_description": description,
+                "p_order_id": order_id,
+                "p_require_balance": require_balance,
+            }).execute().data
+        except APIError as e:
+            if e.code != _MISSING_FUNCTION:
+                raise
+            self.function_missing = True
+            print("[Loyalty] ERROR: the apply_loyalty_points function is not installed; points are written "
+                  "without it (not atomically) until `python manage.py supabase-sql` has been applied and "
+                  "the API restarted")
+            return self._apply_tables(email, points, type, description, order_id, require_balance)
+        row = rows[0] if isinstance(rows, list) else rows
+        if not row["applied"]:
+            return None
+        return {"balance": row["balance"], "referred_by_code": row["referred_by_code"],
+                "first_of_type": row["first_of_type"]}
+
+    def _apply_tables(self, email, points, type, description, order_id, require_balance):
+        """What apply_loyalty_points does, as separate table reads and writes."""
+        accounts = self.client.table("loyalty_accounts")
+        rows = accounts.select("points_balance, points_earned_total, referred_by_code") \
+            .eq("user_email", email).execute().data
+        acct = rows[0] if rows else {"points_balance": 0, "points_earned_total": 0, "referred_by_code": None}
+        if require_balance and acct["points_balance"] < -points:
+            return None
+        balance = max(0, acct["points_balance"] + points)
+        earned = acct["points_earned_total"] + max(points, 0)
+        if rows:
+            self.client.table("loyalty_accounts").update({"points_balance": balance, "points_earned_total": earned}) \
+                .eq("user_email", email).execute()
+        else:
+            self.client.table("loyalty_accounts").insert({
+                "user_email": email,
+                "points_balance": balance,
+                "points_earned_total": earned,
+                "referral_code": generate_referral_code(),
+            }).execute()
+        first = not self.client.table("loyalty_transactions").select("id").eq("user_email", email) \
+            .eq("type", type).limit(1).execute().data
+        self.client.table("loyalty_transactions").insert({
+            "user_email": email,
+            "type": type,
+            "points": points,
+            "description": description,
+            "order_id": order_id,
+        }).execute()
+        return {"balance": balance, "referred_by_code": acct["referred_by_code"], "first_of_type": first}
+
+    def open_account(self, email, referral_code, referred_by_code=None):
+        try:
+            self.client.table("loyalty_accounts").insert({
+                "user_email": email,
+                "points_balance": 0,
+                "points_earned_total": 0,
+                "referral_code": referral_code,
+                "referred_by_code": referred_by_code,
+            }).execute()
+        except Exception:
+            return False
+        return True
+
+    def referrer_email(self, referral_code):
+        rows = self.client.table("loyalty_accounts").select("user_email") \
+            .eq("referral_code", referral_code).limit(1).execute().data
+        return rows[0]["user_email"] if rows else None
+
+    def account(self, email):
+        rows = self.client.table("loyalty_accounts").select("*").eq("user_email", email).execute().data
+        return rows[0] if rows else None
+
+    def transactions(self, email, limit=20):
+        return self.client.table("loyalty_transactions").select("*").eq("user_email", email) \
+            .order("created_at", desc=True).limit(limit).execute().data or []
+
+
+class SQLiteLedger(LoyaltyLedger):
+    def __init__(self, path: str):
+        self.db = LocalDB(path)
+        self.db.executescript(_SQLITE_SCHEMA)
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    def apply(self, email, points, type, description, order_id=None, require_balance=False):
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO loyalty_accounts (user_email, referral_code, created_at) VALUES (?, ?, ?)",
+                (email, generate_referral_code(), self._now()),
+            )
+            balance, referred_by = conn.execute(
+                "SELECT points_balance, referred_by_code FROM loyalty_accounts WHERE user_email = ?", (email,)
+            ).fetchone()
+            if require_balance and balance < -points:
+                return None
+            balance = max(0, balance + points)
+            conn.execute(
+                "UPDATE loyalty_accounts SET points_balance = ?, points_earned_total = points_earned_total + ?"
+                " WHERE user_email = ?",
+                (balance, max(points, 0), email),
+            )
+            first = conn.execute(
+                "SELECT 1 FROM loyalty_transactions WHERE user_email = ? AND type = ? LIMIT 1", (email, type)
+            ).fetchone() is None
+            conn.execute(
+                "INSERT INTO loyalty_transactions (user_email, type, points, description, order_id, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (email, type, points, description, order_id, self._now()),
+            )
+        return {"balance": balance, "referred_by_code": referred_by, "first_of_type": first}
+
+    def open_account(self, email, referral_code, referred_by_code=None):
+        cur = self.db.execute(
+            "INSERT OR IGNORE INTO loyalty_accounts (user_email, referral_code, referred_by_code, created_at)"
+            " VALUES (?, ?, ?, ?)",
+            (email, referral_code, referred_by_code, self._now()),
+        )
+        return cur.rowcount == 1
+
+    def referrer_email(self, referral_code):
+        row = self.db.execute(
+            "SELECT user_email FROM loyalty_accounts WHERE referral_code = ?", (referral_code,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def account(self, email):
+        cur = self.db.execute("SELECT * FROM loyalty_accounts WHERE user_email = ?", (email,))
+        row = cur.fetchone()
+        return dict(zip([c[0] for c in cur.description], row)) if row else None
+
+    def transactions(self, email, limit=20):
+        cur = self.db.execute(
+            "SELECT * FROM loyalty_transactions WHERE user_email = ? ORDER BY created_at DESC, id DESC LIMIT ?",
+            (email, limit),
+        )
+        cols = [c[0] for c in cur.description]
+        return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+
+def create_ledger(backend: str, client=None, path: Optional[str] = None) -> LoyaltyLedger:
+    if backend == "supabase":
+        return SupabaseLedger(client)
+    if backend == "sqlite":
+        return SQLiteLedger(path)
+    raise ValueError(f"Unknown LOYALTY_LEDGER backend: {backend!r}")
@@ -0,0 +1,71 @@
+"""Shared plumbing for the small SQLite files kept under DATA_DIR.
+
+Each file is opened in WAL mode so several uvicorn workers on the same host can
+read and write it concurrently. sqlite3 connections must not cross threads, so
+``LocalDB`` hands out one connection per thread for reads and autocommit writes.
+``transaction()`` instead runs on one connection per process, behind a lock:
+SQLite admits one writer at a time anyway, and it lets ``changed()`` tell this
+process's commits apart from other processes'.
+"""
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class LocalDB:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._writer: sqlite3.Connection = None
+        self._version = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _connect(self, **kwargs) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, **kwargs)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _writer_conn(self) -> sqlite3.Connection:
+        if self._writer is None:
+            self._writer = self._connect(check_same_thread=False)
+        return self._writer
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        return self.conn().execute(sql, params)
+
+    def executescript(self, sql: str) -> None:
+        self.conn().executescript(sql)
+
+    def changed(self) -> bool:
+        """Whether anything but this process's ``transaction()`` blocks committed since the last call.
+
+        For invalidating an in-memory cache that this process keeps current from its own
+        transactions; process-wide, and the first call returns True.
+        """
+        with self._write_lock:
+            version = self._writer_conn().execute("PRAGMA data_version").fetchone()[0]
+            changed = version != self._version
+            self._version = version
+        return changed
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT on the process's writer connection, rolled back if the block raises."""
+        with self._write_lock:
+            conn = self._writer_conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
@@ -0,0 +1,151 @@
+"""A small pool of logged-in SMTP connections.
+
+Opening ``SMTP_SSL`` and logging in costs a TLS handshake plus an AUTH round
+trip — usually several hundred milliseconds against Gmail — so ``SMTPPool``
+keeps up to ``size`` authenticated connections and reuses them. A connection
+idle for longer than ``check_after`` seconds is probed with NOOP before use, one
+idle for longer than ``idle_timeout`` is replaced outright (servers drop quiet
+sessions), and a send that finds the connection dead reconnects and retries once.
+"""
+import smtplib
+import threading
+import time
+from typing import Optional
+
+# Errors meaning the connection itself is gone, as opposed to the server rejecting the message.
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class SMTPPool:
+    def __init__(self, host: str, port: int, user: str, password: str, size: int = 2,
+                 use_ssl: bool = True, timeout: float = 30.0, idle_timeout: float = 120.0,
+                 check_after: float = 15.0):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = size
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self._idle: list = []          # (connection, last_used), most recently used last
+        self._open = 0
+        self._cond = threading.Condition()
+        self._counters = {"sends": 0, "failures": 0, "connects": 0, "reconnects": 0}
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    # ── Connections ──────────────────────────────────────────────────────────
+    def _connect(self) -> smtplib.SMTP:
+        cls = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        conn = cls(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.user:
+                conn.login(self.user, self.password)
+        except Exception:
+            self._discard(conn)
+            raise
+        self._count("connects")
+        return conn
+
+    def _reconnect(self, conn: Optional[smtplib.SMTP]) -> smtplib.SMTP:
+        if conn is not None:
+            self._discard(conn)
+        self._count("reconnects")
+        return self._connect()
+
+    @staticmethod
+    def _discard(conn: smtplib.SMTP):
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _healthy(self, conn: smtplib.SMTP) -> bool:
+        try:
+            return conn.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self) -> smtplib.SMTP:
+        with self._cond:
+            while not self._idle and self._open >= self.size:
+                self._cond.wait()
+            if self._idle:
+                conn, last_used = self._idle.pop()
+            else:
+                self._open += 1
+                conn, last_used = None, None
+        try:
+            if conn is None:
+                return self._connect()
+            idle_for = time.monotonic() - last_used
+            if idle_for > self.idle_timeout or (idle_for > self.check_after and not self._healthy(conn)):
+                return self._reconnect(conn)
+            return conn
+        except Exception:
+            self._release(None)
+            raise
+
+    def _release(self, conn: Optional[smtplib.SMTP]):
+        with self._cond:
+            if conn is None:
+                self._open -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    # ── Sending ──────────────────────────────────────────────────────────────
+    def send(self, from_addr: str, to_addrs, message: str):
+        """Send one message on a pooled connection; raises if it can't be delivered."""
+        started = time.perf_counter()
+        try:
+            conn = self._acquire()
+        except Exception:
+            self._count("failures")
+            raise
+        try:
+            try:
+                conn.sendmail(from_addr, to_addrs, message)
+            except _CONNECTION_ERRORS:
+                dead, conn = conn, None
+                conn = self._reconnect(dead)
+                conn.sendmail(from_addr, to_addrs, message)
+        except Exception:
+            self._count("failures")
+            if conn is not None:
+                self._discard(conn)
+            self._release(None)
+            raise
+        self._release(conn)
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self._counters["sends"] += 1
+            self._latency_total += elapsed
+            self._latency_max = max(self._latency_max, elapsed)
+
+    def _count(self, name: str):
+        with self._cond:
+            self._counters[name] += 1
+
+    def stats(self) -> dict:
+        with self._cond:
+            sends = self._counters["sends"]
+            return {
+                **self._counters,
+                "open": self._open,
+                "idle": len(self._idle),
+                "avg_latency_ms": round(self._latency_total / sends * 1000, 2) if sends else 0.0,
+                "max_latency_ms": round(self._latency_max * 1000, 2),
+            }
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn, _ in idle:
+            self._discard(conn)
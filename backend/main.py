@@ -1,21 +1,48 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, Form, HTTPException, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, EmailStr, Field, model_validator
 from typing import Optional
 import uuid
+import json
+import asyncio
 import base64 as _base64
 import os
 import secrets
-import smtplib
+import string
+import time
+import traceback
+import calendar
 import httpx as _httpx
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 from collections import Counter
 from dotenv import load_dotenv
-from supabase import create_client, Client
-import bcrypt
+from supabase import create_client, Client, acreate_client, AsyncClient, AsyncClientOptions
 from twilio.rest import Client as TwilioClient
+from sessions import SessionStore, create_session_store
+from rollups import OrderRollups, CUSTOMER_SORTS
+from outbox import Outbox
+from mailer import SMTPPool
+from twilio_dispatch import Dispatcher, SDKTransport
+from scheduler import Scheduler
+from ledger import LoyaltyLedger, create_ledger, generate_referral_code
+from checkout import LatencyStats, StageTimer, commit_order
+from trending import TrendingCounter
+from cooccurrence import CooccurrenceModel
+from review_stats import RatingAggregates
+from purchases import PurchaseIndex
+from passwords import UNUSABLE_PASSWORD, HasherBusy, PasswordHasher
+from oauth import OAuthError, OAuthVerifier
+import oauth
+from instrumentation import RequestQueries, instrument
+import instrumentation
+from review_photos import PhotoError, PhotoPipeline
+import review_photos
+import cooccurrence
+import analytics
 
 load_dotenv()
 
@@ -43,11 +70,115 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ── Background tasks ───────────────────────────────────────────────────────────
+# Fire-and-forget work started from a request. The loop only keeps weak
+# references to tasks, so they are held here until done, and shutdown waits
+# briefly for whatever is still running.
+_background_tasks: set = set()
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+@app.on_event("shutdown")
+async def finish_background_tasks():
+    if _background_tasks:
+        await asyncio.wait(list(_background_tasks), timeout=10)
+
+# ── Request metrics ────────────────────────────────────────────────────────────
+# Per-route latency and per-request Supabase query counts/time, exported as
+# Prometheus histograms on /metrics. A request that repeats one query shape more
+# than QUERY_N_PLUS_ONE_THRESHOLD times is logged and counted as a likely N+1.
+QUERY_N_PLUS_ONE_THRESHOLD = int(os.getenv("QUERY_N_PLUS_ONE_THRESHOLD", "10"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+@app.middleware("http")
+async def measure_requests(request: Request, call_next):
+    queries = RequestQueries(QUERY_N_PLUS_ONE_THRESHOLD)
+    reset = instrumentation.current.set(queries)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        instrumentation.current.reset(reset)
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")  # the template, so IDs don't explode label cardinality
+        instrumentation.REQUEST_DURATION.labels(request.method, path, str(status)).observe(time.perf_counter() - started)
+        instrumentation.QUERIES_PER_REQUEST.labels(path).observe(queries.count)
+        instrumentation.QUERY_TIME_PER_REQUEST.labels(path).observe(queries.seconds)
+        for table, op, shape in queries.flagged:
+            instrumentation.N_PLUS_ONE.labels(path, table).inc()
+            print(f"[Queries] possible N+1 in {request.method} {path}: {queries.shapes[shape]}x "
+                  f"{op} on {table} ({'.'.join(shape[2:])})")
+    response.headers["X-DB-Queries"] = str(queries.count)
+    return response
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    body, content_type = instrumentation.metrics_response()
+    return Response(content=body, media_type=content_type)
+
 # ── Supabase client ────────────────────────────────────────────────────────────
-supabase: Client = create_client(
+supabase: Client = instrument(create_client(
     os.getenv("SUPABASE_URL"),
     os.getenv("SUPABASE_KEY")
-)
+))
+
+def iter_pages(table: str, columns: str, page_size: int = 1000, where=None):
+    """Yield a table in pages — a bare select is capped by PostgREST's max-rows.
+
+    `where` may add filters to each page's query builder.
+    """
+    start = 0
+    while True:
+        query = supabase.table(table).select(columns)
+        if where:
+            query = where(query)
+        page = query.order("id").range(start, start + page_size - 1).execute().data or []
+        yield page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+def fetch_all_rows(table: str, columns: str, page_size: int = 1000) -> list:
+    return [row for page in iter_pages(table, columns, page_size) for row in page]
+
+# ── Async Supabase client ──────────────────────────────────────────────────────
+# Async routes share one client whose HTTP connections are kept alive and pooled
+# across requests, so they never tie up a threadpool worker on PostgREST I/O.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+asupabase: Optional[AsyncClient] = None
+_db_http: Optional[_httpx.AsyncClient] = None
+
+@app.on_event("startup")
+async def open_async_supabase():
+    global asupabase, _db_http
+    _db_http = _httpx.AsyncClient(
+        http2=True,
+        follow_redirects=True,
+        timeout=_httpx.Timeout(30.0, connect=10.0),
+        limits=_httpx.Limits(
+            max_connections=DB_POOL_SIZE,
+            max_keepalive_connections=DB_POOL_SIZE,
+            keepalive_expiry=60,
+        ),
+    )
+    asupabase = instrument(await acreate_client(
+        os.getenv("SUPABASE_URL"),
+        os.getenv("SUPABASE_KEY"),
+        options=AsyncClientOptions(httpx_client=_db_http),
+    ))
+
+@app.on_event("shutdown")
+async def close_async_supabase():
+    if _db_http is not None:
+        await _db_http.aclose()
 
 # ── Gmail SMTP config ──────────────────────────────────────────────────────────
 GMAIL_USER         = os.getenv("GMAIL_USER", "")
@@ -55,10 +186,45 @@ GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD", "")
 APP_URL            = os.getenv("APP_URL", "http://localhost:4200")
 GOOGLE_CLIENT_ID   = os.getenv("GOOGLE_CLIENT_ID", "")
 
-def send_verification_email(to_email: str, first_name: str, token: str):
+# Logged-in connections are pooled and reused across messages. SMTP_HOST/PORT/SSL
+# can point at a local stand-in (benchmarks/smtp_stub.py) for testing.
+smtp_pool = SMTPPool(
+    os.getenv("SMTP_HOST", "smtp.gmail.com"),
+    int(os.getenv("SMTP_PORT", "465")),
+    GMAIL_USER,
+    GMAIL_APP_PASSWORD,
+    size=int(os.getenv("SMTP_POOL_SIZE", "2")),
+    use_ssl=os.getenv("SMTP_SSL", "true").lower() != "false",
+    idle_timeout=float(os.getenv("SMTP_IDLE_TIMEOUT_SECONDS", "120")),
+)
+
+@app.on_event("shutdown")
+def close_smtp_pool():
+    smtp_pool.close()
+
+# ── Twilio dispatch ────────────────────────────────────────────────────────────
+# SMS and WhatsApp messages go through one dispatcher: the channels of a
+# notification are sent concurrently, a token bucket keeps the whole process under
+# Twilio's per-second account limit, and 429/5xx responses are retried with jitter.
+twilio_dispatcher = Dispatcher(
+    SDKTransport(_twilio) if _twilio else None,
+    rate=float(os.getenv("TWILIO_RATE_PER_SECOND", "10")),
+    burst=float(os.getenv("TWILIO_BURST", "10")),
+    max_attempts=int(os.getenv("TWILIO_MAX_ATTEMPTS", "4")),
+)
+
+def twilio_messages(phone: str, body: str, channels=("sms", "whatsapp")) -> list:
+    senders = {"sms": (_twilio_from, phone), "whatsapp": (_twilio_wa_from, f"whatsapp:{phone}")}
+    return [{"channel": ch, "from_": senders[ch][0], "to": senders[ch][1], "body": body} for ch in channels]
+
+@app.on_event("shutdown")
+def stop_twilio_dispatcher():
+    twilio_dispatcher.stop()
+
+def send_verification_email(to_email: str, first_name: str, token: str) -> bool:
     if not GMAIL_USER or not GMAIL_APP_PASSWORD:
         print(f"[Email] Gmail not configured — skipping. Token: {token}")
-        return
+        return False
     verify_url = f"{APP_URL}/verify-email?token={token}"
     msg = MIMEMultipart("alternative")
     msg["Subject"] = "Verify your VivaPetals email"
@@ -92,112 +258,136 @@ def send_verification_email(to_email: str, first_name: str, token: str):
     </html>
     """
     msg.attach(MIMEText(html, "html"))
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(GMAIL_USER, GMAIL_APP_PASSWORD)
-            server.sendmail(GMAIL_USER, to_email, msg.as_string())
-        print(f"[Email] Verification email sent to {to_email}")
-    except Exception as e:
-        print(f"[Email] Failed to send verification email: {e}")
+    smtp_pool.send(GMAIL_USER, to_email, msg.as_string())
+    print(f"[Email] Verification email sent to {to_email}")
+    return True
+
+def send_password_reset_email(to_email: str, first_name: str, reset_token: str) -> bool:
+    if not GMAIL_USER or not GMAIL_APP_PASSWORD:
+        print(f"[Email] Gmail not configured — skipping password reset for {to_email}")
+        return False
+    reset_url = f"{APP_URL}/reset-password?token={reset_token}"
+    html = f"""
+    <!DOCTYPE html>
+    <html>
+    <body style="margin:0;padding:0;background:#fdf0f5;font-family:'Segoe UI',Arial,sans-serif;">
+      <table width="100%" cellpadding="0" cellspacing="0">
+        <tr><td align="center" style="padding:40px 16px;">
+          <table width="520" cellpadding="0" cellspacing="0" style="background:#fff;border-radius:16px;overflow:hidden;box-shadow:0 4px 24px rgba(200,75,122,0.1);">
+            <tr><td style="background:linear-gradient(135deg,#c84b7a,#9c2d55);padding:32px 40px;text-align:center;">
+              <div style="font-size:2rem;">🌸</div>
+              <div style="color:#fff;font-size:1.5rem;font-weight:800;margin-top:8px;">FloranFlowers</div>
+            </td></tr>
+            <tr><td style="padding:40px;">
+              <h2 style="margin:0 0 12px;color:#1e1e1e;font-size:1.35rem;font-weight:800;">Reset your password</h2>
+              <p style="color:#666;line-height:1.6;margin:0 0 28px;">Hi {first_name}, we received a request to reset your password. Click the button below to set a new one.</p>
+              <div style="text-align:center;margin-bottom:28px;">
+                <a href="{reset_url}" style="display:inline-block;padding:14px 36px;background:linear-gradient(135deg,#c84b7a,#9c2d55);color:#fff;text-decoration:none;border-radius:999px;font-weight:700;font-size:1rem;box-shadow:0 4px 16px rgba(200,75,122,0.35);">Reset Password</a>
+              </div>
+              <p style="color:#999;font-size:0.82rem;line-height:1.6;margin:0;">This link expires in <strong>1 hour</strong>. If you didn't request this, ignore this email.</p>
+              <hr style="border:none;border-top:1px solid #f0e0e8;margin:24px 0;">
+              <p style="color:#bbb;font-size:0.75rem;margin:0;">Or copy: <span style="color:#c84b7a;">{reset_url}</span></p>
+            </td></tr>
+          </table>
+        </td></tr>
+      </table>
+    </body>
+    </html>
+    """
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = "Reset your VivaPetals password"
+    msg["From"]    = f"VivaPetals <{GMAIL_USER}>"
+    msg["To"]      = to_email
+    msg.attach(MIMEText(html, "html"))
+    smtp_pool.send(GMAIL_USER, to_email, msg.as_string())
+    print(f"[Email] Password reset email sent to {to_email}")
+    return True
 
 # ── Password helpers ───────────────────────────────────────────────────────────
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+# bcrypt runs on its own executor, BCRYPT_WORKERS hashes at a time, so login
+# bursts don't tie up the threadpool shared by every sync endpoint. Changing
+# BCRYPT_ROUNDS takes effect for stored hashes as users next sign in.
+password_hasher = PasswordHasher(
+    workers=int(os.getenv("BCRYPT_WORKERS", "2")),
+    rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+    max_queue=int(os.getenv("BCRYPT_MAX_QUEUE", "64")),
+)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode(), hashed.encode())
+@app.on_event("shutdown")
+def stop_password_hasher():
+    password_hasher.shutdown()
 
-# ── In-memory token store ──────────────────────────────────────────────────────
-tokens: dict = {}
+def _hasher_busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Too many sign-in requests right now. Please try again in a moment.",
+                         headers={"Retry-After": "2"})
 
-# ── Loyalty helpers ────────────────────────────────────────────────────────────
+async def hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except HasherBusy:
+        raise _hasher_busy()
 
-def generate_referral_code() -> str:
-    return "REF" + str(uuid.uuid4())[:6].upper()
+async def verify_password(password: str, hashed: str) -> bool:
+    try:
+        return await password_hasher.verify(password, hashed)
+    except HasherBusy:
+        raise _hasher_busy()
 
-def award_points(email: str, points: int, type: str, description: str, order_id: str = None):
-    """Increment loyalty_accounts balance (and earned_total if positive), insert transaction row."""
+async def _rehash_password(email: str, password: str):
     try:
-        existing = supabase.table("loyalty_accounts").select("points_balance, points_earned_total").eq("user_email", email).execute()
-        if existing.data:
-            row = existing.data[0]
-            new_balance = max(0, row["points_balance"] + points)
-            new_earned = row["points_earned_total"] + (points if points > 0 else 0)
-            supabase.table("loyalty_accounts").update({
-                "points_balance": new_balance,
-                "points_earned_total": new_earned
-            }).eq("user_email", email).execute()
-        else:
-            new_balance = max(0, points)
-            new_earned = points if points > 0 else 0
-            ref_code = generate_referral_code()
-            supabase.table("loyalty_accounts").insert({
-                "user_email": email,
-                "points_balance": new_balance,
-                "points_earned_total": new_earned,
-                "referral_code": ref_code
-            }).execute()
-        supabase.table("loyalty_transactions").insert({
-            "user_email": email,
-            "type": type,
-            "points": points,
-            "description": description,
-            "order_id": order_id
-        }).execute()
+        hashed = await password_hasher.hash(password)
+        await asupabase.table("users").update({"password": hashed}).eq("email", email).execute()
     except Exception as e:
-        print(f"award_points error: {e}")
+        print(f"[Auth] rehash failed for {email}: {e}")
+
+# ── Session store ──────────────────────────────────────────────────────────────
+# SESSION_STORE=sqlite (default) shares sessions between all uvicorn workers on
+# the host; SESSION_STORE=memory keeps them in-process for single-worker setups.
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+sessions: SessionStore = create_session_store(
+    os.getenv("SESSION_STORE", "sqlite"),
+    os.path.join(DATA_DIR, "sessions.db"),
+    ttl_seconds=float(os.getenv("SESSION_TTL_HOURS", "168")) * 3600,
+    max_entries=int(os.getenv("SESSION_MAX_ENTRIES", "10000")),
+)
+ADMIN_ROLE_TTL = int(os.getenv("ADMIN_ROLE_TTL_SECONDS", "60"))
+
+# ── Loyalty helpers ────────────────────────────────────────────────────────────
+# Points move through the ledger: one atomic call adjusts the balance and logs the
+# transaction. LOYALTY_LEDGER=supabase (default) needs the apply_loyalty_points
+# function (`python manage.py supabase-sql`); "sqlite" keeps loyalty in DATA_DIR.
+ledger: LoyaltyLedger = create_ledger(
+    os.getenv("LOYALTY_LEDGER", "supabase"),
+    client=supabase,
+    path=os.path.join(DATA_DIR, "loyalty.db"),
+)
+
+def award_points(email: str, points: int, type: str, description: str, order_id: str = None,
+                 require_balance: bool = False) -> Optional[dict]:
+    """Apply a points delta through the ledger; returns its result, or None if refused or failed."""
+    try:
+        return ledger.apply(email, points, type, description, order_id, require_balance)
+    except Exception:
+        print(f"[Loyalty] {type} of {points} points for {email} failed")
+        traceback.print_exc()
+        return None
 
 def create_loyalty_account(email: str, referred_by_code: str = None) -> str:
     """Create loyalty_accounts row, award welcome bonus, handle referral signup bonus."""
     ref_code = generate_referral_code()
-    referred_by = None
-    if referred_by_code:
-        referrer = supabase.table("loyalty_accounts").select("user_email").eq("referral_code", referred_by_code).execute()
-        if referrer.data:
-            referred_by = referred_by_code
-    try:
-        supabase.table("loyalty_accounts").insert({
-            "user_email": email,
-            "points_balance": 0,
-            "points_earned_total": 0,
-            "referral_code": ref_code,
-            "referred_by_code": referred_by
-        }).execute()
-    except Exception:
-        pass
+    referrer_email = ledger.referrer_email(referred_by_code) if referred_by_code else None
+    ledger.open_account(email, ref_code, referred_by_code if referrer_email else None)
     # Welcome bonus
     award_points(email, 100, "earned_welcome", "Welcome bonus for joining VivaPetals")
     # Referral signup bonus: 200 pts to referrer
-    if referred_by_code and referred_by:
-        referrer_result = supabase.table("loyalty_accounts").select("user_email").eq("referral_code", referred_by_code).execute()
-        if referrer_result.data:
-            referrer_email = referrer_result.data[0]["user_email"]
-            award_points(referrer_email, 200, "earned_referral_signup", f"Referral signup bonus — {email} joined")
+    if referrer_email:
+        award_points(referrer_email, 200, "earned_referral_signup", f"Referral signup bonus — {email} joined")
     return ref_code
 
 def send_notifications(order_id: str, status: str, phone: str):
     if not phone or status not in STATUS_MESSAGES:
         return
-    msg = STATUS_MESSAGES[status].format(order_id=order_id)
-    for channel, from_num, to_num in [
-        ("sms",      _twilio_from,    phone),
-        ("whatsapp", _twilio_wa_from, f"whatsapp:{phone}"),
-    ]:
-        sent = False
-        try:
-            if _twilio and from_num:
-                _twilio.messages.create(body=msg, from_=from_num, to=to_num)
-                sent = True
-        except Exception:
-            pass
-        try:
-            supabase.table("order_notifications").insert({
-                "order_id": order_id, "channel": channel,
-                "status": status, "message": msg,
-                "phone": phone, "sent": sent
-            }).execute()
-        except Exception:
-            pass
+    outbox.enqueue("status_message", {"order_id": order_id, "status": status, "phone": phone})
 
 # ── Reminder helpers ───────────────────────────────────────────────────────────
 
@@ -346,20 +536,14 @@ def send_order_confirmation_email(order: dict, items: list) -> bool:
     if not GMAIL_USER or not GMAIL_APP_PASSWORD or not to_email:
         print(f"[Email] Gmail not configured or no email — skipping order confirmation for {to_email}")
         return False
-    try:
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = f"Your VivaPetals Order {order.get('id', '')} is Confirmed! 🌸"
-        msg["From"]    = f"VivaPetals <{GMAIL_USER}>"
-        msg["To"]      = to_email
-        msg.attach(MIMEText(build_order_confirmation_email_html(order, items), "html"))
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(GMAIL_USER, GMAIL_APP_PASSWORD)
-            server.sendmail(GMAIL_USER, to_email, msg.as_string())
-        print(f"[Email] Order confirmation sent to {to_email}")
-        return True
-    except Exception as e:
-        print(f"[Email] Failed to send order confirmation: {e}")
-        return False
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = f"Your VivaPetals Order {order.get('id', '')} is Confirmed! 🌸"
+    msg["From"]    = f"VivaPetals <{GMAIL_USER}>"
+    msg["To"]      = to_email
+    msg.attach(MIMEText(build_order_confirmation_email_html(order, items), "html"))
+    smtp_pool.send(GMAIL_USER, to_email, msg.as_string())
+    print(f"[Email] Order confirmation sent to {to_email}")
+    return True
 
 
 def build_order_cancellation_email_html(order: dict) -> str:
@@ -405,20 +589,14 @@ def send_order_cancellation_email(order: dict) -> bool:
     to_email = order.get("customer_email")
     if not GMAIL_USER or not GMAIL_APP_PASSWORD or not to_email:
         return False
-    try:
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = f"Your VivaPetals Order {order.get('id', '')} Has Been Cancelled"
-        msg["From"]    = f"VivaPetals <{GMAIL_USER}>"
-        msg["To"]      = to_email
-        msg.attach(MIMEText(build_order_cancellation_email_html(order), "html"))
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(GMAIL_USER, GMAIL_APP_PASSWORD)
-            server.sendmail(GMAIL_USER, to_email, msg.as_string())
-        print(f"[Email] Cancellation email sent to {to_email}")
-        return True
-    except Exception as e:
-        print(f"[Email] Failed to send cancellation email: {e}")
-        return False
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = f"Your VivaPetals Order {order.get('id', '')} Has Been Cancelled"
+    msg["From"]    = f"VivaPetals <{GMAIL_USER}>"
+    msg["To"]      = to_email
+    msg.attach(MIMEText(build_order_cancellation_email_html(order), "html"))
+    smtp_pool.send(GMAIL_USER, to_email, msg.as_string())
+    print(f"[Email] Cancellation email sent to {to_email}")
+    return True
 
 
 def send_email_reminder(order: dict, days_before: int, is_recurrence: bool = False) -> bool:
@@ -437,10 +615,7 @@ def send_email_reminder(order: dict, days_before: int, is_recurrence: bool = Fal
     except Exception:
         return False
 
-def send_sms_whatsapp_reminder(order: dict, days_before: int, is_recurrence: bool = False) -> dict:
-    result = {"sms": False, "whatsapp": False}
-    if not _twilio or not order.get("customer_phone"):
-        return result
+def reminder_sms_text(order: dict, days_before: int, is_recurrence: bool = False) -> str:
     timing = "tomorrow" if days_before == 1 else f"in {days_before} days"
     kind = "Anniversary" if is_recurrence else "Scheduled"
     dt_str = order.get("delivery_datetime", "")
@@ -451,25 +626,94 @@ def send_sms_whatsapp_reminder(order: dict, days_before: int, is_recurrence: boo
             formatted_date = f"{dt.strftime('%b')} {dt.day}, {dt.year}"
         except Exception:
             formatted_date = dt_str[:10]
-    msg = (
+    return (
         f"VivaPetals Reminder: Your {kind} flower delivery "
         f"(Order {order['id']}) arrives {timing}"
         + (f" on {formatted_date}" if formatted_date else "")
         + ". Please ensure someone is available."
     )
-    phone = order["customer_phone"]
-    for channel, from_num, to_num in [
-        ("sms",      _twilio_from,    phone),
-        ("whatsapp", _twilio_wa_from, f"whatsapp:{phone}"),
-    ]:
-        try:
-            if from_num:
-                _twilio.messages.create(body=msg, from_=from_num, to=to_num)
-                result[channel] = True
-        except Exception:
-            pass
+
+def send_sms_whatsapp_reminder(order: dict, days_before: int, is_recurrence: bool = False,
+                               channels: tuple = ("sms", "whatsapp")) -> dict:
+    result = {"sms": False, "whatsapp": False}
+    if not _twilio or not order.get("customer_phone"):
+        return result
+    msgs = twilio_messages(order["customer_phone"], reminder_sms_text(order, days_before, is_recurrence), channels)
+    for r in twilio_dispatcher.send_batch(msgs):
+        result[r["channel"]] = r["sent"]
     return result
 
+# ── Notification outbox ────────────────────────────────────────────────────────
+# Emails and Twilio messages are queued here and sent by background workers, so
+# a slow SMTP or Twilio call never holds up a request. Jobs that raise are retried
+# with exponential backoff; order-related outcomes land in order_notifications.
+outbox = Outbox(
+    os.path.join(DATA_DIR, "outbox.db"),
+    workers=int(os.getenv("OUTBOX_WORKERS", "4")),
+    max_attempts=int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6")),
+)
+
+@outbox.handler("status_message")
+def _send_status_messages(job: dict) -> bool:
+    """Send a status update on each channel at once and log the outcomes in one insert.
+
+    Channels still failing with a retryable error after the dispatcher's own
+    retries are re-queued on their own, so a channel that got through is never resent.
+    """
+    channels = job.get("channels") or ([job["channel"]] if "channel" in job else ["sms", "whatsapp"])
+    message = STATUS_MESSAGES[job["status"]].format(order_id=job["order_id"])
+    results = twilio_dispatcher.send_batch(twilio_messages(job["phone"], message, channels))
+    rounds = job.get("rounds", 1)
+    retry = [r["channel"] for r in results if r.get("retryable")] if rounds < outbox.max_attempts else []
+    if retry:
+        outbox.enqueue("status_message", {**job, "channels": retry, "rounds": rounds + 1},
+                       delay=outbox.backoff(rounds))
+    rows = [{"order_id": job["order_id"], "channel": r["channel"], "status": job["status"],
+             "message": message, "phone": job["phone"], "sent": r["sent"]}
+            for r in results if r["channel"] not in retry]
+    if rows:
+        try:
+            supabase.table("order_notifications").insert(rows).execute()
+        except Exception as e:
+            print(f"[Notifications] could not log {len(rows)} messages for {job['order_id']}: {e}")
+    return any(r["sent"] for r in results)
+
+@outbox.handler("verification_email")
+def _send_verification_job(job: dict) -> bool:
+    return send_verification_email(job["to_email"], job["first_name"], job["token"])
+
+@outbox.handler("password_reset_email")
+def _send_password_reset_job(job: dict) -> bool:
+    return send_password_reset_email(job["to_email"], job["first_name"], job["token"])
+
+@outbox.handler("order_confirmation_email")
+def _send_order_confirmation_job(job: dict) -> bool:
+    return send_order_confirmation_email(job["order"], job["items"])
+
+@outbox.handler("order_cancellation_email")
+def _send_order_cancellation_job(job: dict) -> bool:
+    return send_order_cancellation_email(job["order"])
+
+@outbox.on_finish
+def _record_notification(kind: str, job: dict, ok: bool, outcome):
+    if kind in ("order_confirmation_email", "order_cancellation_email"):
+        order = job["order"]
+        status = "confirmed" if kind == "order_confirmation_email" else "cancelled"
+        row = {"order_id": order["id"], "channel": "email", "status": status,
+               "message": f"{status} email to {order.get('customer_email')}", "phone": order.get("customer_phone") or ""}
+    else:
+        return
+    row["sent"] = ok and bool(outcome)
+    supabase.table("order_notifications").insert(row).execute()
+
+@app.on_event("startup")
+def start_outbox():
+    outbox.start()
+
+@app.on_event("shutdown")
+def stop_outbox():
+    outbox.stop()
+
 # ── Products (in-memory) ───────────────────────────────────────────────────────
 PRODUCTS = [
     {"id": 1, "name": "Red Rose Bouquet", "description": "A stunning arrangement of 12 premium red roses, perfect for expressing love and romance.", "price": 49.99, "image": "https://oydmbenbhjwclpxqlnuf.supabase.co/storage/v1/object/public/Products/ChatGPT%20Image%20Feb%2022%2C%202026%2C%2010_49_55%20PM.png", "category": "Garlands", "inStock": True},
@@ -574,6 +818,36 @@ PRODUCTS = [
     {"id": 100, "name": "Dried Flower Bundle", "description": "Long-lasting dried flower arrangement.", "price": 38.99, "image": "https://images.unsplash.com/photo-1468327768560-75b778cbb551?w=400", "category": "Decoration", "inStock": True},
 ]
 
+# ── Product catalog index ──────────────────────────────────────────────────────
+
+class ProductCatalog:
+    """Read-only indexes over the product list, built once at startup."""
+
+    def __init__(self, products: list):
+        self.products = products
+        self.by_id = {p["id"]: p for p in products}
+        self.position = {p["id"]: i for i, p in enumerate(products)}
+        self.by_category: dict = {}
+        for p in products:
+            self.by_category.setdefault(p["category"], []).append(p)
+        self.categories = sorted(self.by_category)
+        self.in_stock = [p for p in products if p.get("inStock")]
+
+    def get(self, product_id) -> Optional[dict]:
+        return self.by_id.get(product_id)
+
+    def image(self, product_id) -> str:
+        product = self.by_id.get(product_id)
+        return product["image"] if product else ""
+
+    def many(self, product_ids) -> list:
+        """Products for the given IDs in catalog order; unknown IDs are dropped."""
+        found = [self.by_id[pid] for pid in set(product_ids) if pid in self.by_id]
+        found.sort(key=lambda p: self.position[p["id"]])
+        return found
+
+catalog = ProductCatalog(PRODUCTS)
+
 # ── Promo Codes (in-memory) ────────────────────────────────────────────────────
 PROMO_CODES = {
     "WELCOME10": {"type": "percent", "value": 10, "description": "10% off your first order", "first_order_only": True, "min_order": 0, "active": True},
@@ -680,49 +954,50 @@ class SubscriptionRequest(BaseModel):
 @app.get("/api/products")
 def get_products(category: Optional[str] = None):
     if category:
-        return [p for p in PRODUCTS if p["category"] == category]
-    return PRODUCTS
+        return with_ratings(catalog.by_category.get(category, []))
+    return with_ratings(catalog.products)
 
 @app.get("/api/products/categories")
 def get_categories():
-    return sorted(list(set(p["category"] for p in PRODUCTS)))
+    return catalog.categories
 
 @app.get("/api/products/{product_id}")
 def get_product(product_id: int):
-    product = next((p for p in PRODUCTS if p["id"] == product_id), None)
+    product = catalog.get(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    summary = review_stats.get(product_id)
+    return {**product, "rating": summary["average"], "reviewCount": summary["count"], "ratings": summary}
 
 # ── Auth Routes ────────────────────────────────────────────────────────────────
 
 @app.post("/api/auth/register")
-def register(req: RegisterRequest):
-    existing = supabase.table("users").select("*").eq("email", req.email).execute()
+async def register(req: RegisterRequest):
+    existing = await asupabase.table("users").select("*").eq("email", req.email).execute()
 
     if existing.data:
         user = existing.data[0]
         if user.get("is_verified"):
             raise HTTPException(status_code=400, detail="Email already registered")
         # Unverified account — resend verification with updated details
-        hashed_password = hash_password(req.password)
+        hashed_password = await hash_password(req.password)
         verification_token = secrets.token_urlsafe(32)
         token_expires = (datetime.now(timezone.utc) + timedelta(hours=24)).isoformat()
-        supabase.table("users").update({
+        await asupabase.table("users").update({
             "password": hashed_password,
             "first_name": req.firstName,
             "last_name": req.lastName,
             "verification_token": verification_token,
             "verification_token_expires_at": token_expires
         }).eq("email", req.email).execute()
-        send_verification_email(req.email, req.firstName, verification_token)
+        outbox.enqueue("verification_email", {"to_email": req.email, "first_name": req.firstName, "token": verification_token})
         return { "message": "Account created! Please check your email to verify your account." }
 
-    hashed_password = hash_password(req.password)
+    hashed_password = await hash_password(req.password)
     verification_token = secrets.token_urlsafe(32)
     token_expires = (datetime.now(timezone.utc) + timedelta(hours=24)).isoformat()
 
-    supabase.table("users").insert({
+    await asupabase.table("users").insert({
         "email": req.email,
         "password": hashed_password,
         "first_name": req.firstName,
@@ -732,8 +1007,8 @@ def register(req: RegisterRequest):
         "verification_token_expires_at": token_expires
     }).execute()
 
-    create_loyalty_account(req.email, req.referral_code)
-    send_verification_email(req.email, req.firstName, verification_token)
+    await run_in_threadpool(create_loyalty_account, req.email, req.referral_code)
+    outbox.enqueue("verification_email", {"to_email": req.email, "first_name": req.firstName, "token": verification_token})
 
     return { "message": "Account created! Please check your email to verify your account." }
 
@@ -784,7 +1059,7 @@ def resend_verification(req: ResendVerificationRequest):
         "verification_token_expires_at": token_expires
     }).eq("email", req.email).execute()
 
-    send_verification_email(req.email, user["first_name"], verification_token)
+    outbox.enqueue("verification_email", {"to_email": req.email, "first_name": user["first_name"], "token": verification_token})
     return { "message": "If that email is registered, a verification link has been sent." }
 
 
@@ -810,53 +1085,14 @@ def forgot_password(req: ForgotPasswordRequest):
         "reset_token_expires_at": token_expires
     }).eq("email", req.email).execute()
 
-    reset_url = f"{APP_URL}/reset-password?token={reset_token}"
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <body style="margin:0;padding:0;background:#fdf0f5;font-family:'Segoe UI',Arial,sans-serif;">
-      <table width="100%" cellpadding="0" cellspacing="0">
-        <tr><td align="center" style="padding:40px 16px;">
-          <table width="520" cellpadding="0" cellspacing="0" style="background:#fff;border-radius:16px;overflow:hidden;box-shadow:0 4px 24px rgba(200,75,122,0.1);">
-            <tr><td style="background:linear-gradient(135deg,#c84b7a,#9c2d55);padding:32px 40px;text-align:center;">
-              <div style="font-size:2rem;">🌸</div>
-              <div style="color:#fff;font-size:1.5rem;font-weight:800;margin-top:8px;">FloranFlowers</div>
-            </td></tr>
-            <tr><td style="padding:40px;">
-              <h2 style="margin:0 0 12px;color:#1e1e1e;font-size:1.35rem;font-weight:800;">Reset your password</h2>
-              <p style="color:#666;line-height:1.6;margin:0 0 28px;">Hi {user['first_name']}, we received a request to reset your password. Click the button below to set a new one.</p>
-              <div style="text-align:center;margin-bottom:28px;">
-                <a href="{reset_url}" style="display:inline-block;padding:14px 36px;background:linear-gradient(135deg,#c84b7a,#9c2d55);color:#fff;text-decoration:none;border-radius:999px;font-weight:700;font-size:1rem;box-shadow:0 4px 16px rgba(200,75,122,0.35);">Reset Password</a>
-              </div>
-              <p style="color:#999;font-size:0.82rem;line-height:1.6;margin:0;">This link expires in <strong>1 hour</strong>. If you didn't request this, ignore this email.</p>
-              <hr style="border:none;border-top:1px solid #f0e0e8;margin:24px 0;">
-              <p style="color:#bbb;font-size:0.75rem;margin:0;">Or copy: <span style="color:#c84b7a;">{reset_url}</span></p>
-            </td></tr>
-          </table>
-        </td></tr>
-      </table>
-    </body>
-    </html>
-    """
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = "Reset your VivaPetals password"
-    msg["From"]    = f"VivaPetals <{GMAIL_USER}>"
-    msg["To"]      = req.email
-    msg.attach(MIMEText(html, "html"))
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(GMAIL_USER, GMAIL_APP_PASSWORD)
-            server.sendmail(GMAIL_USER, req.email, msg.as_string())
-        print(f"[Email] Password reset email sent to {req.email}")
-    except Exception as e:
-        print(f"[Email] Failed to send reset email: {e}")
+    outbox.enqueue("password_reset_email", {"to_email": req.email, "first_name": user["first_name"], "token": reset_token})
 
     return { "message": "If that email is registered, a reset link has been sent." }
 
 
 @app.post("/api/auth/reset-password")
-def reset_password(req: ResetPasswordRequest):
-    result = supabase.table("users").select("*").eq("reset_token", req.token).execute()
+async def reset_password(req: ResetPasswordRequest):
+    result = await asupabase.table("users").select("*").eq("reset_token", req.token).execute()
     if not result.data:
         raise HTTPException(status_code=400, detail="Invalid or expired reset link.")
 
@@ -867,8 +1103,8 @@ def reset_password(req: ResetPasswordRequest):
         if datetime.now(timezone.utc) > expiry:
             raise HTTPException(status_code=400, detail="Reset link has expired. Please request a new one.")
 
-    supabase.table("users").update({
-        "password": hash_password(req.new_password),
+    await asupabase.table("users").update({
+        "password": await hash_password(req.new_password),
         "reset_token": None,
         "reset_token_expires_at": None
     }).eq("email", user["email"]).execute()
@@ -877,20 +1113,26 @@ def reset_password(req: ResetPasswordRequest):
 
 
 @app.post("/api/auth/login")
-def login(req: LoginRequest):
-    result = supabase.table("users").select("*").eq("email", req.email).execute()
+async def login(req: LoginRequest):
+    result = await asupabase.table("users").select("*").eq("email", req.email).execute()
     if not result.data:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     user = result.data[0]
-    if not verify_password(req.password, user["password"]):
+    if not await verify_password(req.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if password_hasher.needs_rehash(user["password"]):
+        spawn(_rehash_password(user["email"], req.password))
 
     if not user.get("is_verified", False):
         raise HTTPException(status_code=403, detail="Please verify your email before signing in. Check your inbox for the verification link.")
 
     token = str(uuid.uuid4())
-    tokens[token] = req.email
+    await run_in_threadpool(sessions.set, token, {
+        "email": req.email,
+        "is_admin": bool(user.get("is_admin", False)),
+        "role_expires": time.time() + ADMIN_ROLE_TTL,
+    })
 
     return {
         "token": token,
@@ -905,55 +1147,42 @@ def login(req: LoginRequest):
 
 # ── Social Auth ────────────────────────────────────────────────────────────────
 
+# Provider token checks share one keep-alive client; tokens that verified are
+# remembered (by hash) for OAUTH_CACHE_SECONDS so SPA retries skip the provider.
+# The provider URLs can point at benchmarks/oauth_stub.py for testing.
+_oauth_http: Optional[_httpx.AsyncClient] = None
+oauth_verifier: Optional[OAuthVerifier] = None
+
+@app.on_event("startup")
+async def open_oauth_client():
+    global _oauth_http, oauth_verifier
+    _oauth_http = _httpx.AsyncClient(
+        timeout=_httpx.Timeout(10.0, connect=5.0),
+        limits=_httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120),
+    )
+    oauth_verifier = OAuthVerifier(
+        _oauth_http,
+        ttl=float(os.getenv("OAUTH_CACHE_SECONDS", "300")),
+        google_url=os.getenv("GOOGLE_USERINFO_URL", oauth.GOOGLE_USERINFO_URL),
+        facebook_url=os.getenv("FACEBOOK_ME_URL", oauth.FACEBOOK_ME_URL),
+    )
+
+@app.on_event("shutdown")
+async def close_oauth_client():
+    if _oauth_http is not None:
+        await _oauth_http.aclose()
+
 class SocialAuthRequest(BaseModel):
     provider: str  # 'google' or 'facebook'
     token: str     # id_token (Google) or accessToken (Facebook)
 
 @app.post("/api/auth/social")
-def social_auth(req: SocialAuthRequest):
-    email: str | None = None
-    first_name = "User"
-    last_name = ""
-
-    if req.provider == "google":
-        try:
-            # Verify access_token by calling Google's userinfo endpoint
-            r = _httpx.get(
-                "https://www.googleapis.com/oauth2/v2/userinfo",
-                headers={"Authorization": f"Bearer {req.token}"},
-                timeout=10
-            )
-            data = r.json()
-            if r.status_code != 200 or "error" in data:
-                raise HTTPException(status_code=401, detail="Invalid Google token. Please try again.")
-            email      = data.get("email")
-            first_name = data.get("given_name") or data.get("name", "User").split()[0]
-            last_name  = data.get("family_name", "")
-        except HTTPException:
-            raise
-        except Exception:
-            raise HTTPException(status_code=401, detail="Google sign-in verification failed.")
-
-    elif req.provider == "facebook":
-        try:
-            r = _httpx.get(
-                "https://graph.facebook.com/me",
-                params={"fields": "id,name,email,first_name,last_name", "access_token": req.token},
-                timeout=10
-            )
-            data = r.json()
-            if r.status_code != 200 or "error" in data:
-                raise HTTPException(status_code=401, detail="Invalid Facebook token. Please try again.")
-            email      = data.get("email")
-            first_name = data.get("first_name") or data.get("name", "User").split()[0]
-            last_name  = data.get("last_name", "")
-        except HTTPException:
-            raise
-        except Exception:
-            raise HTTPException(status_code=401, detail="Facebook sign-in verification failed.")
-
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported provider.")
+async def social_auth(req: SocialAuthRequest):
+    try:
+        profile = await oauth_verifier.verify(req.provider, req.token)
+    except OAuthError as e:
+        raise HTTPException(status_code=e.status, detail=e.detail)
+    email, first_name, last_name = profile["email"], profile["first_name"], profile["last_name"]
 
     if not email:
         raise HTTPException(
@@ -962,30 +1191,33 @@ def social_auth(req: SocialAuthRequest):
         )
 
     # ── Find or create user ──────────────────────────────────────────────────
-    existing = supabase.table("users").select("*").eq("email", email).execute()
+    existing = await asupabase.table("users").select("*").eq("email", email).execute()
 
     if existing.data:
         user = existing.data[0]
         # Auto-verify any account that signs in via trusted OAuth provider
         if not user.get("is_verified"):
-            supabase.table("users").update({"is_verified": True}).eq("email", email).execute()
+            await asupabase.table("users").update({"is_verified": True}).eq("email", email).execute()
             user["is_verified"] = True
     else:
-        # Create a new social user — no password needed, pre-verified
-        random_pw = hash_password(secrets.token_urlsafe(32))
-        result = supabase.table("users").insert({
+        # Create a new social user — no password needed (none can match UNUSABLE_PASSWORD), pre-verified
+        result = await asupabase.table("users").insert({
             "email":      email,
-            "password":   random_pw,
+            "password":   UNUSABLE_PASSWORD,
             "first_name": first_name,
             "last_name":  last_name,
             "is_verified": True
         }).execute()
         user = result.data[0]
-        create_loyalty_account(email)
+        await run_in_threadpool(create_loyalty_account, email)
 
     # Issue app session token
     token = str(uuid.uuid4())
-    tokens[token] = email
+    await run_in_threadpool(sessions.set, token, {
+        "email": email,
+        "is_admin": bool(user.get("is_admin", False)),
+        "role_expires": time.time() + ADMIN_ROLE_TTL,
+    })
 
     return {
         "token": token,
@@ -1002,116 +1234,381 @@ def social_auth(req: SocialAuthRequest):
 # ── Admin Routes ───────────────────────────────────────────────────────────────
 
 def require_admin(token: str):
-    email = tokens.get(token)
+    session = sessions.get(token)
+    email = session["email"] if session else None
     if not email:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    result = supabase.table("users").select("is_admin").eq("email", email).execute()
-    if not result.data or not result.data[0].get("is_admin"):
+    # The role is cached on the session for ADMIN_ROLE_TTL seconds so a dashboard
+    # refresh (five admin calls) doesn't re-read `users` five times.
+    is_admin = session.get("is_admin")
+    if is_admin is None or session.get("role_expires", 0) <= time.time():
+        result = supabase.table("users").select("is_admin").eq("email", email).execute()
+        is_admin = bool(result.data and result.data[0].get("is_admin"))
+        sessions.update(token, {"is_admin": is_admin, "role_expires": time.time() + ADMIN_ROLE_TTL})
+    if not is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     return email
 
+def invalidate_admin_role(email: str):
+    """Force every session of `email` to re-read its admin flag on the next admin call."""
+    sessions.drop_fields_for_email(email, "is_admin", "role_expires")
+
+# Calendar dates in admin filters are days in the store's timezone.
+STORE_TZ = os.getenv("STORE_TZ", "Asia/Kolkata")
+
+def _parse_range_bound(value: str, tz: ZoneInfo, end: bool = False) -> int:
+    """'YYYY-MM-DD' (a whole local day; `end` is inclusive) or an ISO datetime -> epoch seconds."""
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date '{value}'")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=tz)
+    try:
+        if end and len(value) == 10:
+            dt = dt + timedelta(days=1)
+        return int(dt.timestamp())
+    except (OverflowError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Date out of range '{value}'")
+
+def _utc_iso(ts: int) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+# Dashboard counters, kept current by the order write paths below.
+order_rollups = OrderRollups(os.path.join(DATA_DIR, "order_rollups.db"))
+
+# Products each customer has bought (non-cancelled orders), for verified-purchase checks
+purchase_index = PurchaseIndex(os.path.join(DATA_DIR, "purchases.db"),
+                               cache_size=int(os.getenv("PURCHASE_CACHE_SIZE", "10000")))
+
+def normalize_city(raw: str) -> str:
+    """'  new   DELHI ' -> 'New Delhi' — the form stored in orders.city."""
+    return string.capwords(raw or "")
+
+def order_city(order: dict) -> str:
+    """orders.city, or for orders placed before that column existed, the second part of the address."""
+    if order.get("city"):
+        return order["city"]
+    parts = [p.strip() for p in (order.get("customer_address") or "").split(",")]
+    return normalize_city(parts[1]) if len(parts) >= 2 else ""
+
+def rebuild_order_rollups() -> int:
+    orders = fetch_all_rows("orders", "id, customer_email, status, total, created_at, city, customer_address")
+    products: dict = {}
+    for it in fetch_all_rows("order_items", "order_id, product_id"):
+        products.setdefault(it["order_id"], []).append(it["product_id"])
+    return order_rollups.rebuild(({**o, "city": order_city(o)} for o in orders), products)
+
+def rebuild_purchase_index() -> int:
+    emails = {o["id"]: o["customer_email"]
+              for page in iter_pages("orders", "id, customer_email", where=lambda q: q.neq("status", "cancelled"))
+              for o in page}
+    products: dict = {}
+    for it in fetch_all_rows("order_items", "order_id, product_id"):
+        if it["order_id"] in emails:
+            products.setdefault(it["order_id"], []).append(it["product_id"])
+    return purchase_index.rebuild((emails[oid], pids) for oid, pids in products.items())
+
+def _rollup_transition(order: dict, new_status: str):
+    if new_status == "cancelled":
+        trending.remove(order["id"])
+    try:
+        product_ids = []
+        if (order["status"] == "cancelled") != (new_status == "cancelled"):
+            product_ids = [it["product_id"] for it in supabase.table("order_items").select("product_id")
+                           .eq("order_id", order["id"]).execute().data or []]
+            if new_status == "cancelled":
+                purchase_index.remove(order.get("customer_email"), product_ids)
+            else:
+                purchase_index.add(order.get("customer_email"), product_ids)
+        order_rollups.record_transition((order.get("created_at") or "")[:10], order["status"], new_status,
+                                        order.get("total") or 0, order.get("customer_email") or "",
+                                        order_city(order), product_ids)
+    except Exception as e:
+        print(f"[Rollups] transition not recorded for {order.get('id')}: {e}")
+
+@app.on_event("startup")
+def seed_order_rollups():
+    if order_rollups.is_empty():
+        try:
+            print(f"[Rollups] rebuilt from {rebuild_order_rollups()} orders")
+        except Exception as e:
+            print(f"[Rollups] initial rebuild failed: {e}")
+
+@app.on_event("startup")
+def seed_purchase_index():
+    if purchase_index.is_empty():
+        try:
+            print(f"[Purchases] index rebuilt from {rebuild_purchase_index()} orders")
+        except Exception as e:
+            print(f"[Purchases] initial rebuild failed: {e}")
+
 @app.get("/api/admin/stats")
 def admin_stats(token: str):
     require_admin(token)
-    all_orders = supabase.table("orders").select("id, status, total, created_at").execute().data
-    today = datetime.utcnow().strftime("%Y-%m-%d")
-    total_orders = len(all_orders)
-    today_orders = sum(1 for o in all_orders if o.get("created_at", "").startswith(today))
-    pending_count = sum(1 for o in all_orders if o.get("status") in ("confirmed", "preparing"))
-    revenue_total = sum(o.get("total", 0) for o in all_orders if o.get("status") != "cancelled")
-    revenue_today = sum(o.get("total", 0) for o in all_orders if o.get("created_at", "").startswith(today) and o.get("status") != "cancelled")
-    return {
-        "total_orders": total_orders,
-        "today_orders": today_orders,
-        "pending_count": pending_count,
-        "revenue_total": round(revenue_total, 2),
-        "revenue_today": round(revenue_today, 2)
-    }
+    return order_rollups.stats(datetime.utcnow().strftime("%Y-%m-%d"))
 
-@app.get("/api/admin/orders")
-def admin_orders(token: str, status: str = None):
+@app.post("/api/admin/stats/rebuild")
+def admin_rebuild_stats(token: str):
+    require_admin(token)
+    return {"orders": rebuild_order_rollups()}
+
+@app.get("/api/admin/checkout/latency")
+def admin_checkout_latency(token: str):
+    """Per-stage checkout latency percentiles (ms) over the most recent orders."""
     require_admin(token)
-    query = supabase.table("orders").select("*").order("created_at", desc=True)
+    return checkout_latency.summary()
+
+@app.get("/api/admin/auth/health")
+def admin_auth_health(token: str):
+    """bcrypt executor load (queue depth, rejections, average wait/run time) and OAuth cache hits."""
+    require_admin(token)
+    return {"bcrypt": password_hasher.stats(), "oauth": oauth_verifier.stats() if oauth_verifier else None}
+
+@app.get("/api/admin/notifications/health")
+def admin_notifications_health(token: str):
+    require_admin(token)
+    return {"outbox": outbox.counts(), "smtp": smtp_pool.stats(), "twilio": twilio_dispatcher.stats()}
+
+ORDER_STATUSES = list(VALID_STATUS_TRANSITIONS)
+
+def _encode_cursor(*values) -> str:
+    return _base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str, n: int) -> list:
+    try:
+        values = json.loads(_base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        values = None
+    # Cursor values are spliced into a PostgREST filter, so only accept plain strings/numbers
+    if (not isinstance(values, list) or len(values) != n
+            or any(not isinstance(v, (str, int, float)) or any(c in str(v) for c in '",()\\') for v in values)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+@app.get("/api/admin/orders")
+async def admin_orders(token: str, status: Optional[str] = None,
+                       from_: Optional[str] = Query(None, alias="from"), to: Optional[str] = None,
+                       delivery_type: Optional[str] = None, payment_method: Optional[str] = None,
+                       cursor: Optional[str] = None, limit: int = Query(50, ge=1, le=200)):
+    """One page of orders, newest first, keyset-paginated on (created_at, id).
+
+    Pass the returned `next_cursor` back as `cursor` for the following page.
+    The first page also carries per-status `facets` for the same filters.
+    """
+    await run_in_threadpool(require_admin, token)
+    zone = ZoneInfo(STORE_TZ)
+    start = _parse_range_bound(from_, zone) if from_ else None
+    end = _parse_range_bound(to, zone, end=True) if to else None
+
+    def filtered(query):
+        if start is not None:
+            query = query.gte("created_at", _utc_iso(start))
+        if end is not None:
+            query = query.lt("created_at", _utc_iso(end))
+        if delivery_type:
+            query = query.eq("delivery_type", delivery_type)
+        if payment_method:
+            query = query.eq("payment_method", payment_method)
+        return query
+
+    page_query = filtered(asupabase.table("orders").select("*"))
     if status:
-        query = query.eq("status", status)
-    orders = query.execute().data
-    if not orders:
-        return []
-    order_ids = [o["id"] for o in orders]
-    items_result = supabase.table("order_items").select("*").in_("order_id", order_ids).execute()
-    items_by_order: dict = {}
-    for item in items_result.data:
-        product = next((p for p in PRODUCTS if p["id"] == item["product_id"]), None)
-        item["image"] = product["image"] if product else ""
-        items_by_order.setdefault(item["order_id"], []).append(item)
-    for order in orders:
-        order["items"] = items_by_order.get(order["id"], [])
-    return orders
+        page_query = page_query.eq("status", status)
+    if cursor:
+        after_created, after_id = _decode_cursor(cursor, 2)
+        page_query = page_query.or_(
+            f'created_at.lt."{after_created}",and(created_at.eq."{after_created}",id.lt."{after_id}")'
+        )
+    page_query = page_query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1)
+
+    lookups = [page_query.execute()]
+    if not cursor:
+        lookups += [
+            filtered(asupabase.table("orders").select("id", count="exact", head=True)).eq("status", s).execute()
+            for s in ORDER_STATUSES
+        ]
+    page_result, *facet_results = await asyncio.gather(*lookups)
+
+    orders = page_result.data or []
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = _encode_cursor(orders[-1]["created_at"], orders[-1]["id"])
+
+    if orders:
+        items_result = await asupabase.table("order_items").select("*").in_("order_id", [o["id"] for o in orders]).execute()
+        items_by_order: dict = {}
+        for item in items_result.data:
+            item["image"] = catalog.image(item["product_id"])
+            items_by_order.setdefault(item["order_id"], []).append(item)
+        for order in orders:
+            order["items"] = items_by_order.get(order["id"], [])
+
+    response = {"orders": orders, "next_cursor": next_cursor}
+    if facet_results:
+        facets = {s: r.count or 0 for s, r in zip(ORDER_STATUSES, facet_results)}
+        facets["all"] = sum(facets.values())
+        response["facets"] = facets
+    return response
+
+CUSTOMER_FIELDS = "id, email, first_name, last_name, created_at, is_verified"
+
+def _customer_row(user: dict, totals) -> dict:
+    orders, spent, last_order = totals or (0, 0.0, "")
+    return {**user, "order_count": orders, "total_spent": round(spent, 2), "last_order": last_order}
 
 @app.get("/api/admin/customers")
-def admin_customers(token: str):
+def admin_customers(token: str, sort: str = "joined", q: Optional[str] = None,
+                    cursor: Optional[str] = None, limit: int = Query(50, ge=1, le=200)):
+    """One page of customers with their order count, spend and last order.
+
+    `sort` is "joined" (newest accounts first), "spend" or "recent" (latest order
+    first); the last two only list customers who have ordered. `q` matches an
+    email prefix. Order totals come from the local rollups, so each call reads
+    one page of users and no orders.
+    """
     require_admin(token)
-    users = supabase.table("users").select("id, email, first_name, last_name, created_at, is_verified").order("created_at", desc=True).execute().data or []
-    orders = supabase.table("orders").select("id, customer_email, total, status, created_at").execute().data or []
-    order_map: dict = {}
-    for o in orders:
-        em = o["customer_email"]
-        if em not in order_map:
-            order_map[em] = {"count": 0, "total": 0.0, "last_order": ""}
-        order_map[em]["count"] += 1
-        if o.get("status") != "cancelled":
-            order_map[em]["total"] += o.get("total", 0)
-        if o.get("created_at", "") > order_map[em]["last_order"]:
-            order_map[em]["last_order"] = o["created_at"]
-    result = []
-    for u in users:
-        em = u["email"]
-        stats = order_map.get(em, {"count": 0, "total": 0.0, "last_order": ""})
-        result.append({**u, "order_count": stats["count"], "total_spent": round(stats["total"], 2), "last_order": stats["last_order"]})
-    return result
+    if sort != "joined" and sort not in CUSTOMER_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of joined, {', '.join(CUSTOMER_SORTS)}")
+    prefix = (q or "").strip()
+    next_cursor = None
+
+    if sort == "joined":
+        query = supabase.table("users").select(CUSTOMER_FIELDS)
+        if prefix:
+            escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query = query.ilike("email", f"{escaped}%")
+        if cursor:
+            after_created, after_id = _decode_cursor(cursor, 2)
+            query = query.or_(f'created_at.lt."{after_created}",and(created_at.eq."{after_created}",id.lt."{after_id}")')
+        users = query.order("created_at", desc=True).order("id", desc=True).limit(limit + 1).execute().data or []
+        more = len(users) > limit
+        users = users[:limit]
+        totals = order_rollups.customer_totals(u["email"] for u in users)
+        customers = [_customer_row(u, totals.get(u["email"].lower())) for u in users]
+        if more:
+            next_cursor = _encode_cursor(users[-1]["created_at"], users[-1]["id"])
+        if not cursor:
+            count_query = supabase.table("users").select("id", count="exact", head=True)
+            if prefix:
+                count_query = count_query.ilike("email", f"{escaped}%")
+            total = count_query.execute().count or 0
+    else:
+        after = _decode_cursor(cursor, 2) if cursor else None
+        rows = order_rollups.customer_page(sort, limit + 1, after, prefix)
+        more = len(rows) > limit
+        rows = rows[:limit]
+        users = {}
+        if rows:
+            found = supabase.table("users").select(CUSTOMER_FIELDS).in_("email", [r[0] for r in rows]).execute().data or []
+            users = {u["email"].lower(): u for u in found}
+        # Guest checkouts have no users row; list them by email alone
+        customers = [_customer_row(users.get(r[0].lower(), {"id": None, "email": r[0]}), r[1:]) for r in rows]
+        if more:
+            last = rows[-1]
+            next_cursor = _encode_cursor(last[2] if sort == "spend" else last[3], last[0])
+        if not cursor:
+            total = order_rollups.customer_count(prefix)
+
+    response = {"customers": customers, "next_cursor": next_cursor}
+    if not cursor:
+        response["total"] = total
+    return response
+
+class AdminFlagUpdate(BaseModel):
+    is_admin: bool
+
+@app.patch("/api/admin/customers/{email}/admin")
+def set_customer_admin(email: str, req: AdminFlagUpdate, token: str):
+    require_admin(token)
+    result = supabase.table("users").update({"is_admin": req.is_admin}).eq("email", email).execute()
+    if not result.data:
+        raise HTTPException(status_code=404, detail="User not found")
+    invalidate_admin_role(email)
+    return {"email": email, "is_admin": req.is_admin}
+
+ANALYTICS_PAGE_SIZE = int(os.getenv("ANALYTICS_PAGE_SIZE", "1000"))
 
 @app.get("/api/admin/analytics")
-def admin_analytics(token: str):
+def admin_analytics(token: str, from_: Optional[str] = Query(None, alias="from"), to: Optional[str] = None,
+                    bucket: str = "day", tz: str = STORE_TZ):
     require_admin(token)
-    all_orders = supabase.table("orders").select("id, total, status, created_at").order("created_at", desc=True).execute().data or []
-    now = datetime.now(timezone.utc)
-    # Revenue last 30 days by day
-    revenue_by_day: dict = {}
-    for i in range(30):
-        day = (now - timedelta(days=29 - i)).strftime("%Y-%m-%d")
-        revenue_by_day[day] = 0.0
-    for o in all_orders:
-        if o.get("status") == "cancelled":
-            continue
-        day = (o.get("created_at") or "")[:10]
-        if day in revenue_by_day:
-            revenue_by_day[day] += o.get("total", 0)
-    revenue_chart = [{"date": d, "revenue": round(v, 2)} for d, v in revenue_by_day.items()]
-    # Top products
-    all_items = supabase.table("order_items").select("product_id, name, quantity, price").execute().data or []
-    product_totals: dict = {}
-    for item in all_items:
-        pid = item["product_id"]
-        if pid not in product_totals:
-            product_totals[pid] = {"name": item["name"], "qty": 0, "revenue": 0.0}
-        product_totals[pid]["qty"] += item.get("quantity", 1)
-        product_totals[pid]["revenue"] += item.get("price", 0) * item.get("quantity", 1)
-    top_products = sorted(product_totals.values(), key=lambda x: x["revenue"], reverse=True)[:10]
-    for p in top_products:
-        p["revenue"] = round(p["revenue"], 2)
-    # Peak hours (IST offset +5:30)
-    hour_counts = [0] * 24
-    for o in all_orders:
-        ts = o.get("created_at")
-        if ts:
-            try:
-                dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-                ist_hour = (dt.hour + 5) % 24  # rough IST
-                hour_counts[ist_hour] += 1
-            except Exception:
-                pass
-    peak_hours = [{"hour": i, "count": hour_counts[i]} for i in range(24)]
-    return {"revenue_chart": revenue_chart, "top_products": top_products, "peak_hours": peak_hours}
+    if bucket not in analytics.BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(analytics.BUCKETS)}")
+    try:
+        zone = ZoneInfo(tz)
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Unknown timezone '{tz}'")
+
+    now = int(time.time())
+    start = _parse_range_bound(from_, zone) if from_ else None
+    end = _parse_range_bound(to, zone, end=True) if to else None
+
+    # Without an explicit range the chart shows the last 30 local days and the
+    # other metrics cover all history, as the dashboard always has.
+    if start is None:
+        today = datetime.fromtimestamp(now, zone).replace(hour=0, minute=0, second=0, microsecond=0)
+        chart_start = int((today - timedelta(days=29)).timestamp())
+    else:
+        chart_start = start
+    chart_end = end if end is not None else now + 1
+    if chart_end <= chart_start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    # A long range charts in coarser buckets rather than building a huge series
+    bucket = analytics.fit_bucket(chart_start, chart_end, bucket, zone)
+    if bucket is None:
+        raise HTTPException(status_code=400,
+                            detail=f"Range too long: more than {analytics.MAX_BUCKETS} monthly buckets")
+
+    def in_range(query):
+        if start is not None:
+            query = query.gte("created_at", _utc_iso(start))
+        if end is not None:
+            query = query.lt("created_at", _utc_iso(end))
+        return query
+
+    orders = analytics.OrderColumns(iter_pages(
+        "orders", "id, customer_email, total, status, created_at", ANALYTICS_PAGE_SIZE, in_range))
+    item_columns = "id, order_id, product_id, quantity, price"
+    if start is None and end is None:
+        item_pages = iter_pages("order_items", item_columns, ANALYTICS_PAGE_SIZE)
+    else:
+        # A bounded range reads only the lines of its own orders, 200 ids per filter
+        ids = list(orders.index)
+        item_pages = (page for i in range(0, len(ids), 200)
+                      for page in iter_pages("order_items", item_columns, ANALYTICS_PAGE_SIZE,
+                                             lambda q, chunk=ids[i:i + 200]: q.in_("order_id", chunk)))
+    items = analytics.ItemColumns(item_pages, orders)
+
+    selected = orders.mask(start, end)
+    # Top products and peak hours count every order placed, cancelled or not,
+    # as they always have; revenue, RFM and cohorts leave cancelled orders out.
+    placed = orders.mask(start, end, include_cancelled=True)
+
+    top_products = []
+    for pid, qty, revenue in analytics.top_products(items, placed, 10):
+        product = catalog.get(pid)
+        if product:
+            name = product["name"]
+        else:
+            row = supabase.table("order_items").select("name").eq("product_id", pid).limit(1).execute().data
+            name = row[0]["name"] if row else f"Product {pid}"
+        top_products.append({"product_id": pid, "name": name, "qty": qty, "revenue": revenue})
+
+    return {
+        "range": {
+            "from": datetime.fromtimestamp(chart_start, zone).isoformat(),
+            "to": datetime.fromtimestamp(chart_end, zone).isoformat(),
+            "bucket": bucket,
+            "tz": tz,
+        },
+        "revenue_chart": analytics.revenue_series(orders, chart_start, chart_end, bucket, zone),
+        "top_products": top_products,
+        "peak_hours": analytics.peak_hours(orders, placed, zone),
+        "rfm": analytics.rfm(orders, selected, now),
+        "cohorts": analytics.cohorts(orders, selected, zone),
+    }
 
 @app.get("/api/admin/inventory")
 def admin_inventory(token: str):
@@ -1119,7 +1616,7 @@ def admin_inventory(token: str):
     stock_rows = supabase.table("product_stock").select("*").execute().data or []
     stock_map = {r["product_id"]: r["stock"] for r in stock_rows}
     result = []
-    for p in PRODUCTS:
+    for p in catalog.products:
         stock = stock_map.get(p["id"], 50)
         result.append({"id": p["id"], "name": p["name"], "category": p["category"], "price": p["price"], "stock": stock, "low_stock": stock < 10})
     return result
@@ -1197,12 +1694,10 @@ def submit_contact(req: ContactRequest):
 
 @app.get("/api/loyalty")
 def get_loyalty(email: str):
-    acct_result = supabase.table("loyalty_accounts").select("*").eq("user_email", email).execute()
-    if not acct_result.data:
+    acct = ledger.account(email)
+    if not acct:
         raise HTTPException(status_code=404, detail="No loyalty account found")
-    acct = acct_result.data[0]
-    txn_result = supabase.table("loyalty_transactions").select("*").eq("user_email", email).order("created_at", desc=True).limit(20).execute()
-    return {**acct, "transactions": txn_result.data}
+    return {**acct, "transactions": ledger.transactions(email, 20)}
 
 # ── Promo Routes ───────────────────────────────────────────────────────────────
 
@@ -1237,9 +1732,8 @@ def validate_promo(req: PromoValidateRequest):
 def get_offers():
     enriched_bundles = []
     for bundle in BUNDLE_DEALS:
-        products = [p for p in PRODUCTS if p["id"] in bundle["product_ids"]]
         # preserve order of product_ids
-        products_ordered = sorted(products, key=lambda p: bundle["product_ids"].index(p["id"]))
+        products_ordered = [catalog.by_id[pid] for pid in bundle["product_ids"] if pid in catalog.by_id]
         original_price = sum(p["price"] for p in products_ordered)
         bundle_price = round(original_price * (1 - bundle["savings_pct"] / 100), 2)
         enriched_bundles.append({
@@ -1253,11 +1747,11 @@ def get_offers():
 # ── Cart Routes ─────────────────────────────────────────────────────────────────
 
 @app.get("/api/cart")
-def get_cart(user_id: str):
-    result = supabase.table("cart_items").select("*").eq("user_id", user_id).execute()
+async def get_cart(user_id: str):
+    result = await asupabase.table("cart_items").select("*").eq("user_id", user_id).execute()
     cart = []
     for item in result.data:
-        product = next((p for p in PRODUCTS if p["id"] == item["product_id"]), None)
+        product = catalog.get(item["product_id"])
         if product:
             cart.append({"product": product, "quantity": item["quantity"]})
     return cart
@@ -1284,54 +1778,62 @@ def clear_cart(user_id: str):
 # ── Orders Route ───────────────────────────────────────────────────────────────
 
 @app.get("/api/orders")
-def get_user_orders(email: str):
-    orders_result = supabase.table("orders").select("*").eq("customer_email", email).order("created_at", desc=True).execute()
+async def get_user_orders(email: str):
+    orders_result = await asupabase.table("orders").select("*").eq("customer_email", email).order("created_at", desc=True).execute()
     orders = orders_result.data
     if not orders:
         return []
     order_ids = [o["id"] for o in orders]
-    items_result = supabase.table("order_items").select("*").in_("order_id", order_ids).execute()
+    items_result, notifs_result = await asyncio.gather(
+        asupabase.table("order_items").select("*").in_("order_id", order_ids).execute(),
+        asupabase.table("order_notifications").select("id, order_id, channel, status, sent_at").in_("order_id", order_ids).order("sent_at").execute(),
+        return_exceptions=True,
+    )
+    if isinstance(items_result, Exception):
+        raise items_result
     items_by_order: dict = {}
     for item in items_result.data:
-        product = next((p for p in PRODUCTS if p["id"] == item["product_id"]), None)
-        item["image"] = product["image"] if product else ""
+        item["image"] = catalog.image(item["product_id"])
         items_by_order.setdefault(item["order_id"], []).append(item)
     notifs_by_order: dict = {}
-    try:
-        notifs_result = supabase.table("order_notifications").select("id, order_id, channel, status, sent_at").in_("order_id", order_ids).order("sent_at").execute()
+    if not isinstance(notifs_result, Exception):
         for n in notifs_result.data:
             notifs_by_order.setdefault(n["order_id"], []).append({
                 "id": n["id"], "channel": n["channel"], "status": n["status"], "sent_at": n["sent_at"]
             })
-    except Exception:
-        pass
     for order in orders:
         order["items"] = items_by_order.get(order["id"], [])
         order["notifications"] = notifs_by_order.get(order["id"], [])
     return orders
 
 @app.get("/api/orders/{order_id}")
-def get_order(order_id: str):
-    result = supabase.table("orders").select("*").eq("id", order_id).execute()
+async def get_order(order_id: str):
+    result, items_result, notifs_result = await asyncio.gather(
+        asupabase.table("orders").select("*").eq("id", order_id).execute(),
+        asupabase.table("order_items").select("*").eq("order_id", order_id).execute(),
+        asupabase.table("order_notifications").select("id, order_id, channel, status, sent_at").eq("order_id", order_id).order("sent_at").execute(),
+        return_exceptions=True,
+    )
+    if isinstance(result, Exception):
+        raise result
     if not result.data:
         raise HTTPException(status_code=404, detail="Order not found")
     order = result.data[0]
-    items_result = supabase.table("order_items").select("*").eq("order_id", order_id).execute()
+    if isinstance(items_result, Exception):
+        raise items_result
     items = items_result.data
     for item in items:
-        product = next((p for p in PRODUCTS if p["id"] == item["product_id"]), None)
-        item["image"] = product["image"] if product else ""
+        item["image"] = catalog.image(item["product_id"])
     order["items"] = items
-    try:
-        notifs_result = supabase.table("order_notifications").select("id, order_id, channel, status, sent_at").eq("order_id", order_id).order("sent_at").execute()
-        order["notifications"] = [{"id": n["id"], "channel": n["channel"], "status": n["status"], "sent_at": n["sent_at"]} for n in notifs_result.data]
-    except Exception:
+    if isinstance(notifs_result, Exception):
         order["notifications"] = []
+    else:
+        order["notifications"] = [{"id": n["id"], "channel": n["channel"], "status": n["status"], "sent_at": n["sent_at"]} for n in notifs_result.data]
     return order
 
 @app.patch("/api/orders/{order_id}/delivery")
 def update_delivery(order_id: str, req: UpdateDeliveryRequest):
-    result = supabase.table("orders").select("status").eq("id", order_id).execute()
+    result = supabase.table("orders").select("*").eq("id", order_id).execute()
     if not result.data:
         raise HTTPException(status_code=404, detail="Order not found")
     if result.data[0]["status"] == "cancelled":
@@ -1340,6 +1842,7 @@ def update_delivery(order_id: str, req: UpdateDeliveryRequest):
         "delivery_type": req.delivery_type,
         "delivery_datetime": req.delivery_datetime
     }).eq("id", order_id).execute()
+    schedule_order_events({**result.data[0], "delivery_type": req.delivery_type, "delivery_datetime": req.delivery_datetime})
     return {"status": "updated"}
 
 @app.patch("/api/orders/{order_id}/cancel")
@@ -1351,8 +1854,10 @@ def cancel_order(order_id: str):
     if order["status"] not in ("confirmed", "preparing"):
         raise HTTPException(status_code=400, detail="Only confirmed or preparing orders can be cancelled")
     supabase.table("orders").update({"status": "cancelled"}).eq("id", order_id).execute()
+    _rollup_transition(order, "cancelled")
+    scheduler.cancel_prefix(f"order:{order_id}:")
     send_notifications(order_id, "cancelled", order.get("customer_phone") or "")
-    send_order_cancellation_email(order)
+    outbox.enqueue("order_cancellation_email", {"order": order})
     return {"status": "cancelled"}
 
 @app.patch("/api/orders/{order_id}/status")
@@ -1365,35 +1870,61 @@ def update_order_status(order_id: str, req: StatusUpdateRequest):
     if req.status not in allowed:
         raise HTTPException(status_code=400, detail=f"Cannot transition from '{order['status']}' to '{req.status}'")
     supabase.table("orders").update({"status": req.status}).eq("id", order_id).execute()
+    _rollup_transition(order, req.status)
+    schedule_order_events({**order, "status": req.status})
     send_notifications(order_id, req.status, order.get("customer_phone") or "")
     return {"status": req.status}
 
-@app.post("/api/orders")
-def create_order(req: OrderRequest):
-    order_id = "FLR" + str(uuid.uuid4())[:8].upper()
-    customer_email = req.customer.get("email", "")
-
-    next_recurrence_date = None
-    if req.is_recurring and req.recurrence_type == "annual" and req.delivery_datetime:
+def apply_checkout_points(email: str, order_id: str, points_redeemed: int, points_earned: int) -> int:
+    """Loyalty effects of an order, one ledger call each; used when the ledger isn't in Supabase."""
+    if points_redeemed > 0:
+        award_points(email, -points_redeemed, "redeemed",
+                     f"Points redeemed at checkout for order {order_id}", order_id, require_balance=True)
+    earned = award_points(email, points_earned, "earned_purchase", f"Points earned for order {order_id}", order_id)
+    if not earned:
+        return 0
+    # First-purchase referral bonus (150 pts to referrer)
+    if earned["first_of_type"] and earned["referred_by_code"]:
         try:
-            d = datetime.strptime(req.delivery_datetime[:10], "%Y-%m-%d")
-            next_year = d.replace(year=d.year + 1)
-            next_recurrence_date = next_year.strftime("%Y-%m-%d")
+            referrer_email = ledger.referrer_email(earned["referred_by_code"])
+            if referrer_email:
+                award_points(referrer_email, 150, "earned_referral_purchase",
+                             f"Referral first-purchase bonus — {email} made their first order")
         except Exception:
             pass
+    return earned["balance"]
 
-    try:
-        supabase.table("orders").insert({
+# Recent checkout stage timings, reported at /api/admin/checkout/latency
+checkout_latency = LatencyStats(int(os.getenv("CHECKOUT_LATENCY_SAMPLES", "1000")))
+
+@app.post("/api/orders")
+def create_order(req: OrderRequest, response: Response):
+    timer = StageTimer()
+    order_id = "FLR" + str(uuid.uuid4())[:8].upper()
+    customer_email = req.customer.get("email", "")
+
+    with timer.stage("prepare"):
+        next_recurrence_date = None
+        if req.is_recurring and req.recurrence_type == "annual" and req.delivery_datetime:
+            try:
+                d = datetime.strptime(req.delivery_datetime[:10], "%Y-%m-%d")
+                next_year = d.replace(year=d.year + 1)
+                next_recurrence_date = next_year.strftime("%Y-%m-%d")
+            except Exception:
+                pass
+        customer_address = ", ".join(filter(None, [
+            req.customer.get("address", ""),
+            req.customer.get("city", ""),
+            req.customer.get("state", ""),
+            req.customer.get("zip", ""),
+        ]))
+        order_row = {
             "id": order_id,
             "customer_email": customer_email,
             "customer_name": req.customer.get("name", ""),
             "customer_phone": req.customer.get("phone", ""),
-            "customer_address": ", ".join(filter(None, [
-                req.customer.get("address", ""),
-                req.customer.get("city", ""),
-                req.customer.get("state", ""),
-                req.customer.get("zip", ""),
-            ])),
+            "customer_address": customer_address,
+            "city": normalize_city(req.customer.get("city", "")),
             "total": req.total,
             "status": "confirmed",
             "delivery_type": req.delivery_type,
@@ -1402,13 +1933,8 @@ def create_order(req: OrderRequest):
             "recurrence_type": req.recurrence_type,
             "next_recurrence_date": next_recurrence_date,
             "payment_method": req.payment_method,
-        }).execute()
-    except Exception as e:
-        print(f"Order insert error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
-    if req.items:
-        supabase.table("order_items").insert([
+        }
+        item_rows = [
             {
                 "order_id": order_id,
                 "product_id": item.productId,
@@ -1417,67 +1943,57 @@ def create_order(req: OrderRequest):
                 "quantity": item.quantity
             }
             for item in req.items
-        ]).execute()
-
-    points_earned = 0
-    new_balance = 0
-
-    if customer_email:
-        # Deduct redeemed points if any
-        points_redeemed = req.points_redeemed or 0
-        if points_redeemed > 0:
-            acct = supabase.table("loyalty_accounts").select("points_balance").eq("user_email", customer_email).execute()
-            if acct.data and acct.data[0]["points_balance"] >= points_redeemed:
-                award_points(customer_email, -points_redeemed, "redeemed", f"Points redeemed at checkout for order {order_id}", order_id)
-
+        ]
         # Earn points: 1 pt per ₹1 of final total
-        points_earned = int(req.total)
-        award_points(customer_email, points_earned, "earned_purchase", f"Points earned for order {order_id}", order_id)
+        points_earned = int(req.total) if customer_email else 0
+        points_redeemed = (req.points_redeemed or 0) if customer_email else 0
 
-        # Check first-purchase referral bonus (150 pts to referrer)
+    # Order, items and (with the Supabase ledger) loyalty points commit together or not at all
+    with timer.stage("commit"):
         try:
-            acct_row = supabase.table("loyalty_accounts").select("referred_by_code").eq("user_email", customer_email).execute()
-            if acct_row.data and acct_row.data[0].get("referred_by_code"):
-                referred_by_code = acct_row.data[0]["referred_by_code"]
-                prior_purchases = supabase.table("loyalty_transactions").select("id").eq("user_email", customer_email).eq("type", "earned_purchase").execute()
-                if len(prior_purchases.data) == 1:  # This is their first purchase
-                    referrer_acct = supabase.table("loyalty_accounts").select("user_email").eq("referral_code", referred_by_code).execute()
-                    if referrer_acct.data:
-                        referrer_email = referrer_acct.data[0]["user_email"]
-                        award_points(referrer_email, 150, "earned_referral_purchase", f"Referral first-purchase bonus — {customer_email} made their first order")
-        except Exception:
-            pass
+            committed = commit_order(supabase, order_row, item_rows, points_redeemed, points_earned,
+                                     loyalty=ledger.shares_order_db)
+        except Exception as e:
+            print(f"Order commit error: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+    new_balance = committed["new_balance"] or 0
 
-        # Get updated balance
-        try:
-            updated = supabase.table("loyalty_accounts").select("points_balance").eq("user_email", customer_email).execute()
-            if updated.data:
-                new_balance = updated.data[0]["points_balance"]
-        except Exception:
-            pass
+    if customer_email and not committed["loyalty_applied"]:
+        with timer.stage("loyalty"):
+            new_balance = apply_checkout_points(customer_email, order_id, points_redeemed, points_earned)
 
-    # Send order confirmation email
-    order_record = {
-        "id": order_id,
-        "customer_email": customer_email,
-        "customer_name": req.customer.get("name", ""),
-        "customer_address": ", ".join(filter(None, [
-            req.customer.get("address", ""),
-            req.customer.get("city", ""),
-            req.customer.get("state", ""),
-            req.customer.get("zip", ""),
-        ])),
-        "total": req.total,
-        "delivery_type": req.delivery_type,
-        "delivery_datetime": req.delivery_datetime,
-        "payment_method": req.payment_method,
-    }
-    items_list = [
-        {"name": item.name, "price": item.price, "quantity": item.quantity}
-        for item in (req.items or [])
-    ]
-    send_order_confirmation_email(order_record, items_list)
+    with timer.stage("local"):
+        try:
+            now = datetime.now(timezone.utc)
+            order_rollups.record_new(now.strftime("%Y-%m-%d"), "confirmed", req.total, customer_email, now.isoformat(),
+                                     order_row["city"], [i["product_id"] for i in item_rows])
+        except Exception as e:
+            print(f"[Rollups] new order not recorded for {order_id}: {e}")
+        try:
+            purchase_index.add(customer_email, [i["product_id"] for i in item_rows])
+        except Exception as e:
+            print(f"[Purchases] new order not recorded for {order_id}: {e}")
+        schedule_order_events({"id": order_id, "status": "confirmed", "delivery_datetime": req.delivery_datetime,
+                               "is_recurring": req.is_recurring, "next_recurrence_date": next_recurrence_date})
+        trending.add(order_id, [i["product_id"] for i in item_rows])
+
+    # Confirmation email goes out from the outbox, off the request path
+    with timer.stage("enqueue"):
+        order_record = {
+            "id": order_id,
+            "customer_email": customer_email,
+            "customer_name": req.customer.get("name", ""),
+            "customer_address": customer_address,
+            "total": req.total,
+            "delivery_type": req.delivery_type,
+            "delivery_datetime": req.delivery_datetime,
+            "payment_method": req.payment_method,
+        }
+        items_list = [{"name": i["name"], "price": i["price"], "quantity": i["quantity"]} for i in item_rows]
+        outbox.enqueue("order_confirmation_email", {"order": order_record, "items": items_list})
 
+    checkout_latency.record(timer.ms, timer.total_ms())
+    response.headers["Server-Timing"] = timer.header()
     return {"orderId": order_id, "status": "confirmed", "points_earned": points_earned, "new_balance": new_balance}
 
 # ── Subscription helpers ────────────────────────────────────────────────────────
@@ -1524,6 +2040,7 @@ def create_subscription(req: SubscriptionRequest):
         "address": req.address,
         "skipped_count": 0,
     }).execute()
+    schedule_subscription_events({"id": sub_id, "status": "active", "next_delivery": next_delivery_date(req.plan)})
     return {"id": sub_id, "status": "active", "next_delivery": next_delivery_date(req.plan)}
 
 @app.patch("/api/subscriptions/{sub_id}/pause")
@@ -1532,14 +2049,16 @@ def pause_subscription(sub_id: str):
     if not result.data:
         raise HTTPException(status_code=404, detail="Subscription not found")
     supabase.table("subscriptions").update({"status": "paused"}).eq("id", sub_id).execute()
+    scheduler.cancel_prefix(f"subscription:{sub_id}:")
     return {"status": "paused"}
 
 @app.patch("/api/subscriptions/{sub_id}/resume")
 def resume_subscription(sub_id: str):
-    result = supabase.table("subscriptions").select("id").eq("id", sub_id).execute()
+    result = supabase.table("subscriptions").select("*").eq("id", sub_id).execute()
     if not result.data:
         raise HTTPException(status_code=404, detail="Subscription not found")
     supabase.table("subscriptions").update({"status": "active"}).eq("id", sub_id).execute()
+    schedule_subscription_events({**result.data[0], "status": "active"})
     return {"status": "active"}
 
 @app.patch("/api/subscriptions/{sub_id}/skip")
@@ -1551,6 +2070,7 @@ def skip_subscription(sub_id: str):
     new_date = advance_delivery_date(sub["plan"], sub["next_delivery"])
     new_count = (sub.get("skipped_count") or 0) + 1
     supabase.table("subscriptions").update({"next_delivery": new_date, "skipped_count": new_count}).eq("id", sub_id).execute()
+    schedule_subscription_events({**sub, "next_delivery": new_date})
     return {"status": "skipped", "next_delivery": new_date}
 
 @app.patch("/api/subscriptions/{sub_id}/cancel")
@@ -1559,61 +2079,104 @@ def cancel_subscription(sub_id: str):
     if not result.data:
         raise HTTPException(status_code=404, detail="Subscription not found")
     supabase.table("subscriptions").update({"status": "cancelled"}).eq("id", sub_id).execute()
+    scheduler.cancel_prefix(f"subscription:{sub_id}:")
     return {"status": "cancelled"}
 
 # ── Reminders Route ─────────────────────────────────────────────────────────────
 
+REMINDER_CONCURRENCY = int(os.getenv("REMINDER_CONCURRENCY", "16"))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "200"))
+
+async def _reminder_candidates(target_date: str):
+    scheduled, recurrence = await asyncio.gather(
+        # Upcoming scheduled deliveries (non-cancelled, non-delivered)
+        asupabase.table("orders").select("*").like("delivery_datetime", f"{target_date}%")
+            .not_.in_("status", ["cancelled", "delivered"]).execute(),
+        # Annual recurrences due (status=delivered, is_recurring=True)
+        asupabase.table("orders").select("*").eq("next_recurrence_date", target_date)
+            .eq("is_recurring", True).eq("status", "delivered").execute(),
+    )
+    return scheduled.data or [], recurrence.data or []
+
+async def _sent_reminder_channels(order_ids: list, reminder_types: list) -> set:
+    """{(order_id, reminder_type, channel)} already logged, read in chunks of REMINDER_BATCH_SIZE ids."""
+    chunks = [order_ids[i:i + REMINDER_BATCH_SIZE] for i in range(0, len(order_ids), REMINDER_BATCH_SIZE)]
+    results = await asyncio.gather(*[
+        asupabase.table("reminder_logs").select("order_id, reminder_type, channel")
+            .in_("order_id", chunk).in_("reminder_type", reminder_types).execute()
+        for chunk in chunks
+    ])
+    return {(r["order_id"], r["reminder_type"], r["channel"]) for res in results for r in res.data or []}
+
 @app.post("/api/reminders/send")
-def send_reminders(days: str = "3,1"):
+async def send_reminders(days: str = "3,1"):
+    started = time.perf_counter()
     today = datetime.utcnow().date()
     day_offsets = [int(d.strip()) for d in days.split(",") if d.strip().isdigit()]
-    total_sent = 0
-    summary = []
+    target_dates = [(today + timedelta(days=n)).strftime("%Y-%m-%d") for n in day_offsets]
 
-    for n in day_offsets:
-        target_date = (today + timedelta(days=n)).strftime("%Y-%m-%d")
-        reminder_type = f"{n}_day"
+    found = await asyncio.gather(*[_reminder_candidates(d) for d in target_dates])
+    summary = [{"days_before": n, "target_date": d, "scheduled": len(sch), "recurrence": len(rec)}
+               for n, d, (sch, rec) in zip(day_offsets, target_dates, found)]
 
-        # Upcoming scheduled deliveries (non-cancelled, non-delivered)
-        scheduled = supabase.table("orders") \
-            .select("*").like("delivery_datetime", f"{target_date}%") \
-            .not_.in_("status", ["cancelled", "delivered"]).execute().data or []
+    # One (order, days_before, is_recurrence, channel) job per reminder not yet sent
+    candidates = [(o, n, is_rec) for n, (sch, rec) in zip(day_offsets, found)
+                  for o, is_rec in [*[(o, False) for o in sch], *[(o, True) for o in rec]]]
+    already = await _sent_reminder_channels(
+        list({o["id"] for o, _, _ in candidates}), [f"{n}_day" for n in day_offsets]) if candidates else set()
+    jobs = [(o, n, is_rec, ch) for o, n, is_rec in candidates for ch in ("email", "sms", "whatsapp")
+            if (o["id"], f"{n}_day", ch) not in already]
 
-        # Annual recurrences due (status=delivered, is_recurring=True)
-        recurrence = supabase.table("orders") \
-            .select("*").eq("next_recurrence_date", target_date) \
-            .eq("is_recurring", True).eq("status", "delivered").execute().data or []
+    limit = asyncio.Semaphore(REMINDER_CONCURRENCY)
 
-        for order, is_recurrence in [*[(o, False) for o in scheduled],
-                                      *[(o, True) for o in recurrence]]:
+    async def send_email(order, n, is_recurrence) -> bool:
+        async with limit:
             try:
-                oid = order["id"]
-                already = {r["channel"] for r in
-                    (supabase.table("reminder_logs").select("channel")
-                     .eq("order_id", oid).eq("reminder_type", reminder_type)
-                     .execute().data or [])}
-
-                if "email" not in already:
-                    if send_email_reminder(order, n, is_recurrence):
-                        supabase.table("reminder_logs").insert({
-                            "order_id": oid, "reminder_type": reminder_type, "channel": "email"
-                        }).execute()
-                        total_sent += 1
-
-                res = send_sms_whatsapp_reminder(order, n, is_recurrence)
-                for ch in ("sms", "whatsapp"):
-                    if ch not in already and res.get(ch):
-                        supabase.table("reminder_logs").insert({
-                            "order_id": oid, "reminder_type": reminder_type, "channel": ch
-                        }).execute()
-                        total_sent += 1
+                return await asyncio.to_thread(send_email_reminder, order, n, is_recurrence)
             except Exception:
-                pass  # one bad order never aborts the rest
-
-        summary.append({"days_before": n, "target_date": target_date,
-                         "scheduled": len(scheduled), "recurrence": len(recurrence)})
+                return False  # one bad order never aborts the rest
+
+    async def send_twilio(batch) -> list:
+        # The dispatcher sends the whole batch concurrently under its own rate limit
+        todo = [i for i, (o, _, _, ch) in enumerate(batch) if ch != "email" and _twilio and o.get("customer_phone")]
+        msgs = [twilio_messages(batch[i][0]["customer_phone"], reminder_sms_text(*batch[i][:3]), (batch[i][3],))[0]
+                for i in todo]
+        sent = [False] * len(batch)
+        for i, r in zip(todo, await twilio_dispatcher.asend_batch(msgs)):
+            sent[i] = r["sent"]
+        return sent
 
-    return {"status": "ok", "total_reminders_sent": total_sent, "summary": summary}
+    total_sent = 0
+    batches = 0
+    for i in range(0, len(jobs), REMINDER_BATCH_SIZE):
+        batch = jobs[i:i + REMINDER_BATCH_SIZE]
+        emails, texts = await asyncio.gather(
+            asyncio.gather(*[send_email(o, n, is_rec) for o, n, is_rec, ch in batch if ch == "email"]),
+            send_twilio(batch),
+        )
+        emails = iter(emails)
+        sent = [next(emails) if job[3] == "email" else ok for job, ok in zip(batch, texts)]
+        logs = [{"order_id": o["id"], "reminder_type": f"{n}_day", "channel": ch}
+                for (o, n, _, ch), ok in zip(batch, sent) if ok]
+        if logs:
+            try:
+                await asupabase.table("reminder_logs").insert(logs).execute()
+            except Exception as e:
+                print(f"[Reminders] could not log {len(logs)} sent reminders: {e}")
+        total_sent += len(logs)
+        batches += 1
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "candidates": len(candidates),
+        "already_sent": len(candidates) * 3 - len(jobs),
+        "attempted": len(jobs),
+        "not_sent": len(jobs) - total_sent,
+        "batches": batches,
+        "sends_per_second": round(len(jobs) / elapsed, 1) if elapsed else 0.0,
+    }
+    return {"status": "ok", "total_reminders_sent": total_sent, "summary": summary, "stats": stats}
 
 
 # ── Smart Occasion Reminders ────────────────────────────────────────────────────
@@ -1623,23 +2186,39 @@ OCCASION_EMOJIS = {
     "mothers_day": "🌷", "fathers_day": "👔", "graduation": "🎓", "custom": "🎉"
 }
 
+def check_occasion_date(month: int, day: int):
+    """Raise ValueError unless month/day is a real calendar day in some year (29 Feb allowed)."""
+    if not 1 <= day <= calendar.monthrange(2000, month)[1]:
+        raise ValueError(f"{calendar.month_name[month]} has no day {day}")
+
 class OccasionCreate(BaseModel):
     user_email: str
     title: str
     occasion_type: str = "custom"
-    month: int
-    day: int
+    month: int = Field(ge=1, le=12)
+    day: int = Field(ge=1, le=31)
     linked_order_id: Optional[str] = None
     notes: Optional[str] = None
 
+    @model_validator(mode="after")
+    def _valid_date(self):
+        check_occasion_date(self.month, self.day)
+        return self
+
 class OccasionUpdate(BaseModel):
     title: Optional[str] = None
     occasion_type: Optional[str] = None
-    month: Optional[int] = None
-    day: Optional[int] = None
+    month: Optional[int] = Field(None, ge=1, le=12)
+    day: Optional[int] = Field(None, ge=1, le=31)
     linked_order_id: Optional[str] = None
     notes: Optional[str] = None
 
+    @model_validator(mode="after")
+    def _valid_date(self):
+        if self.month is not None and self.day is not None:
+            check_occasion_date(self.month, self.day)
+        return self
+
 @app.get("/api/occasions")
 def get_occasions(email: str):
     result = supabase.table("occasion_reminders").select("*").eq("user_email", email).order("month").order("day").execute()
@@ -1648,17 +2227,29 @@ def get_occasions(email: str):
 @app.post("/api/occasions")
 def create_occasion(req: OccasionCreate):
     result = supabase.table("occasion_reminders").insert(req.dict()).execute()
+    schedule_occasion_events(result.data[0])
     return result.data[0]
 
 @app.put("/api/occasions/{occasion_id}")
 def update_occasion(occasion_id: str, req: OccasionUpdate):
     data = {k: v for k, v in req.dict().items() if v is not None}
+    if (req.month is None) != (req.day is None):
+        # Only one half of the date changes: check it against the stored other half
+        rows = supabase.table("occasion_reminders").select("month, day").eq("id", occasion_id).execute().data
+        if not rows:
+            raise HTTPException(status_code=404, detail="Occasion not found")
+        try:
+            check_occasion_date(req.month or rows[0]["month"], req.day or rows[0]["day"])
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
     result = supabase.table("occasion_reminders").update(data).eq("id", occasion_id).execute()
+    schedule_occasion_events(result.data[0])
     return result.data[0]
 
 @app.delete("/api/occasions/{occasion_id}")
 def delete_occasion(occasion_id: str):
     supabase.table("occasion_reminders").delete().eq("id", occasion_id).execute()
+    scheduler.cancel_prefix(f"occasion:{occasion_id}:")
     return {"status": "deleted"}
 
 
@@ -1861,6 +2452,7 @@ def create_corporate_order(req: CorporateOrderRequest):
         "next_delivery": nd,
         "status": "pending",
     }).execute()
+    schedule_corporate_events({"id": order_id, "is_recurring": req.is_recurring, "status": "pending", "next_delivery": nd})
     return {"id": order_id, "final_amount": final_amount, "next_delivery": nd}
 
 @app.patch("/api/corporate-orders/{order_id}/cancel")
@@ -1869,6 +2461,7 @@ def cancel_corporate_order(order_id: str):
     if not result.data:
         raise HTTPException(status_code=404, detail="Corporate order not found")
     supabase.table("corporate_orders").update({"status": "cancelled"}).eq("id", order_id).execute()
+    scheduler.cancel_prefix(f"corporate:{order_id}:")
     return {"status": "cancelled"}
 
 @app.patch("/api/corporate-orders/{order_id}/skip")
@@ -1881,101 +2474,386 @@ def skip_corporate_order(order_id: str):
         raise HTTPException(status_code=400, detail="Only recurring orders can be skipped")
     new_date = advance_corp_delivery(order.get("recurring_frequency", "weekly"), order.get("next_delivery") or "")
     supabase.table("corporate_orders").update({"next_delivery": new_date}).eq("id", order_id).execute()
+    schedule_corporate_events({**order, "next_delivery": new_date})
     return {"next_delivery": new_date}
 
 
+# ── Scheduler ───────────────────────────────────────────────────────────────────
+# Reminders and recurring dates are timers in a persistent heap (scheduler.py)
+# kept current by the order, occasion, subscription and corporate routes above,
+# so nothing has to rescan those tables to find what is due. Due reminders are
+# handed to the outbox for delivery. The two /send endpoints remain as a manual
+# catch-up; reminder_logs stops either path from sending a reminder twice.
+REMINDER_DAYS = [int(d) for d in os.getenv("REMINDER_DAYS", "3,1").split(",") if d.strip().isdigit()]
+REMINDER_HOUR = int(os.getenv("REMINDER_HOUR", "9"))
+
+scheduler = Scheduler(os.path.join(DATA_DIR, "scheduler.db"))
+
+def _local_at(day, hour: int = REMINDER_HOUR) -> float:
+    """Epoch seconds of `hour`:00 store time on `day` (a date or 'YYYY-MM-DD...')."""
+    if isinstance(day, str):
+        day = datetime.strptime(day[:10], "%Y-%m-%d").date()
+    return datetime(day.year, day.month, day.day, hour, tzinfo=ZoneInfo(STORE_TZ)).timestamp()
+
+def _store_today():
+    return datetime.fromtimestamp(scheduler.clock(), ZoneInfo(STORE_TZ)).date()
+
+def _schedule_reminders(prefix: str, kind: str, day: str, payload: dict):
+    now = scheduler.clock()
+    for n in REMINDER_DAYS:
+        due = _local_at(datetime.strptime(day[:10], "%Y-%m-%d").date() - timedelta(days=n))
+        if due > now:
+            scheduler.schedule(f"{prefix}remind:{n}", kind, due, {**payload, "days_before": n, "date": day[:10]})
+
+def schedule_order_events(order: dict):
+    """(Re)schedule delivery reminders and the annual recurrence of one order."""
+    prefix = f"order:{order['id']}:"
+    scheduler.cancel_prefix(prefix)
+    status = order.get("status")
+    try:
+        if status not in ("cancelled", "delivered") and order.get("delivery_datetime"):
+            _schedule_reminders(prefix, "order_reminder", order["delivery_datetime"],
+                                {"order_id": order["id"], "is_recurrence": False})
+        if status == "delivered" and order.get("is_recurring") and order.get("next_recurrence_date"):
+            _schedule_reminders(prefix + "recurrence:", "order_reminder", order["next_recurrence_date"],
+                                {"order_id": order["id"], "is_recurrence": True})
+            scheduler.schedule(prefix + "recur", "order_recurrence", _local_at(order["next_recurrence_date"], 0),
+                               {"order_id": order["id"]})
+    except ValueError:
+        print(f"[Scheduler] unparseable dates on order {order['id']}")
+
+def _next_occurrence(month: int, day: int, after):
+    """First month/day strictly after the date `after`."""
+    for year in (after.year, after.year + 1):
+        if month == 2 and day == 29 and not calendar.isleap(year):
+            d = after.replace(year=year, month=2, day=28)
+        else:
+            d = after.replace(year=year, month=month, day=day)
+        if d > after:
+            return d
+    return d
+
+def _schedule_occasion_reminder(occ: dict, n: int, after):
+    """Schedule the `n`-days-before reminder for the first occurrence after `after` still in the future."""
+    occurs = _next_occurrence(occ["month"], occ["day"], after)
+    while _local_at(occurs - timedelta(days=n)) <= scheduler.clock():
+        occurs = _next_occurrence(occ["month"], occ["day"], occurs)
+    scheduler.schedule(f"occasion:{occ['id']}:remind:{n}", "occasion_reminder", _local_at(occurs - timedelta(days=n)),
+                       {"occasion_id": occ["id"], "days_before": n, "date": occurs.isoformat()})
+
+def schedule_occasion_events(occ: dict):
+    """Schedule each reminder for the next yearly occurrence of an occasion."""
+    scheduler.cancel_prefix(f"occasion:{occ['id']}:")
+    if not occ.get("month") or not occ.get("day"):
+        return
+    yesterday = _store_today() - timedelta(days=1)
+    for n in REMINDER_DAYS:
+        _schedule_occasion_reminder(occ, n, yesterday)
+
+def schedule_subscription_events(sub: dict):
+    prefix = f"subscription:{sub['id']}:"
+    scheduler.cancel_prefix(prefix)
+    if sub.get("status") == "active" and sub.get("next_delivery"):
+        # Rolled forward once the delivery day is over
+        scheduler.schedule(prefix + "delivery", "subscription_delivery",
+                           _local_at(sub["next_delivery"], 0) + 86400, {"subscription_id": sub["id"]})
+
+def schedule_corporate_events(order: dict):
+    prefix = f"corporate:{order['id']}:"
+    scheduler.cancel_prefix(prefix)
+    if order.get("is_recurring") and order.get("status") != "cancelled" and order.get("next_delivery"):
+        scheduler.schedule(prefix + "delivery", "corporate_delivery",
+                           _local_at(order["next_delivery"], 0) + 86400, {"order_id": order["id"]})
+
+@scheduler.handler("order_reminder")
+def _fire_order_reminder(event: dict):
+    rows = supabase.table("orders").select("*").eq("id", event["order_id"]).execute().data
+    if not rows:
+        return
+    order = rows[0]
+    # Skip if the order changed since the reminder was scheduled
+    if event["is_recurrence"]:
+        if order.get("status") != "delivered" or order.get("next_recurrence_date") != event["date"]:
+            return
+    elif order.get("status") in ("cancelled", "delivered") or (order.get("delivery_datetime") or "")[:10] != event["date"]:
+        return
+    # One lookup for all channels; those already sent (e.g. by /api/reminders/send) aren't queued
+    logged = {r["channel"] for r in supabase.table("reminder_logs").select("channel")
+              .eq("order_id", order["id"]).eq("reminder_type", f"{event['days_before']}_day").execute().data or []}
+    for channel in ("email", "sms", "whatsapp"):
+        if channel not in logged:
+            outbox.enqueue("delivery_reminder", {"order": order, "days_before": event["days_before"],
+                                                 "is_recurrence": event["is_recurrence"], "channel": channel})
+
+@outbox.handler("delivery_reminder")
+def _send_delivery_reminder(job: dict) -> bool:
+    order, n, channel = job["order"], job["days_before"], job["channel"]
+    if channel == "email":
+        sent = send_email_reminder(order, n, job["is_recurrence"])
+    else:
+        sent = send_sms_whatsapp_reminder(order, n, job["is_recurrence"], (channel,)).get(channel, False)
+    if sent:
+        supabase.table("reminder_logs").insert({"order_id": order["id"], "reminder_type": f"{n}_day", "channel": channel}).execute()
+    return sent
+
+@scheduler.handler("order_recurrence")
+def _roll_order_recurrence(event: dict):
+    rows = supabase.table("orders").select("*").eq("id", event["order_id"]).execute().data
+    if not rows or not rows[0].get("is_recurring") or not rows[0].get("next_recurrence_date"):
+        return
+    order = rows[0]
+    current = datetime.strptime(order["next_recurrence_date"][:10], "%Y-%m-%d").date()
+    nxt = current
+    while nxt <= _store_today():
+        nxt = _next_occurrence(current.month, current.day, nxt)
+    order["next_recurrence_date"] = nxt.isoformat()
+    supabase.table("orders").update({"next_recurrence_date": order["next_recurrence_date"]}).eq("id", order["id"]).execute()
+    schedule_order_events(order)
+
+@scheduler.handler("occasion_reminder")
+def _fire_occasion_reminder(event: dict):
+    rows = supabase.table("occasion_reminders").select("*").eq("id", event["occasion_id"]).execute().data
+    if not rows:
+        return
+    occ = rows[0]
+    occurs = datetime.strptime(event["date"], "%Y-%m-%d").date()
+    # Still the same date (29 Feb occasions fall on the 28th in other years)
+    leap_day_moved = (occ.get("month"), occ.get("day")) == (2, 29) and (occurs.month, occurs.day) == (2, 28)
+    if (occ.get("month"), occ.get("day")) == (occurs.month, occurs.day) or leap_day_moved:
+        outbox.enqueue("occasion_reminder", {"occasion": occ, "days_before": event["days_before"]})
+    if occ.get("month") and occ.get("day"):
+        _schedule_occasion_reminder(occ, event["days_before"], occurs)
+
+@outbox.handler("occasion_reminder")
+def _send_occasion_reminder(job: dict) -> bool:
+    occ, n = job["occasion"], job["days_before"]
+    # The manual /api/occasions/send-reminders may already have sent this one
+    logged = supabase.table("reminder_logs").select("id").eq("order_id", f"OCC-{occ['id']}") \
+        .eq("reminder_type", f"{n}_day").eq("channel", "email").limit(1).execute().data
+    if logged:
+        return False
+    sent = send_occasion_reminder_email(occ, n)
+    if sent:
+        supabase.table("reminder_logs").insert({"order_id": f"OCC-{occ['id']}", "reminder_type": f"{n}_day", "channel": "email"}).execute()
+    return sent
+
+@scheduler.handler("subscription_delivery")
+def _roll_subscription_delivery(event: dict):
+    rows = supabase.table("subscriptions").select("*").eq("id", event["subscription_id"]).execute().data
+    if not rows or rows[0].get("status") != "active":
+        return
+    sub = rows[0]
+    nxt = sub["next_delivery"]
+    while nxt <= _store_today().isoformat():
+        nxt = advance_delivery_date(sub["plan"], nxt)
+    sub["next_delivery"] = nxt
+    supabase.table("subscriptions").update({"next_delivery": nxt}).eq("id", sub["id"]).execute()
+    schedule_subscription_events(sub)
+
+@scheduler.handler("corporate_delivery")
+def _roll_corporate_delivery(event: dict):
+    rows = supabase.table("corporate_orders").select("*").eq("id", event["order_id"]).execute().data
+    if not rows or not rows[0].get("is_recurring") or rows[0].get("status") == "cancelled":
+        return
+    order = rows[0]
+    nxt = order["next_delivery"]
+    while nxt <= _store_today().isoformat():
+        nxt = advance_corp_delivery(order.get("recurring_frequency", "weekly"), nxt)
+    order["next_delivery"] = nxt
+    supabase.table("corporate_orders").update({"next_delivery": nxt}).eq("id", order["id"]).execute()
+    schedule_corporate_events(order)
+
+def rebuild_schedule() -> dict:
+    """Recreate every event from the source tables (first start, or after restoring a backup)."""
+    scheduler.clear()
+    today = _store_today().isoformat()
+    counts = {"orders": 0, "occasions": 0, "subscriptions": 0, "corporate_orders": 0}
+    for page in iter_pages("orders", "id, status, delivery_datetime, is_recurring, next_recurrence_date",
+                           where=lambda q: q.neq("status", "cancelled").or_(f"delivery_datetime.gte.{today},is_recurring.eq.true")):
+        for order in page:
+            if (order.get("delivery_datetime") or "") >= today or order.get("is_recurring"):
+                schedule_order_events(order)
+                counts["orders"] += 1
+    for page in iter_pages("occasion_reminders", "id, month, day"):
+        for occ in page:
+            schedule_occasion_events(occ)
+            counts["occasions"] += 1
+    for page in iter_pages("subscriptions", "id, status, next_delivery", where=lambda q: q.eq("status", "active")):
+        for sub in page:
+            schedule_subscription_events(sub)
+            counts["subscriptions"] += 1
+    for page in iter_pages("corporate_orders", "id, status, is_recurring, next_delivery",
+                           where=lambda q: q.eq("is_recurring", True)):
+        for order in page:
+            schedule_corporate_events(order)
+            counts["corporate_orders"] += 1
+    scheduler.mark_seeded()
+    return counts
+
+@app.on_event("startup")
+def start_scheduler():
+    if not scheduler.is_seeded():
+        try:
+            print(f"[Scheduler] seeded {rebuild_schedule()}")
+        except Exception as e:
+            print(f"[Scheduler] initial seed failed: {e}")
+    scheduler.start()
+
+@app.on_event("shutdown")
+def stop_scheduler():
+    scheduler.stop()
+
+
 # ── Personalized Recommendations ────────────────────────────────────────────────
 
 def _enrich_products(product_ids: list, counter: Counter = None) -> list:
     """Return full product dicts for given IDs, sorted by counter frequency if provided."""
-    products = [p for p in PRODUCTS if p["id"] in product_ids]
+    products = catalog.many(product_ids)
     if counter:
         products.sort(key=lambda p: counter.get(p["id"], 0), reverse=True)
     return products
 
+# "Trending this week": per-product order counts in hourly buckets over the last
+# 7 days, fed by create_order and cancellations and rebuilt from the database at
+# startup and every TRENDING_REBUILD_MINUTES (to pick up other workers' orders).
+trending = TrendingCounter(window_hours=7 * 24)
+TRENDING_REBUILD_SECONDS = float(os.getenv("TRENDING_REBUILD_MINUTES", "30")) * 60
+_trending_refresh = {"running": False, "started": 0.0}
+
+def _epoch(ts: str) -> float:
+    dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    return (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+
+def rebuild_trending() -> int:
+    since = (datetime.now(timezone.utc) - timedelta(hours=trending.window_hours)).isoformat()
+    created = {o["id"]: _epoch(o["created_at"])
+               for page in iter_pages("orders", "id, created_at",
+                                      where=lambda q: q.gte("created_at", since).neq("status", "cancelled"))
+               for o in page}
+    ids = list(created)
+    products: dict = {}
+    for i in range(0, len(ids), 200):
+        chunk = ids[i:i + 200]
+        for page in iter_pages("order_items", "order_id, product_id", where=lambda q: q.in_("order_id", chunk)):
+            for it in page:
+                products.setdefault(it["order_id"], []).append(it["product_id"])
+    trending.rebuild((oid, created[oid], pids) for oid, pids in products.items())
+    return len(created)
+
+async def _refresh_trending():
+    _trending_refresh.update(running=True, started=time.time())
+    try:
+        await run_in_threadpool(rebuild_trending)
+    except Exception as e:
+        print(f"[Trending] rebuild failed: {e}")
+    finally:
+        _trending_refresh["running"] = False
+
+@app.on_event("startup")
+async def seed_trending():
+    await _refresh_trending()
+
+async def _trending_this_week() -> list:
+    if not _trending_refresh["running"] and time.time() - _trending_refresh["started"] > TRENDING_REBUILD_SECONDS:
+        # Marked before the task first runs, so requests in the same loop tick don't start another
+        _trending_refresh.update(running=True, started=time.time())
+        spawn(_refresh_trending())
+    counts = dict(trending.top(8))
+    return _enrich_products(counts, counts)[:6]
+
+async def _last_order(email: str) -> Optional[dict]:
+    user_orders = ((await asupabase.table("orders").select("id, city, customer_address")
+                    .eq("customer_email", email).neq("status", "cancelled")
+                    .order("created_at", desc=True).limit(1).execute()).data or [])
+    return user_orders[0] if user_orders else None
+
+# "Based on your last order": item-to-item co-occurrence model built offline by
+# `python manage.py rebuild-recommendations` and reloaded here when the file changes.
+recommendation_model = CooccurrenceModel(os.path.join(DATA_DIR, "cooccurrence.npz"))
+
+def rebuild_recommendation_model() -> int:
+    active = {o["id"] for page in iter_pages("orders", "id", where=lambda q: q.neq("status", "cancelled"))
+              for o in page}
+    model = cooccurrence.build(
+        [it for it in page if it["order_id"] in active]
+        for page in iter_pages("order_items", "order_id, product_id")
+    )
+    cooccurrence.save(model, recommendation_model.path)
+    recommendation_model.reload_if_changed()
+    return int(model["orders"])
+
+def _popular_in_city(city: str) -> list:
+    counts = dict(order_rollups.top_city_products(city, 8))
+    return _enrich_products(counts, counts)[:6]
+
 @app.get("/api/recommendations")
-def get_recommendations(email: str = ""):
+async def get_recommendations(email: str = ""):
     response = {
         "based_on_last_order": {"reason": "", "products": []},
         "popular_in_city":     {"city": "",   "products": []},
         "trending_this_week":  {"products": []},
     }
 
+    # Trending and the user's last order don't depend on each other — fetch together
+    lookups = [_trending_this_week()]
+    if email:
+        lookups.append(_last_order(email))
+    results = await asyncio.gather(*lookups, return_exceptions=True)
+
     # ── Trending this week (always computed) ────────────────────────────────────
-    try:
-        week_ago = (datetime.utcnow() - timedelta(days=7)).isoformat()
-        recent_orders = (supabase.table("orders").select("id")
-                         .gte("created_at", week_ago).neq("status", "cancelled")
-                         .execute().data or [])
-        if recent_orders:
-            ids = [o["id"] for o in recent_orders]
-            items = (supabase.table("order_items").select("product_id")
-                     .in_("order_id", ids).execute().data or [])
-            counter = Counter(it["product_id"] for it in items)
-            top_ids = set(pid for pid, _ in counter.most_common(8))
-            response["trending_this_week"]["products"] = _enrich_products(top_ids, counter)[:6]
-    except Exception as e:
-        print(f"[Recommendations] trending error: {e}")
+    if isinstance(results[0], Exception):
+        print(f"[Recommendations] trending error: {results[0]}")
+    else:
+        response["trending_this_week"]["products"] = results[0]
 
     # Fallback: top-rated products if no order data yet
     if not response["trending_this_week"]["products"]:
-        response["trending_this_week"]["products"] = sorted(
-            [p for p in PRODUCTS if p.get("inStock")],
-            key=lambda p: p.get("rating", 0), reverse=True
-        )[:6]
+        response["trending_this_week"]["products"] = top_rated(6)
 
     if not email:
         return response
 
     # ── Based on last order + city (requires email) ──────────────────────────────
     try:
-        user_orders = (supabase.table("orders").select("id, customer_address")
-                       .eq("customer_email", email).neq("status", "cancelled")
-                       .order("created_at", desc=True).limit(1).execute().data or [])
+        if isinstance(results[1], Exception):
+            raise results[1]
+        last_order = results[1]
 
-        if user_orders:
-            last_order = user_orders[0]
+        if last_order:
             last_id = last_order["id"]
 
-            last_items = (supabase.table("order_items").select("product_id, name")
-                          .eq("order_id", last_id).execute().data or [])
+            # City popularity is read from the local per-city counters
+            city = order_city(last_order)
+            city_products = _popular_in_city(city) if city else []
+
+            last_items_result = await asupabase.table("order_items").select("product_id, name") \
+                .eq("order_id", last_id).execute()
+            last_items = last_items_result.data or []
             ordered_ids = {it["product_id"] for it in last_items}
             sample_names = [it["name"] for it in last_items[:2]]
 
-            # Find categories of what they ordered
-            ordered_categories = {
-                p["category"] for p in PRODUCTS if p["id"] in ordered_ids
-            }
-
-            if ordered_categories:
-                similar = [
-                    p for p in PRODUCTS
-                    if p["category"] in ordered_categories
-                    and p["id"] not in ordered_ids
-                    and p.get("inStock")
-                ]
-                similar.sort(key=lambda p: p.get("rating", 0), reverse=True)
+            # Products most often bought together with that basket, topped up from
+            # the same categories when the model knows too few neighbours
+            recommendation_model.reload_if_changed()
+            similar = [p for p in map(catalog.get, recommendation_model.neighbours(ordered_ids, 12))
+                       if p and p.get("inStock")][:6]
+            if len(similar) < 6:
+                seen = ordered_ids | {p["id"] for p in similar}
+                ordered_categories = {p["category"] for p in catalog.many(ordered_ids)}
+                similar += [
+                    p for cat in sorted(ordered_categories) for p in catalog.by_category.get(cat, [])
+                    if p["id"] not in seen and p.get("inStock")
+                ][:6 - len(similar)]
+
+            if similar:
                 names_str = " & ".join(sample_names) if sample_names else "your last order"
                 response["based_on_last_order"]["reason"] = f"Because you ordered {names_str}"
-                response["based_on_last_order"]["products"] = similar[:6]
+                response["based_on_last_order"]["products"] = similar
 
             # ── Popular in their city ────────────────────────────────────────────
-            address = last_order.get("customer_address", "")
-            parts = [p.strip() for p in address.split(",")]
-            city = parts[1] if len(parts) >= 2 else ""
-
-            if city:
-                city_orders = (supabase.table("orders").select("id")
-                               .ilike("customer_address", f"%{city}%")
-                               .neq("status", "cancelled").execute().data or [])
-                if city_orders:
-                    city_ids = [o["id"] for o in city_orders]
-                    city_items = (supabase.table("order_items").select("product_id")
-                                  .in_("order_id", city_ids).execute().data or [])
-                    city_counter = Counter(it["product_id"] for it in city_items)
-                    top_city = set(pid for pid, _ in city_counter.most_common(8))
-                    response["popular_in_city"]["city"] = city
-                    response["popular_in_city"]["products"] = _enrich_products(top_city, city_counter)[:6]
+            if city_products:
+                response["popular_in_city"]["city"] = city
+                response["popular_in_city"]["products"] = city_products
 
     except Exception as e:
         print(f"[Recommendations] personalized error: {e}")
@@ -1985,6 +2863,73 @@ def get_recommendations(email: str = ""):
 
 # ── Product Reviews ──────────────────────────────────────────────────────────────
 
+# Count, mean, 1–5 histogram and verified share per product, updated by
+# create_review and served from memory; seeded from product_reviews on first start.
+review_stats = RatingAggregates(os.path.join(DATA_DIR, "review_stats.db"))
+
+REVIEW_COLUMNS = ("id, product_id, author_name, rating, review_text, photo_urls, thumbnail_urls, verified_purchase,"
+                  " created_at")
+
+# sort -> keyset columns as (column, descending); created_at and id break ties
+REVIEW_SORTS = {
+    "newest": [("created_at", True), ("id", True)],
+    "oldest": [("created_at", False), ("id", False)],
+    "highest": [("rating", True), ("created_at", True), ("id", True)],
+    "lowest": [("rating", False), ("created_at", True), ("id", True)],
+}
+
+def rebuild_review_stats() -> int:
+    return review_stats.rebuild(fetch_all_rows("product_reviews", "product_id, rating, verified_purchase"))
+
+@app.on_event("startup")
+def seed_review_stats():
+    if review_stats.is_empty():
+        try:
+            print(f"[Reviews] rating aggregates rebuilt from {rebuild_review_stats()} reviews")
+        except Exception as e:
+            print(f"[Reviews] initial aggregate rebuild failed: {e}")
+
+def with_ratings(products: list) -> list:
+    """Copies of `products` with `rating` (mean stars) and `reviewCount` from the review aggregates."""
+    stats = review_stats.all()
+    return [{**p, "rating": stats[p["id"]]["average"], "reviewCount": stats[p["id"]]["count"]}
+            if p["id"] in stats else p for p in products]
+
+# Each product's rating starts as this many reviews at the store-wide mean
+TOP_RATED_PRIOR = 5
+
+def top_rated(k: int) -> list:
+    """The k best-rated in-stock products, topped up with unrated ones.
+
+    Products rank by a Bayesian average (see TOP_RATED_PRIOR), so a single
+    five-star review doesn't outrank dozens of 4.8s.
+    """
+    stats = review_stats.all()
+    rated = [p for p in catalog.in_stock if stats.get(p["id"], {}).get("count")]
+    if rated:
+        reviews = sum(stats[p["id"]]["count"] for p in rated)
+        mean = sum(stats[p["id"]]["average"] * stats[p["id"]]["count"] for p in rated) / reviews
+
+        def score(p):
+            s = stats[p["id"]]
+            return (TOP_RATED_PRIOR * mean + s["average"] * s["count"]) / (TOP_RATED_PRIOR + s["count"])
+
+        rated.sort(key=lambda p: (score(p), stats[p["id"]]["count"]), reverse=True)
+    picked = rated[:k]
+    if len(picked) < k:
+        seen = {p["id"] for p in picked}
+        picked += [p for p in catalog.in_stock if p["id"] not in seen][:k - len(picked)]
+    return with_ratings(picked)
+
+def _keyset_filter(keys: list, values: list) -> str:
+    """PostgREST `or` filter for rows strictly after `values` in the ordering `keys` [(column, desc)]."""
+    clauses = []
+    for i, (column, desc) in enumerate(keys):
+        parts = [f'{c}.eq."{v}"' for (c, _), v in zip(keys[:i], values)]
+        parts.append(f'{column}.{"lt" if desc else "gt"}."{values[i]}"')
+        clauses.append(f"and({','.join(parts)})" if len(parts) > 1 else parts[0])
+    return ",".join(clauses)
+
 class ReviewCreate(BaseModel):
     product_id: int
     user_email: str
@@ -1994,31 +2939,39 @@ class ReviewCreate(BaseModel):
     photo_b64_list: list[str] = []
 
 @app.get("/api/reviews")
-def get_reviews(product_id: int):
+def get_reviews(product_id: int, sort: str = "newest", cursor: Optional[str] = None,
+                limit: int = Query(10, ge=1, le=50)):
+    """One page of a product's reviews, keyset-paginated in `sort` order.
+
+    Pass the returned `next_cursor` back as `cursor` for the following page.
+    The first page also carries the product's rating `summary`.
+    """
+    keys = REVIEW_SORTS.get(sort)
+    if keys is None:
+        raise HTTPException(status_code=422, detail=f"sort must be one of: {', '.join(REVIEW_SORTS)}")
+    query = supabase.table("product_reviews").select(REVIEW_COLUMNS).eq("product_id", product_id)
+    if cursor:
+        query = query.or_(_keyset_filter(keys, _decode_cursor(cursor, len(keys))))
+    for column, desc in keys:
+        query = query.order(column, desc=desc)
     try:
-        reviews = (supabase.table("product_reviews").select("*")
-                   .eq("product_id", product_id)
-                   .order("created_at", desc=True).execute().data or [])
-        return reviews
-    except Exception:
-        return []
+        rows = query.limit(limit + 1).execute().data or []
+    except Exception as e:
+        print(f"[Reviews] list failed for product {product_id}: {e}")
+        rows = []
+    page = rows[:limit]
+    out = {"reviews": page,
+           "next_cursor": _encode_cursor(*(page[-1][c] for c, _ in keys)) if len(rows) > limit else None}
+    if not cursor:
+        out["summary"] = review_stats.get(product_id)
+    return out
 
 @app.get("/api/reviews/can-review")
 def can_review_check(product_id: int, email: str = ""):
     if not email:
         return {"can_review": False, "has_purchased": False, "already_reviewed": False}
     try:
-        user_orders = (supabase.table("orders").select("id")
-                       .eq("customer_email", email).neq("status", "cancelled")
-                       .execute().data or [])
-        has_purchased = False
-        if user_orders:
-            oids = [o["id"] for o in user_orders]
-            bought = (supabase.table("order_items").select("id")
-                      .eq("product_id", product_id).in_("order_id", oids)
-                      .limit(1).execute().data or [])
-            has_purchased = len(bought) > 0
-
+        has_purchased = purchase_index.has_purchased(email, product_id)
         existing = (supabase.table("product_reviews").select("id")
                     .eq("product_id", product_id).eq("user_email", email)
                     .limit(1).execute().data or [])
@@ -2032,60 +2985,125 @@ def can_review_check(product_id: int, email: str = ""):
     except Exception:
         return {"can_review": True, "has_purchased": False, "already_reviewed": False}
 
-@app.post("/api/reviews")
-def create_review(req: ReviewCreate):
-    if not (1 <= req.rating <= 5):
-        raise HTTPException(status_code=422, detail="Rating must be 1–5")
-    if not req.review_text.strip():
-        raise HTTPException(status_code=422, detail="Review text is required")
+# Review photos: decoded, stripped of metadata, downscaled and turned into WebP
+# thumbnails in a process pool, then uploaded concurrently.
+REVIEW_PHOTO_LIMIT = 3
+REVIEW_PHOTO_MAX_BYTES = int(float(os.getenv("REVIEW_PHOTO_MAX_MB", "10")) * 1024 * 1024)
+photo_pipeline = PhotoPipeline(int(os.getenv("REVIEW_PHOTO_WORKERS", "0")) or None)
 
-    # Prevent duplicate reviews
+@app.on_event("shutdown")
+def stop_photo_pipeline():
+    photo_pipeline.shutdown()
+
+def _review_preflight(product_id: int, user_email: str) -> bool:
+    """Reject a duplicate review (409); return whether `user_email` bought the product."""
     existing = (supabase.table("product_reviews").select("id")
-                .eq("product_id", req.product_id).eq("user_email", req.user_email)
+                .eq("product_id", product_id).eq("user_email", user_email)
                 .limit(1).execute().data or [])
     if existing:
         raise HTTPException(status_code=409, detail="You have already reviewed this product")
 
-    # Verified purchase check
-    has_purchased = False
-    if req.user_email:
-        try:
-            user_orders = (supabase.table("orders").select("id")
-                           .eq("customer_email", req.user_email).neq("status", "cancelled")
-                           .execute().data or [])
-            if user_orders:
-                oids = [o["id"] for o in user_orders]
-                bought = (supabase.table("order_items").select("id")
-                          .eq("product_id", req.product_id).in_("order_id", oids)
-                          .limit(1).execute().data or [])
-                has_purchased = len(bought) > 0
-        except Exception:
-            pass
+    return purchase_index.has_purchased(user_email, product_id)
 
-    # Upload photos to Supabase Storage
-    photo_urls = []
-    for i, b64_str in enumerate(req.photo_b64_list[:3]):
-        try:
-            img_bytes = _base64.b64decode(b64_str)
-            path = f"{uuid.uuid4()}/{i}.jpg"
-            supabase.storage.from_("review-photos").upload(
-                path, img_bytes, {"content-type": "image/jpeg"}
-            )
-            url = supabase.storage.from_("review-photos").get_public_url(path)
-            photo_urls.append(url)
-        except Exception as e:
-            print(f"[Reviews] Photo upload skipped: {e}")
+def _upload_review_photo(path: str, data: bytes, upsert: bool = False) -> str:
+    bucket = supabase.storage.from_("review-photos")
+    options = {"content-type": "image/webp", **({"upsert": "true"} if upsert else {})}
+    bucket.upload(path, data, options)
+    return bucket.get_public_url(path)
+
+async def _store_review_photos(review_id: str, photos: list) -> tuple:
+    """(photo_urls, thumbnail_urls) for the uploaded `photos`; failed uploads are skipped."""
+    try:
+        processed = await photo_pipeline.process_many(photos)
+    except PhotoError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    uploads = []
+    for i, p in enumerate(processed):
+        uploads.append(run_in_threadpool(_upload_review_photo, f"{review_id}/{i}.webp", p["full"]))
+        uploads.append(run_in_threadpool(_upload_review_photo, f"{review_id}/{i}_thumb.webp", p["thumb"]))
+    urls = await asyncio.gather(*uploads, return_exceptions=True)
+    photo_urls, thumbnail_urls = [], []
+    for full, thumb in zip(urls[::2], urls[1::2]):
+        failed = next((u for u in (full, thumb) if isinstance(u, Exception)), None)
+        if failed is not None:
+            print(f"[Reviews] Photo upload skipped: {failed}")
+            continue
+        photo_urls.append(full)
+        thumbnail_urls.append(thumb)
+    return photo_urls, thumbnail_urls
+
+async def _create_review(product_id: int, user_email: str, author_name: str, rating: int,
+                         review_text: str, photos: list) -> dict:
+    if not (1 <= rating <= 5):
+        raise HTTPException(status_code=422, detail="Rating must be 1–5")
+    if not review_text.strip():
+        raise HTTPException(status_code=422, detail="Review text is required")
+
+    has_purchased = await run_in_threadpool(_review_preflight, product_id, user_email)
 
     review_id = str(uuid.uuid4())
-    result = supabase.table("product_reviews").insert({
+    photo_urls, thumbnail_urls = ((await _store_review_photos(review_id, photos[:REVIEW_PHOTO_LIMIT]))
+                                  if photos else ([], []))
+    row = {
         "id": review_id,
-        "product_id": req.product_id,
-        "user_email": req.user_email,
-        "author_name": req.author_name,
-        "rating": req.rating,
-        "review_text": req.review_text.strip(),
+        "product_id": product_id,
+        "user_email": user_email,
+        "author_name": author_name,
+        "rating": rating,
+        "review_text": review_text.strip(),
         "photo_urls": photo_urls,
+        "thumbnail_urls": thumbnail_urls,
         "verified_purchase": has_purchased,
-    }).execute()
+    }
+    result = await run_in_threadpool(lambda: supabase.table("product_reviews").insert(row).execute())
+    try:
+        review_stats.record(product_id, rating, has_purchased)
+    except Exception as e:
+        print(f"[Reviews] aggregate not updated for product {product_id}: {e}")
 
     return result.data[0] if result.data else {"id": review_id}
+
+@app.post("/api/reviews")
+async def create_review(req: ReviewCreate):
+    """JSON variant with base64 photos, kept for older clients; prefer /api/reviews/upload."""
+    photos = []
+    for b64_str in req.photo_b64_list[:REVIEW_PHOTO_LIMIT]:
+        try:
+            photos.append(_base64.b64decode(b64_str))
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Photos must be base64-encoded images")
+    return await _create_review(req.product_id, req.user_email, req.author_name, req.rating,
+                                req.review_text, photos)
+
+@app.post("/api/reviews/upload")
+async def create_review_upload(product_id: int = Form(...), user_email: str = Form(...),
+                               author_name: str = Form(...), rating: int = Form(...),
+                               review_text: str = Form(...), photos: list[UploadFile] = File(default=[])):
+    """Multipart review submission; photos arrive as file parts (spooled to disk, not held in memory)."""
+    if len(photos) > REVIEW_PHOTO_LIMIT:
+        raise HTTPException(status_code=422, detail=f"At most {REVIEW_PHOTO_LIMIT} photos per review")
+    data = []
+    for photo in photos:
+        content = await photo.read(REVIEW_PHOTO_MAX_BYTES + 1)
+        if len(content) > REVIEW_PHOTO_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Photos must be under {REVIEW_PHOTO_MAX_BYTES // (1024 * 1024)} MB")
+        data.append(content)
+    return await _create_review(product_id, user_email, author_name, rating, review_text, data)
+
+def backfill_review_thumbnails() -> int:
+    """Create WebP thumbnails for reviews stored before thumbnail_urls existed."""
+    bucket = supabase.storage.from_("review-photos")
+    done = 0
+    for review in fetch_all_rows("product_reviews", "id, photo_urls, thumbnail_urls"):
+        if not review.get("photo_urls") or review.get("thumbnail_urls"):
+            continue
+        try:
+            paths = [url.split("/review-photos/", 1)[1].split("?", 1)[0] for url in review["photo_urls"]]
+            processed = photo_pipeline.pool.map(review_photos.process, [bucket.download(p) for p in paths])
+            thumbs = [_upload_review_photo(f"{path.rsplit('.', 1)[0]}_thumb.webp", p["thumb"], upsert=True)
+                      for path, p in zip(paths, processed)]
+            supabase.table("product_reviews").update({"thumbnail_urls": thumbs}).eq("id", review["id"]).execute()
+            done += 1
+        except Exception as e:
+            print(f"[Reviews] thumbnails not created for review {review['id']}: {e}")
+    return done
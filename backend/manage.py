@@ -0,0 +1,78 @@
+"""Maintenance commands for the API's derived state.
+
+Run from the backend directory with the same environment as the server:
+
+    python manage.py rebuild-rollups
+    python manage.py rebuild-purchases
+    python manage.py rebuild-schedule
+    python manage.py rebuild-recommendations
+    python manage.py rebuild-review-stats
+    python manage.py backfill-review-thumbnails
+    python manage.py supabase-sql > supabase.sql
+"""
+import argparse
+import time
+
+import checkout
+import ledger
+import main
+import review_photos
+import review_stats
+
+
+def rebuild_rollups(args):
+    print(f"Rebuilt order rollups from {main.rebuild_order_rollups()} orders")
+
+
+def rebuild_purchases(args):
+    print(f"Rebuilt the purchased-products index from {main.rebuild_purchase_index()} orders")
+
+
+def rebuild_schedule(args):
+    print(f"Rescheduled {main.rebuild_schedule()}")
+
+
+def rebuild_recommendations(args):
+    t0 = time.perf_counter()
+    orders = main.rebuild_recommendation_model()
+    print(f"Rebuilt co-occurrence model from {orders} orders in {time.perf_counter() - t0:.1f}s "
+          f"-> {main.recommendation_model.path}")
+
+
+def rebuild_review_stats(args):
+    print(f"Rebuilt rating aggregates from {main.rebuild_review_stats()} reviews")
+
+
+def backfill_review_thumbnails(args):
+    print(f"Created thumbnails for {main.backfill_review_thumbnails()} reviews")
+
+
+def supabase_sql(args):
+    for sql in (checkout.ORDERS_CITY_SQL, review_stats.REVIEWS_INDEX_SQL, review_photos.REVIEW_THUMBNAILS_SQL,
+                ledger.POSTGRES_FUNCTION, checkout.POSTGRES_FUNCTION):
+        print(sql.strip())
+        print()
+
+
+COMMANDS = {
+    "rebuild-rollups": (rebuild_rollups, "Recompute admin dashboard and per-customer counters from the orders table"),
+    "rebuild-purchases": (rebuild_purchases, "Recompute which products each customer has bought (verified-purchase reviews)"),
+    "rebuild-schedule": (rebuild_schedule, "Recreate reminder and recurrence timers from orders, occasions and subscriptions"),
+    "rebuild-recommendations": (rebuild_recommendations, "Recompute the bought-together model behind \"Based on your last order\""),
+    "rebuild-review-stats": (rebuild_review_stats, "Recompute per-product rating counts, means and histograms from product_reviews"),
+    "backfill-review-thumbnails": (backfill_review_thumbnails, "Create WebP thumbnails for review photos uploaded before thumbnail_urls existed"),
+    "supabase-sql": (supabase_sql, "Print the SQL that adds orders.city, the review indexes and thumbnail_urls column, and the apply_loyalty_points and commit_order functions"),
+}
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, (fn, help_text) in COMMANDS.items():
+        sub.add_parser(name, help=help_text).set_defaults(fn=fn)
+    args = parser.parse_args()
+    args.fn(args)
+
+
+if __name__ == "__main__":
+    cli()
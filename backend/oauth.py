@@ -0,0 +1,101 @@
+"""Social sign-in token verification.
+
+``OAuthVerifier`` asks the provider who a token belongs to (Google's userinfo
+endpoint, Facebook's Graph ``/me``) over one shared keep-alive
+``httpx.AsyncClient``, so only the first login after a quiet spell pays for the
+TLS handshake. Profiles of tokens that verified are kept for ``ttl`` seconds,
+keyed by a SHA-256 of provider and token (tokens themselves are never held), so
+a retry or repeated login from the SPA skips the provider entirely; concurrent
+verifications of the same token share one request. Failed verifications are
+not cached.
+
+Provider URLs are configurable so tests can point them at
+``benchmarks/oauth_stub.py``.
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+
+GOOGLE_USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
+FACEBOOK_ME_URL = "https://graph.facebook.com/me"
+
+
+class OAuthError(Exception):
+    def __init__(self, status: int, detail: str):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+_LABELS = {"google": "Google", "facebook": "Facebook"}
+
+
+class OAuthVerifier:
+    def __init__(self, client: httpx.AsyncClient, ttl: float = 300, max_entries: int = 10_000,
+                 google_url: str = GOOGLE_USERINFO_URL, facebook_url: str = FACEBOOK_ME_URL):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.google_url = google_url
+        self.facebook_url = facebook_url
+        self._cache: OrderedDict = OrderedDict()  # key -> (expires_at, profile)
+        self._inflight: dict = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(provider: str, token: str) -> str:
+        return hashlib.sha256(f"{provider}\0{token}".encode()).hexdigest()
+
+    async def _fetch(self, provider: str, token: str) -> dict:
+        label = _LABELS[provider]
+        try:
+            if provider == "google":
+                r = await self.client.get(self.google_url, headers={"Authorization": f"Bearer {token}"})
+            else:
+                r = await self.client.get(self.facebook_url, params={
+                    "fields": "id,name,email,first_name,last_name", "access_token": token})
+            data = r.json()
+        except Exception:
+            raise OAuthError(401, f"{label} sign-in verification failed.")
+        if r.status_code != 200 or "error" in data:
+            raise OAuthError(401, f"Invalid {label} token. Please try again.")
+        if provider == "google":
+            first_name = data.get("given_name") or (data.get("name") or "User").split()[0]
+            last_name = data.get("family_name", "")
+        else:
+            first_name = data.get("first_name") or (data.get("name") or "User").split()[0]
+            last_name = data.get("last_name", "")
+        return {"email": data.get("email"), "first_name": first_name, "last_name": last_name}
+
+    async def verify(self, provider: str, token: str) -> dict:
+        """{"email", "first_name", "last_name"} for `token`; raises OAuthError if the provider rejects it."""
+        if provider not in _LABELS:
+            raise OAuthError(400, "Unsupported provider.")
+        key = self._key(provider, token)
+        entry = self._cache.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.hits += 1
+                return dict(entry[1])
+            del self._cache[key]
+        self.misses += 1
+
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fetch(provider, token))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        profile = await asyncio.shield(pending)
+
+        self._cache[key] = (time.monotonic() + self.ttl, profile)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return dict(profile)
+
+    def stats(self) -> dict:
+        return {"cached": len(self._cache), "hits": self.hits, "misses": self.misses}
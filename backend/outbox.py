@@ -0,0 +1,209 @@
+"""Durable job queue for side effects (emails, SMS, WhatsApp).
+
+Request handlers ``enqueue()`` a job and return; a small pool of worker threads
+drains the queue in the background. Jobs live in a WAL-mode SQLite file, so
+they survive restarts and every uvicorn worker on the host shares one queue.
+
+A handler gets the job payload and either returns (the job is done — the return
+value is its outcome) or raises, in which case the job is retried with
+exponential backoff until ``max_attempts`` is reached. A worker claims a job
+with a lease; if the process dies mid-job the lease expires and another worker
+picks it up again.
+"""
+import json
+import random
+import threading
+import time
+import traceback
+from typing import Callable, Optional
+
+from localdb import LocalDB
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind         TEXT    NOT NULL,
+    payload      TEXT    NOT NULL,
+    status       TEXT    NOT NULL DEFAULT 'pending',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    run_at       REAL    NOT NULL,
+    locked_until REAL,
+    last_error   TEXT,
+    created_at   REAL    NOT NULL,
+    finished_at  REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_at);
+"""
+
+
+class Outbox:
+    # Finished jobs are kept this long for inspection, then deleted.
+    KEEP_FINISHED_SECONDS = 7 * 24 * 3600
+    # Idle workers re-check the queue this often, picking up jobs other processes enqueued.
+    POLL_SECONDS = 5.0
+
+    def __init__(self, path: str, workers: int = 4, max_attempts: int = 6,
+                 base_delay: float = 5.0, max_delay: float = 3600.0, lease_seconds: float = 300.0,
+                 clock: Callable[[], float] = time.time):
+        self.db = LocalDB(path)
+        self.db.executescript(_SCHEMA)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+        self._handlers: dict = {}
+        self._on_finish: Optional[Callable] = None
+        self._wake = threading.Condition()
+        self._stopping = False
+        self._threads: list = []
+
+    # ── Setup ────────────────────────────────────────────────────────────────
+    def handler(self, kind: str):
+        """Decorator registering the function that runs jobs of `kind`."""
+        def register(fn):
+            self._handlers[kind] = fn
+            return fn
+        return register
+
+    def on_finish(self, fn: Callable):
+        """`fn(kind, payload, ok, outcome_or_error)` runs once a job succeeds or gives up."""
+        self._on_finish = fn
+        return fn
+
+    def start(self):
+        self._stopping = False
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"outbox-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout: float = 5.0):
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    # ── Producing ────────────────────────────────────────────────────────────
+    def enqueue(self, kind: str, payload: dict, delay: float = 0) -> int:
+        if kind not in self._handlers:
+            raise ValueError(f"No outbox handler for '{kind}'")
+        now = self.clock()
+        cur = self.db.execute(
+            "INSERT INTO jobs (kind, payload, run_at, created_at) VALUES (?, ?, ?, ?)",
+            (kind, json.dumps(payload), now + delay, now),
+        )
+        with self._wake:
+            self._wake.notify()
+        return cur.lastrowid
+
+    # ── Consuming ────────────────────────────────────────────────────────────
+    def _claim(self) -> Optional[tuple]:
+        now = self.clock()
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts FROM jobs"
+                " WHERE (status = 'pending' AND run_at <= ?) OR (status = 'running' AND locked_until <= ?)"
+                " ORDER BY run_at LIMIT 1",
+                (now, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ? WHERE id = ?",
+                (now + self.lease_seconds, row[0]),
+            )
+        return row[0], row[1], json.loads(row[2]), row[3] + 1
+
+    def _next_due_in(self) -> float:
+        row = self.db.execute(
+            "SELECT MIN(CASE status WHEN 'pending' THEN run_at ELSE locked_until END) FROM jobs"
+            " WHERE status IN ('pending', 'running')"
+        ).fetchone()
+        if row[0] is None:
+            return self.POLL_SECONDS
+        return max(0.0, min(self.POLL_SECONDS, row[0] - self.clock()))
+
+    def backoff(self, attempts: int) -> float:
+        """Delay before retry number `attempts`: base * 2^(n-1), capped, with ±20% jitter."""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def run_job(self, job_id: int, kind: str, payload: dict, attempts: int) -> bool:
+        """Run one claimed job and record the result; returns True if it finished."""
+        try:
+            outcome = self._handlers[kind](payload)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if attempts >= self.max_attempts:
+                self.db.execute(
+                    "UPDATE jobs SET status = 'failed', last_error = ?, finished_at = ? WHERE id = ?",
+                    (error, self.clock(), job_id),
+                )
+                print(f"[Outbox] {kind} job {job_id} failed after {attempts} attempts: {error}")
+                self._finish(kind, payload, False, error)
+                return True
+            self.db.execute(
+                "UPDATE jobs SET status = 'pending', last_error = ?, run_at = ? WHERE id = ?",
+                (error, self.clock() + self.backoff(attempts), job_id),
+            )
+            return False
+        self.db.execute(
+            "UPDATE jobs SET status = 'done', last_error = NULL, finished_at = ? WHERE id = ?",
+            (self.clock(), job_id),
+        )
+        self._finish(kind, payload, True, outcome)
+        return True
+
+    def _finish(self, kind: str, payload: dict, ok: bool, outcome):
+        if self._on_finish is None:
+            return
+        try:
+            self._on_finish(kind, payload, ok, outcome)
+        except Exception:
+            traceback.print_exc()
+
+    def run_pending(self, limit: Optional[int] = None) -> int:
+        """Run due jobs on the calling thread until none are left; returns how many ran."""
+        ran = 0
+        while limit is None or ran < limit:
+            job = self._claim()
+            if job is None:
+                break
+            self.run_job(*job)
+            ran += 1
+        return ran
+
+    def purge_finished(self) -> int:
+        cur = self.db.execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at <= ?",
+            (self.clock() - self.KEEP_FINISHED_SECONDS,),
+        )
+        return cur.rowcount
+
+    def _work(self):
+        last_purge = 0.0
+        while not self._stopping:
+            try:
+                job = self._claim()
+                if job is not None:
+                    self.run_job(*job)
+                    continue
+                if self.clock() - last_purge > 3600:
+                    self.purge_finished()
+                    last_purge = self.clock()
+                wait = self._next_due_in()
+            except Exception:
+                traceback.print_exc()
+                wait = 1.0
+            with self._wake:
+                if not self._stopping:
+                    self._wake.wait(wait)
+
+    # ── Inspection ───────────────────────────────────────────────────────────
+    def counts(self) -> dict:
+        rows = self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
@@ -0,0 +1,121 @@
+"""bcrypt hashing off the request threads.
+
+bcrypt is deliberately slow (hundreds of ms at cost 12) and, run inline in sync
+endpoints, a burst of logins occupies the threadpool every other sync endpoint
+shares. ``PasswordHasher`` gives it its own small executor instead: at most
+``workers`` hashes run at once, the rest wait in a queue whose depth is tracked,
+and past ``max_queue`` waiting jobs callers get ``HasherBusy`` rather than
+piling up. bcrypt releases the GIL while hashing, so plain threads run in
+parallel and avoid a process pool's pickling and start-up costs.
+
+Hashes carry their cost factor; ``needs_rehash`` tells the login path to store a
+fresh hash when ``rounds`` has been changed.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+# Stored for accounts that never sign in with a password (social logins); no password verifies against it
+UNUSABLE_PASSWORD = "!"
+
+
+class HasherBusy(Exception):
+    """Too many hashing jobs are already waiting."""
+
+
+def hash_cost(hashed: str) -> Optional[int]:
+    """The cost factor of a ``$2b$12$...`` hash, or None if it isn't a bcrypt hash."""
+    parts = (hashed or "").split("$")
+    if len(parts) < 4 or not parts[1].startswith("2") or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = 2, rounds: int = 12, max_queue: int = 64):
+        self.workers = workers
+        self.rounds = rounds
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._peak_queued = 0
+        self._rejected = 0
+        self._completed = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+
+    def _job(self, fn, args, queued_at: float):
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+                self._wait_total += started - queued_at
+                self._run_total += finished - started
+
+    async def _submit(self, fn, *args):
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                raise HasherBusy()
+            self._queued += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+        future = self._executor.submit(self._job, fn, args, time.perf_counter())
+        future.add_done_callback(self._dequeue_if_cancelled)
+        return await asyncio.wrap_future(future)
+
+    def _dequeue_if_cancelled(self, future):
+        # A job cancelled while waiting (the client went away) never reaches _job
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    @staticmethod
+    def _hash(password: str, rounds: int) -> str:
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds)).decode()
+
+    @staticmethod
+    def _verify(password: str, hashed: str) -> bool:
+        return bcrypt.checkpw(password.encode(), hashed.encode())
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(self._hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        if hash_cost(hashed) is None:
+            return False
+        return await self._submit(self._verify, password, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        cost = hash_cost(hashed)
+        return cost is not None and cost != self.rounds
+
+    def stats(self) -> dict:
+        with self._lock:
+            done = self._completed or 1
+            return {
+                "workers": self.workers,
+                "rounds": self.rounds,
+                "queued": self._queued,
+                "running": self._running,
+                "peak_queued": self._peak_queued,
+                "rejected": self._rejected,
+                "completed": self._completed,
+                "avg_wait_ms": round(self._wait_total / done * 1000, 1),
+                "avg_run_ms": round(self._run_total / done * 1000, 1),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
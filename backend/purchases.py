@@ -0,0 +1,128 @@
+"""Which products each customer has bought, for verified-purchase checks.
+
+Persisted in a local SQLite file as one row per customer email. The row's
+``products`` blob packs sorted ``(product_id, orders)`` pairs as unsigned 32-bit
+ints, where ``orders`` is how many non-cancelled orders contain the product, so
+cancelling one of two orders for a product keeps it purchased. A customer costs
+one primary-key read however long their order history is.
+
+``has_purchased`` answers from an in-memory LRU cache of product-id sets
+(``cache_size`` customers). This process's writes update the cache in place;
+writes from other workers (seen through SQLite's ``data_version``) clear it.
+"""
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from localdb import LocalDB
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS purchases (
+    email    TEXT PRIMARY KEY COLLATE NOCASE,
+    products BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def _unpack(blob: Optional[bytes]) -> dict:
+    pairs = array("I")
+    if blob:
+        pairs.frombytes(blob)
+    return dict(zip(pairs[::2], pairs[1::2]))
+
+
+def _pack(counts: dict) -> bytes:
+    return array("I", [v for pid in sorted(counts) for v in (pid, counts[pid])]).tobytes()
+
+
+def _key(email: str) -> str:
+    return (email or "").strip().lower()
+
+
+class PurchaseIndex:
+    def __init__(self, path: str, cache_size: int = 10_000):
+        self.db = LocalDB(path)
+        self.db.executescript(_SCHEMA)
+        self.cache_size = cache_size
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _remember(self, email: str, products: frozenset):
+        with self._lock:  # re-entrant: products() calls it with the lock held
+            self._cache[email] = products
+            self._cache.move_to_end(email)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _adjust(self, email: str, product_ids: Iterable[int], delta: int):
+        email = _key(email)
+        product_ids = set(product_ids)
+        if not email or not product_ids:
+            return
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT products FROM purchases WHERE email = ?", (email,)).fetchone()
+            counts = _unpack(row[0] if row else None)
+            for pid in product_ids:
+                n = counts.get(pid, 0) + delta
+                if n > 0:
+                    counts[pid] = n
+                else:
+                    counts.pop(pid, None)
+            conn.execute("INSERT OR REPLACE INTO purchases (email, products) VALUES (?, ?)", (email, _pack(counts)))
+        self._remember(email, frozenset(counts))
+
+    # ── Updates ──────────────────────────────────────────────────────────────
+    def add(self, email: str, product_ids: Iterable[int]):
+        """Record a new (or un-cancelled) order's products; one count per product per order."""
+        self._adjust(email, product_ids, 1)
+
+    def remove(self, email: str, product_ids: Iterable[int]):
+        """Undo `add` for a cancelled order."""
+        self._adjust(email, product_ids, -1)
+
+    def rebuild(self, orders: Iterable[tuple]) -> int:
+        """Replace everything with `orders`: (customer_email, [product ids]) per non-cancelled order."""
+        customers: dict = {}
+        n = 0
+        for email, product_ids in orders:
+            email = _key(email)
+            if not email:
+                continue
+            counts = customers.setdefault(email, {})
+            for pid in set(product_ids):
+                counts[pid] = counts.get(pid, 0) + 1
+            n += 1
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM purchases")
+            conn.executemany("INSERT INTO purchases (email, products) VALUES (?, ?)",
+                             [(email, _pack(counts)) for email, counts in customers.items()])
+        with self._lock:
+            self._cache.clear()
+        return n
+
+    # ── Reads ────────────────────────────────────────────────────────────────
+    def is_empty(self) -> bool:
+        return self.db.execute("SELECT 1 FROM purchases LIMIT 1").fetchone() is None
+
+    def products(self, email: str) -> frozenset:
+        """Ids of every product in the customer's non-cancelled orders."""
+        email = _key(email)
+        if not email:
+            return frozenset()
+        changed = self.db.changed()
+        with self._lock:
+            if changed:
+                self._cache.clear()
+            cached = self._cache.get(email)
+            if cached is not None:
+                self._cache.move_to_end(email)
+                return cached
+            # Read under the lock so a concurrent _adjust can't be overwritten by an older row
+            row = self.db.execute("SELECT products FROM purchases WHERE email = ?", (email,)).fetchone()
+            products = frozenset(_unpack(row[0] if row else None))
+            self._remember(email, products)
+        return products
+
+    def has_purchased(self, email: str, product_id: int) -> bool:
+        return product_id in self.products(email)
@@ -0,0 +1,117 @@
+"""Review photo processing.
+
+Decoding and re-encoding images is CPU-bound, so ``PhotoPipeline`` runs it in
+a process pool, off the event loop and outside the GIL; the photos of one review
+are processed in parallel. Each upload becomes two WebP files:
+
+* ``full`` — the photo re-encoded from its pixels (so EXIF, GPS and any other
+  metadata is dropped, after applying the EXIF orientation) and downscaled to
+  at most ``FULL_SIDE`` px on the long side;
+* ``thumb`` — at most ``THUMB_SIDE`` px, what review listings show.
+
+JPEGs are decoded with ``Image.draft`` at the smallest power-of-two scale that
+still covers the target size, which skips most of the decoding work for phone
+photos.
+
+Workers are started with ``forkserver`` (``spawn`` where that isn't available)
+rather than forked from the multi-threaded server. If one dies (say, OOM-killed
+on a huge image) the broken pool is replaced and the photo retried once on a
+fresh one; a second crash is reported as a ``PhotoError``.
+"""
+import asyncio
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+FULL_SIDE = 1600
+THUMB_SIDE = 320
+FULL_QUALITY = 82
+THUMB_QUALITY = 75
+MAX_PIXELS = 40_000_000  # refuse decompression bombs well before Pillow's own limit
+
+# Thumbnail URLs next to photo_urls; reviews without them fall back to the originals.
+# `python manage.py backfill-review-thumbnails` fills them in for existing photos.
+REVIEW_THUMBNAILS_SQL = """
+alter table product_reviews add column if not exists thumbnail_urls text[] default '{}';
+"""
+
+
+class PhotoError(ValueError):
+    """The upload is not an image we can process."""
+
+
+def _webp(img: Image.Image, quality: int) -> bytes:
+    out = io.BytesIO()
+    img.save(out, "WEBP", quality=quality, method=4)
+    return out.getvalue()
+
+
+def process(data: bytes, full_side: int = FULL_SIDE, thumb_side: int = THUMB_SIDE) -> dict:
+    """{"full": webp bytes, "thumb": webp bytes, "width", "height"} for one uploaded image.
+
+    Runs in a worker process; raises PhotoError for anything that isn't a readable image.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            if img.width * img.height > MAX_PIXELS:
+                raise PhotoError("Image is too large")
+            img.draft("RGB", (full_side, full_side))
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise PhotoError("Photos must be JPEG, PNG or WebP images") from None
+    img.thumbnail((full_side, full_side), Image.LANCZOS)
+    full = _webp(img, FULL_QUALITY)
+    width, height = img.size
+    img.thumbnail((thumb_side, thumb_side), Image.LANCZOS)
+    return {"full": full, "thumb": _webp(img, THUMB_QUALITY), "width": width, "height": height}
+
+
+class PhotoPipeline:
+    """A lazily started process pool for ``process``."""
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._pool
+
+    def _discard(self, pool: ProcessPoolExecutor):
+        """Drop `pool` if it is still the current one; the next use starts a fresh pool."""
+        if self._pool is pool:
+            self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def process(self, data: bytes) -> dict:
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            pool = self.pool
+            try:
+                return await loop.run_in_executor(pool, process, data)
+            except BrokenProcessPool:
+                print("[Photos] a worker process died; restarting the pool")
+                self._discard(pool)
+        raise PhotoError("This photo could not be processed")
+
+    async def process_many(self, photos: list) -> list:
+        """Process `photos` in parallel; the first PhotoError (if any) is raised after all finish."""
+        results = await asyncio.gather(*(self.process(p) for p in photos), return_exceptions=True)
+        for r in results:
+            if isinstance(r, Exception):
+                raise r
+        return results
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
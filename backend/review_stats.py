@@ -0,0 +1,117 @@
+"""Per-product rating aggregates.
+
+One row per product in a local SQLite file: review count, rating sum, a 1–5
+histogram and how many reviews are verified purchases. ``record`` adds a review
+in place, so the numbers never need the review rows themselves; ``rebuild``
+recomputes them from a full ``product_reviews`` listing.
+
+Reads come from an in-memory snapshot of the whole table. This process's
+writes update it in place; it is reloaded only when SQLite's ``data_version``
+shows that another worker wrote, so the catalog endpoints can embed ratings for
+every product for free.
+"""
+import threading
+from typing import Iterable, Optional
+
+from localdb import LocalDB
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS product_ratings (
+    product_id INTEGER PRIMARY KEY,
+    reviews    INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    stars_1    INTEGER NOT NULL DEFAULT 0,
+    stars_2    INTEGER NOT NULL DEFAULT 0,
+    stars_3    INTEGER NOT NULL DEFAULT 0,
+    stars_4    INTEGER NOT NULL DEFAULT 0,
+    stars_5    INTEGER NOT NULL DEFAULT 0,
+    verified   INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Indexes behind GET /api/reviews: one per keyset ordering (see main.REVIEW_SORTS).
+REVIEWS_INDEX_SQL = """
+create index if not exists product_reviews_recent_idx on product_reviews (product_id, created_at, id);
+create index if not exists product_reviews_rating_idx on product_reviews (product_id, rating, created_at, id);
+"""
+
+_COLUMNS = "product_id, reviews, rating_sum, stars_1, stars_2, stars_3, stars_4, stars_5, verified"
+
+EMPTY = {"count": 0, "average": 0.0, "histogram": {str(n): 0 for n in range(1, 6)}, "verified_share": 0.0}
+
+
+def _summary(row: tuple) -> dict:
+    _, reviews, rating_sum, *stars, verified = row
+    return {
+        "count": reviews,
+        "average": round(rating_sum / reviews, 2) if reviews else 0.0,
+        "histogram": {str(n): stars[n - 1] for n in range(1, 6)},
+        "verified_share": round(verified / reviews, 3) if reviews else 0.0,
+    }
+
+
+class RatingAggregates:
+    def __init__(self, path: str):
+        self.db = LocalDB(path)
+        self.db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._cache: Optional[dict] = None
+
+    def record(self, product_id: int, rating: int, verified: bool):
+        with self.db.transaction() as conn:
+            conn.execute(
+                f"INSERT INTO product_ratings (product_id, reviews, rating_sum, stars_{rating}, verified)"
+                " VALUES (?, 1, ?, 1, ?)"
+                f" ON CONFLICT(product_id) DO UPDATE SET reviews = reviews + 1, rating_sum = rating_sum + excluded.rating_sum,"
+                f" stars_{rating} = stars_{rating} + 1, verified = verified + excluded.verified",
+                (product_id, rating, int(bool(verified))),
+            )
+            row = conn.execute(f"SELECT {_COLUMNS} FROM product_ratings WHERE product_id = ?", (product_id,)).fetchone()
+        # The cache follows this process's own writes (a copy, so readers iterating the old one are safe);
+        # changed() only reports other processes'
+        with self._lock:
+            if self._cache is not None:
+                self._cache = {**self._cache, product_id: _summary(row)}
+
+    def rebuild(self, reviews: Iterable[dict]) -> int:
+        """Replace all aggregates with ones computed from `reviews` (product_id/rating/verified_purchase rows)."""
+        rows: dict = {}
+        n = 0
+        for r in reviews:
+            rating = r.get("rating")
+            if not isinstance(rating, int) or not 1 <= rating <= 5:
+                continue
+            row = rows.setdefault(r["product_id"], [0, 0, 0, 0, 0, 0, 0, 0])
+            row[0] += 1
+            row[1] += rating
+            row[1 + rating] += 1
+            row[7] += 1 if r.get("verified_purchase") else 0
+            n += 1
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM product_ratings")
+            conn.executemany(
+                f"INSERT INTO product_ratings ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(pid, *row) for pid, row in rows.items()],
+            )
+        with self._lock:
+            self._cache = None
+        return n
+
+    def is_empty(self) -> bool:
+        return self.db.execute("SELECT 1 FROM product_ratings LIMIT 1").fetchone() is None
+
+    def all(self) -> dict:
+        """product_id -> summary for every product with at least one review."""
+        changed = self.db.changed()
+        with self._lock:
+            if changed:
+                self._cache = None
+            if self._cache is None:
+                # Read under the lock so a concurrent record() can't be overwritten by an older snapshot
+                rows = self.db.execute(f"SELECT {_COLUMNS} FROM product_ratings").fetchall()
+                self._cache = {row[0]: _summary(row) for row in rows}
+            return self._cache
+
+    def get(self, product_id: int) -> dict:
+        """{"count", "average", "histogram" ("1".."5" -> reviews), "verified_share"}."""
+        return self.all().get(product_id, EMPTY)
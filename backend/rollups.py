@@ -0,0 +1,238 @@
+"""Incrementally maintained order counters for the admin dashboard.
+
+Tables in a local SQLite file:
+
+* ``status_totals`` — order count and revenue per status, all time
+* ``day_totals``    — the same, per (UTC day, status)
+* ``customer_totals`` — order count, spend and last order time per customer email
+* ``city_products`` — order lines per (delivery city, product), cancelled orders excluded
+
+Order writes adjust them in place, so ``stats()`` reads at most a dozen rows no
+matter how many orders exist. ``rebuild()`` recomputes everything from a full
+order listing and is the repair path if the counters ever drift.
+"""
+from localdb import LocalDB
+
+PENDING_STATUSES = ("confirmed", "preparing")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS status_totals (
+    status  TEXT PRIMARY KEY,
+    orders  INTEGER NOT NULL DEFAULT 0,
+    revenue REAL    NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS day_totals (
+    day     TEXT NOT NULL,
+    status  TEXT NOT NULL,
+    orders  INTEGER NOT NULL DEFAULT 0,
+    revenue REAL    NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, status)
+);
+CREATE TABLE IF NOT EXISTS customer_totals (
+    email      TEXT PRIMARY KEY COLLATE NOCASE,
+    orders     INTEGER NOT NULL DEFAULT 0,
+    spent      REAL    NOT NULL DEFAULT 0,
+    last_order TEXT    NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS customer_totals_spent ON customer_totals (spent DESC, email DESC);
+CREATE INDEX IF NOT EXISTS customer_totals_recent ON customer_totals (last_order DESC, email DESC);
+CREATE TABLE IF NOT EXISTS city_products (
+    city       TEXT    NOT NULL COLLATE NOCASE,
+    product_id INTEGER NOT NULL,
+    orders     INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (city, product_id)
+);
+CREATE INDEX IF NOT EXISTS city_products_top ON city_products (city, orders DESC);
+"""
+
+_BUMP_STATUS = """
+INSERT INTO status_totals (status, orders, revenue) VALUES (?, ?, ?)
+ON CONFLICT(status) DO UPDATE SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue
+"""
+
+_BUMP_DAY = """
+INSERT INTO day_totals (day, status, orders, revenue) VALUES (?, ?, ?, ?)
+ON CONFLICT(day, status) DO UPDATE SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue
+"""
+
+_BUMP_CUSTOMER = """
+INSERT INTO customer_totals (email, orders, spent, last_order) VALUES (?, ?, ?, ?)
+ON CONFLICT(email) DO UPDATE SET orders = orders + excluded.orders, spent = spent + excluded.spent,
+    last_order = max(last_order, excluded.last_order)
+"""
+
+_BUMP_CITY_PRODUCT = """
+INSERT INTO city_products (city, product_id, orders) VALUES (?, ?, ?)
+ON CONFLICT(city, product_id) DO UPDATE SET orders = orders + excluded.orders
+"""
+
+# Sort key -> column; every sort breaks ties on email so (value, email) is a unique keyset.
+CUSTOMER_SORTS = {"spend": "spent", "recent": "last_order"}
+
+
+# Bumped whenever a table is added; older files are emptied so startup rebuilds them.
+SCHEMA_VERSION = 3
+
+
+class OrderRollups:
+    def __init__(self, path: str):
+        self.db = LocalDB(path)
+        self.db.executescript(_SCHEMA)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            with self.db.transaction() as conn:
+                conn.execute("DELETE FROM status_totals")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _bump(self, conn, day: str, status: str, count: int, revenue: float):
+        conn.execute(_BUMP_STATUS, (status, count, revenue))
+        conn.execute(_BUMP_DAY, (day, status, count, revenue))
+
+    @staticmethod
+    def _bump_city(conn, city: str, product_ids, delta: int):
+        if city:
+            conn.executemany(_BUMP_CITY_PRODUCT, [(city.lower(), pid, delta) for pid in product_ids])
+
+    def record_new(self, day: str, status: str, total: float, email: str = "", created_at: str = "",
+                   city: str = "", product_ids=()):
+        with self.db.transaction() as conn:
+            self._bump(conn, day, status, 1, total)
+            if email:
+                spent = 0 if status == "cancelled" else total
+                conn.execute(_BUMP_CUSTOMER, (email, 1, spent, created_at))
+            if status != "cancelled":
+                self._bump_city(conn, city, product_ids, 1)
+
+    def record_transition(self, day: str, old_status: str, new_status: str, total: float, email: str = "",
+                          city: str = "", product_ids=()):
+        """`city`/`product_ids` only matter (and need only be passed) when the order enters or leaves "cancelled"."""
+        if old_status == new_status:
+            return
+        with self.db.transaction() as conn:
+            self._bump(conn, day, old_status, -1, -total)
+            self._bump(conn, day, new_status, 1, total)
+            # Cancelled orders don't count towards spend or city popularity
+            if (old_status == "cancelled") != (new_status == "cancelled"):
+                sign = 1 if old_status == "cancelled" else -1
+                if email:
+                    conn.execute("UPDATE customer_totals SET spent = spent + ? WHERE email = ?", (sign * total, email))
+                self._bump_city(conn, city, product_ids, sign)
+
+    def is_empty(self) -> bool:
+        return self.db.execute("SELECT 1 FROM status_totals LIMIT 1").fetchone() is None
+
+    def rebuild(self, orders, order_products=None) -> int:
+        """Replace all counters with totals computed from `orders` (customer_email/status/total/created_at rows).
+
+        City counts need each order's ``city`` and `order_products` (order id -> product ids).
+        """
+        by_status: dict = {}
+        by_day: dict = {}
+        by_customer: dict = {}
+        by_city: dict = {}
+        order_products = order_products or {}
+        n = 0
+        for o in orders:
+            status = o.get("status") or ""
+            total = o.get("total") or 0
+            created_at = o.get("created_at") or ""
+            day = created_at[:10]
+            s = by_status.setdefault(status, [0, 0.0])
+            s[0] += 1
+            s[1] += total
+            d = by_day.setdefault((day, status), [0, 0.0])
+            d[0] += 1
+            d[1] += total
+            email = o.get("customer_email")
+            if email:
+                c = by_customer.setdefault(email, [0, 0.0, ""])
+                c[0] += 1
+                if status != "cancelled":
+                    c[1] += total
+                if created_at > c[2]:
+                    c[2] = created_at
+            city = (o.get("city") or "").lower()
+            if city and status != "cancelled":
+                for pid in order_products.get(o.get("id"), ()):
+                    by_city[(city, pid)] = by_city.get((city, pid), 0) + 1
+            n += 1
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM status_totals")
+            conn.execute("DELETE FROM day_totals")
+            conn.execute("DELETE FROM customer_totals")
+            conn.execute("DELETE FROM city_products")
+            conn.executemany(
+                "INSERT INTO status_totals (status, orders, revenue) VALUES (?, ?, ?)",
+                [(k, v[0], v[1]) for k, v in by_status.items()],
+            )
+            conn.executemany(
+                "INSERT INTO day_totals (day, status, orders, revenue) VALUES (?, ?, ?, ?)",
+                [(k[0], k[1], v[0], v[1]) for k, v in by_day.items()],
+            )
+            conn.executemany(
+                "INSERT INTO customer_totals (email, orders, spent, last_order) VALUES (?, ?, ?, ?)",
+                [(k, v[0], v[1], v[2]) for k, v in by_customer.items()],
+            )
+            conn.executemany(
+                "INSERT INTO city_products (city, product_id, orders) VALUES (?, ?, ?)",
+                [(k[0], k[1], v) for k, v in by_city.items()],
+            )
+        return n
+
+    def stats(self, today: str) -> dict:
+        statuses = self.db.execute("SELECT status, orders, revenue FROM status_totals").fetchall()
+        today_rows = self.db.execute(
+            "SELECT status, orders, revenue FROM day_totals WHERE day = ?", (today,)
+        ).fetchall()
+        return {
+            "total_orders": sum(r[1] for r in statuses),
+            "today_orders": sum(r[1] for r in today_rows),
+            "pending_count": sum(r[1] for r in statuses if r[0] in PENDING_STATUSES),
+            "revenue_total": round(sum(r[2] for r in statuses if r[0] != "cancelled"), 2),
+            "revenue_today": round(sum(r[2] for r in today_rows if r[0] != "cancelled"), 2),
+        }
+
+    def customer_totals(self, emails) -> dict:
+        """lower-cased email -> (orders, spent, last_order) for the given emails."""
+        emails = list(emails)
+        if not emails:
+            return {}
+        marks = ", ".join("?" for _ in emails)
+        rows = self.db.execute(
+            f"SELECT email, orders, spent, last_order FROM customer_totals WHERE email IN ({marks})", emails
+        ).fetchall()
+        return {r[0].lower(): r[1:] for r in rows}
+
+    def customer_page(self, sort: str, limit: int, after=None, email_prefix: str = "") -> list:
+        """One page of (email, orders, spent, last_order), highest `sort` value first.
+
+        `after` is the (value, email) of the last row of the previous page.
+        """
+        col = CUSTOMER_SORTS[sort]
+        where, params = [], []
+        if email_prefix:
+            where.append("email >= ? AND email < ?")
+            params += [email_prefix, email_prefix + "\uffff"]
+        if after is not None:
+            where.append(f"({col}, email) < (?, ?)")
+            params += list(after)
+        sql = "SELECT email, orders, spent, last_order FROM customer_totals"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {col} DESC, email DESC LIMIT ?"
+        return self.db.execute(sql, (*params, limit)).fetchall()
+
+    def customer_count(self, email_prefix: str = "") -> int:
+        if email_prefix:
+            return self.db.execute(
+                "SELECT COUNT(*) FROM customer_totals WHERE email >= ? AND email < ?",
+                (email_prefix, email_prefix + "\uffff"),
+            ).fetchone()[0]
+        return self.db.execute("SELECT COUNT(*) FROM customer_totals").fetchone()[0]
+
+    def top_city_products(self, city: str, k: int) -> list:
+        """[(product_id, orders)] for the `k` products ordered most for delivery to `city`."""
+        return self.db.execute(
+            "SELECT product_id, orders FROM city_products WHERE city = ? AND orders > 0"
+            " ORDER BY orders DESC, product_id LIMIT ?",
+            (city.lower(), k),
+        ).fetchall()
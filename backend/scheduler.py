@@ -0,0 +1,242 @@
+"""Persistent timer queue for reminders and recurring deliveries.
+
+Every future event (a reminder to send, a recurring delivery date to roll
+forward, ...) is one row keyed by a stable name such as
+``order:FLR1234:remind:3``. Scheduling the same key again moves the event;
+cancelling a key prefix drops everything belonging to one order or subscription.
+
+Rows live in a WAL-mode SQLite file. Each process loads them once into a heap
+and keeps it current from its own writes, plus a cheap ``updated_at`` sync for
+rows written by other uvicorn workers. A due event is leased by the process that
+moves its row's ``due_at`` forward, so several workers never fire it twice; the
+row is deleted once the handler succeeds. If the handler raises (or the process
+dies mid-run) the lease simply runs out and the event fires again, backing off
+from ``RETRY_SECONDS`` up to ``MAX_RETRY_SECONDS``.
+
+Pass a ``FakeClock`` as ``clock`` and call ``run_due()`` to drive it in tests.
+"""
+import heapq
+import json
+import threading
+import time
+import traceback
+from typing import Callable, Optional
+
+from localdb import LocalDB
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    key        TEXT PRIMARY KEY,
+    kind       TEXT NOT NULL,
+    due_at     REAL NOT NULL,
+    payload    TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    attempts   INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS events_updated ON events (updated_at);
+CREATE TABLE IF NOT EXISTS meta (
+    name  TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class FakeClock:
+    """A clock that only moves when told to."""
+
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> float:
+        self.now += seconds
+        return self.now
+
+
+class Scheduler:
+    # How often a running scheduler picks up rows written by other processes.
+    SYNC_SECONDS = 30.0
+    # Lease on a fired event: how long before a failed (or crashed) handler runs again.
+    RETRY_SECONDS = 60.0
+    MAX_RETRY_SECONDS = 3600.0
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.db = LocalDB(path)
+        self.db.executescript(_SCHEMA)
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(events)").fetchall()}
+        if "attempts" not in columns:
+            self.db.execute("ALTER TABLE events ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        self.clock = clock
+        self._handlers: dict = {}
+        self._heap: list = []          # (due_at, key); stale entries are skipped lazily
+        self._due: dict = {}           # key -> due_at of the live entry
+        self._synced_at = 0.0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self.load()
+
+    # ── Setup ────────────────────────────────────────────────────────────────
+    def handler(self, kind: str):
+        """Decorator registering `fn(payload)` to run when an event of `kind` is due."""
+        def register(fn):
+            self._handlers[kind] = fn
+            return fn
+        return register
+
+    def load(self):
+        rows = self.db.execute("SELECT key, due_at, updated_at FROM events").fetchall()
+        with self._cond:
+            self._due = {key: due for key, due, _ in rows}
+            self._heap = [(due, key) for key, due, _ in rows]
+            heapq.heapify(self._heap)
+            self._synced_at = max((r[2] for r in rows), default=0.0)
+
+    def sync(self):
+        """Pick up events scheduled by other processes since the last load/sync."""
+        rows = self.db.execute(
+            "SELECT key, due_at, updated_at FROM events WHERE updated_at >= ?", (self._synced_at,)
+        ).fetchall()
+        with self._cond:
+            for key, due, updated in rows:
+                if self._due.get(key) != due:
+                    self._due[key] = due
+                    heapq.heappush(self._heap, (due, key))
+                self._synced_at = max(self._synced_at, updated)
+            self._cond.notify()
+
+    def is_seeded(self) -> bool:
+        return self.db.execute("SELECT 1 FROM meta WHERE name = 'seeded'").fetchone() is not None
+
+    def mark_seeded(self):
+        self.db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('seeded', ?)", (str(self.clock()),))
+
+    # ── Scheduling ───────────────────────────────────────────────────────────
+    def schedule(self, key: str, kind: str, due_at: float, payload: Optional[dict] = None):
+        self.db.execute(
+            "INSERT OR REPLACE INTO events (key, kind, due_at, payload, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (key, kind, due_at, json.dumps(payload or {}), self.clock()),
+        )
+        self._push(key, due_at)
+
+    def cancel(self, key: str):
+        self.db.execute("DELETE FROM events WHERE key = ?", (key,))
+        with self._cond:
+            self._due.pop(key, None)
+
+    def cancel_prefix(self, prefix: str):
+        """Drop every event whose key starts with `prefix` (e.g. all of one order's reminders)."""
+        self.db.execute("DELETE FROM events WHERE key >= ? AND key < ?", (prefix, prefix + "\uffff"))
+        with self._cond:
+            for key in [k for k in self._due if k.startswith(prefix)]:
+                del self._due[key]
+
+    def clear(self):
+        self.db.execute("DELETE FROM events")
+        with self._cond:
+            self._due.clear()
+            self._heap.clear()
+
+    def pending(self, prefix: str = "") -> list:
+        """[(key, kind, due_at)] in due order, optionally limited to one key prefix."""
+        return self.db.execute(
+            "SELECT key, kind, due_at FROM events WHERE key >= ? AND key < ? ORDER BY due_at",
+            (prefix, prefix + "\uffff"),
+        ).fetchall()
+
+    def next_due(self) -> Optional[float]:
+        with self._cond:
+            self._drop_stale()
+            return self._heap[0][0] if self._heap else None
+
+    # ── Firing ───────────────────────────────────────────────────────────────
+    def _drop_stale(self):
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def _push(self, key: str, due_at: float):
+        with self._cond:
+            self._due[key] = due_at
+            heapq.heappush(self._heap, (due_at, key))
+            self._cond.notify()
+
+    def _claim(self, key: str, due_at: float) -> Optional[tuple]:
+        """Lease a due event: (kind, payload, lease_until), or None if it moved or another process has it."""
+        now = self.clock()
+        with self.db.transaction() as conn:
+            row = conn.execute(
+                "SELECT kind, payload, attempts FROM events WHERE key = ? AND due_at = ?", (key, due_at)
+            ).fetchone()
+            if row is None:
+                return None
+            kind, payload, attempts = row
+            lease_until = now + min(self.RETRY_SECONDS * 2 ** attempts, self.MAX_RETRY_SECONDS)
+            conn.execute(
+                "UPDATE events SET due_at = ?, attempts = attempts + 1, updated_at = ? WHERE key = ?",
+                (lease_until, now, key),
+            )
+        self._push(key, lease_until)
+        return kind, payload, lease_until
+
+    def _finish(self, key: str, lease_until: float):
+        # A handler that rescheduled its own key has already replaced the leased row
+        self.db.execute("DELETE FROM events WHERE key = ? AND due_at = ?", (key, lease_until))
+        with self._cond:
+            if self._due.get(key) == lease_until:
+                del self._due[key]
+
+    def run_due(self, limit: Optional[int] = None) -> int:
+        """Fire every event due by now, earliest first; returns how many fired (failed or not)."""
+        fired = 0
+        while limit is None or fired < limit:
+            with self._cond:
+                self._drop_stale()
+                if not self._heap or self._heap[0][0] > self.clock():
+                    break
+                due_at, key = heapq.heappop(self._heap)
+                del self._due[key]
+            row = self._claim(key, due_at)
+            if row is None:
+                continue           # moved, cancelled or fired by another process
+            kind, payload, lease_until = row
+            try:
+                self._handlers[kind](json.loads(payload))
+            except Exception:
+                print(f"[Scheduler] {kind} event {key} failed; retrying in {lease_until - self.clock():.0f}s")
+                traceback.print_exc()
+            else:
+                self._finish(key, lease_until)
+            fired += 1
+        return fired
+
+    def start(self):
+        self._stopping = False
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self):
+        last_sync = self.clock()
+        while not self._stopping:
+            try:
+                if self.clock() - last_sync >= self.SYNC_SECONDS:
+                    self.sync()
+                    last_sync = self.clock()
+                self.run_due()
+                nxt = self.next_due()
+                wait = self.SYNC_SECONDS if nxt is None else min(self.SYNC_SECONDS, max(0.0, nxt - self.clock()))
+            except Exception:
+                traceback.print_exc()
+                wait = 1.0
+            with self._cond:
+                if not self._stopping:
+                    self._cond.wait(wait)
@@ -0,0 +1,164 @@
+"""Session token stores.
+
+A session maps an opaque token to a small dict (at least ``{"email": ...}``).
+``MemorySessionStore`` keeps sessions in-process with LRU + TTL eviction and is
+fine for a single worker. ``SQLiteSessionStore`` keeps them in a WAL-mode SQLite
+file so every uvicorn worker on the host sees the same sessions.
+"""
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+from localdb import LocalDB
+
+
+class SessionStore(ABC):
+    """Interface shared by all session backends."""
+
+    @abstractmethod
+    def get(self, token: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def set(self, token: str, session: dict) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, token: str) -> None:
+        ...
+
+    @abstractmethod
+    def update(self, token: str, fields: dict) -> None:
+        """Merge ``fields`` into an existing session without extending its TTL."""
+
+    @abstractmethod
+    def drop_fields_for_email(self, email: str, *keys: str) -> None:
+        """Remove ``keys`` from every live session that belongs to ``email``."""
+
+    def purge_expired(self) -> int:
+        return 0
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, ttl_seconds: float, max_entries: int = 10_000):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._data: OrderedDict = OrderedDict()   # token -> (expires_at, session)
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._data.get(token)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._data[token]
+                return None
+            self._data.move_to_end(token)
+            return dict(entry[1])
+
+    def set(self, token: str, session: dict) -> None:
+        with self._lock:
+            self._data[token] = (time.time() + self.ttl, dict(session))
+            self._data.move_to_end(token)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, token: str) -> None:
+        with self._lock:
+            self._data.pop(token, None)
+
+    def update(self, token: str, fields: dict) -> None:
+        with self._lock:
+            entry = self._data.get(token)
+            if entry is not None:
+                entry[1].update(fields)
+
+    def drop_fields_for_email(self, email: str, *keys: str) -> None:
+        with self._lock:
+            for _, session in self._data.values():
+                if session.get("email") == email:
+                    for k in keys:
+                        session.pop(k, None)
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [t for t, (exp, _) in self._data.items() if exp <= now]
+            for t in expired:
+                del self._data[t]
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteSessionStore(SessionStore):
+    # Expired rows are swept every this many writes so the file stays small.
+    PURGE_EVERY = 500
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.db = LocalDB(path)
+        self.ttl = ttl_seconds
+        self._writes = 0
+        conn = self.db.conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " token TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL, email TEXT)"
+        )
+        if "email" not in {r[1] for r in conn.execute("PRAGMA table_info(sessions)")}:
+            conn.execute("ALTER TABLE sessions ADD COLUMN email TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_email ON sessions (email)")
+
+    def get(self, token: str) -> Optional[dict]:
+        row = self.db.execute(
+            "SELECT data FROM sessions WHERE token = ? AND expires_at > ?",
+            (token, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, token: str, session: dict) -> None:
+        self.db.execute(
+            "INSERT OR REPLACE INTO sessions (token, data, expires_at, email) VALUES (?, ?, ?, ?)",
+            (token, json.dumps(session), time.time() + self.ttl, session.get("email")),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self.purge_expired()
+
+    def delete(self, token: str) -> None:
+        self.db.execute("DELETE FROM sessions WHERE token = ?", (token,))
+
+    def update(self, token: str, fields: dict) -> None:
+        self.db.execute(
+            "UPDATE sessions SET data = json_patch(data, ?) WHERE token = ?",
+            (json.dumps(fields), token),
+        )
+
+    def drop_fields_for_email(self, email: str, *keys: str) -> None:
+        if not keys:
+            return
+        paths = ", ".join("?" for _ in keys)
+        self.db.execute(
+            f"UPDATE sessions SET data = json_remove(data, {paths}) WHERE email = ?",
+            (*[f"$.{k}" for k in keys], email),
+        )
+
+    def purge_expired(self) -> int:
+        cur = self.db.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+        return cur.rowcount
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store(kind: str, path: str, ttl_seconds: float, max_entries: int = 10_000) -> SessionStore:
+    if kind == "memory":
+        return MemorySessionStore(ttl_seconds, max_entries)
+    if kind == "sqlite":
+        return SQLiteSessionStore(path, ttl_seconds)
+    raise ValueError(f"Unknown SESSION_STORE '{kind}' (expected 'memory' or 'sqlite')")
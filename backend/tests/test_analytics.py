@@ -0,0 +1,58 @@
+import os
+import sys
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import analytics  # noqa: E402
+
+NEW_YORK = ZoneInfo("America/New_York")
+
+
+def local(*args) -> int:
+    return int(datetime(*args, tzinfo=NEW_YORK).timestamp())
+
+
+def orders_at(*rows):
+    """rows of (epoch seconds, total, status) as OrderColumns."""
+    page = [{"id": i, "customer_email": "a@example.com", "total": total, "status": status,
+             "created_at": datetime.fromtimestamp(ts, ZoneInfo("UTC")).isoformat()}
+            for i, (ts, total, status) in enumerate(rows)]
+    return analytics.OrderColumns([page])
+
+
+def test_daily_series_across_spring_forward():
+    # Clocks went from 02:00 to 03:00 on 2026-03-08: that day has 23 hours
+    orders = orders_at(
+        (local(2026, 3, 7, 23, 30), 10.0, "delivered"),
+        (local(2026, 3, 8, 0, 30), 20.0, "delivered"),
+        (local(2026, 3, 8, 23, 30), 40.0, "delivered"),      # 03:30 UTC on the 9th
+        (local(2026, 3, 9, 0, 30), 80.0, "delivered"),
+        (local(2026, 3, 9, 1, 0), 99.0, "cancelled"),
+    )
+    series = analytics.revenue_series(orders, local(2026, 3, 7), local(2026, 3, 10), "day", NEW_YORK)
+    assert series == [
+        {"date": "2026-03-07", "revenue": 10.0, "orders": 1},
+        {"date": "2026-03-08", "revenue": 60.0, "orders": 2},
+        {"date": "2026-03-09", "revenue": 80.0, "orders": 1},
+    ]
+
+
+def test_hourly_series_across_fall_back():
+    # 01:00-02:00 happened twice on 2026-11-01; both land in the same local hour
+    first = int(datetime(2026, 11, 1, 1, 30, tzinfo=NEW_YORK, fold=0).timestamp())
+    second = int(datetime(2026, 11, 1, 1, 30, tzinfo=NEW_YORK, fold=1).timestamp())
+    assert second - first == 3600
+    orders = orders_at((first, 5.0, "delivered"), (second, 7.0, "delivered"))
+    series = analytics.revenue_series(orders, local(2026, 11, 1, 0), local(2026, 11, 1, 3), "hour", NEW_YORK)
+    assert [(p["date"], p["orders"]) for p in series] == [
+        ("2026-11-01T00:00", 0), ("2026-11-01T01:00", 2), ("2026-11-01T02:00", 0),
+    ]
+    assert analytics.peak_hours(orders, orders.mask(), NEW_YORK)[1] == {"hour": 1, "count": 2}
+
+
+def test_fit_bucket_coarsens_long_ranges():
+    start, end = local(2020, 1, 1), local(2026, 1, 1)
+    assert analytics.fit_bucket(start, end, "day", NEW_YORK) == "week"
+    assert analytics.fit_bucket(start, local(2020, 2, 1), "hour", NEW_YORK) == "hour"
+    assert analytics.fit_bucket(local(1, 1, 2), local(9999, 12, 1), "hour", NEW_YORK) is None
@@ -0,0 +1,50 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ledger import LoyaltyLedger, SQLiteLedger  # noqa: E402
+
+
+def test_concurrent_applies_lose_no_points(tmp_path):
+    ledger = SQLiteLedger(str(tmp_path / "ledger.db"))
+
+    def earn():
+        for i in range(25):
+            ledger.apply("a@example.com", 10, "earned", f"order {i}")
+
+    threads = [threading.Thread(target=earn) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    account = ledger.account("a@example.com")
+    assert account["points_balance"] == 8 * 25 * 10
+    assert account["points_earned_total"] == 8 * 25 * 10
+    assert len(ledger.transactions("a@example.com", limit=1000)) == 8 * 25
+
+
+def test_refused_spend_moves_no_points(tmp_path):
+    ledger = SQLiteLedger(str(tmp_path / "ledger.db"))
+    first = ledger.apply("a@example.com", 100, "earned", "order 1")
+    assert first["balance"] == 100 and first["first_of_type"] is True
+    assert ledger.apply("a@example.com", 50, "earned", "order 2")["first_of_type"] is False
+
+    assert ledger.apply("a@example.com", -500, "redeemed", "too much", require_balance=True) is None
+    assert ledger.account("a@example.com")["points_balance"] == 150
+    assert [t["type"] for t in ledger.transactions("a@example.com")] == ["earned", "earned"]
+
+    spent = ledger.apply("a@example.com", -150, "redeemed", "all of it", require_balance=True)
+    assert spent["balance"] == 0 and spent["first_of_type"] is True
+
+
+def test_ledger_interface_is_abstract():
+    class Partial(LoyaltyLedger):
+        def apply(self, *args, **kwargs):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
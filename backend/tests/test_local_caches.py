@@ -0,0 +1,56 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from purchases import PurchaseIndex  # noqa: E402
+from review_stats import RatingAggregates  # noqa: E402
+
+
+def in_threads(fn, n=8):
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(fn())) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return out
+
+
+def test_changed_is_process_wide_and_ignores_own_transactions(tmp_path):
+    stats = RatingAggregates(str(tmp_path / "ratings.db"))
+    assert stats.db.changed() is True                # first call
+    assert in_threads(stats.db.changed) == [False] * 8
+    stats.record(1, 5, True)
+    assert stats.db.changed() is False
+
+
+def test_ratings_cache_follows_local_writes_and_reloads_for_other_processes(tmp_path):
+    path = str(tmp_path / "ratings.db")
+    stats = RatingAggregates(path)
+    stats.record(1, 5, True)
+    cache = stats.all()
+    assert stats.get(1)["count"] == 1
+    assert all(c is cache for c in in_threads(stats.all))  # no reload from other threads
+
+    stats.record(1, 3, False)
+    assert stats.get(1) == {"count": 2, "average": 4.0, "verified_share": 0.5,
+                            "histogram": {"1": 0, "2": 0, "3": 1, "4": 0, "5": 1}}
+
+    RatingAggregates(path).record(2, 4, False)       # another worker, its own connections
+    assert stats.get(2)["count"] == 1
+
+
+def test_purchase_cache_follows_local_writes_and_reloads_for_other_processes(tmp_path):
+    path = str(tmp_path / "purchases.db")
+    index = PurchaseIndex(path)
+    index.add("A@example.com", [1, 2])
+    index.add("a@example.com", [2])
+    assert index.products("a@example.com") == {1, 2}
+    assert in_threads(lambda: index.has_purchased("a@example.com", 1)) == [True] * 8
+
+    index.remove("a@example.com", [1, 2])
+    assert index.products("a@example.com") == {2}    # still in the other order
+
+    PurchaseIndex(path).add("a@example.com", [7])
+    assert index.has_purchased("a@example.com", 7)
@@ -0,0 +1,68 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from outbox import Outbox  # noqa: E402
+from scheduler import FakeClock  # noqa: E402
+
+
+def make(tmp_path, **kwargs):
+    clock = FakeClock(1_000_000.0)
+    box = Outbox(str(tmp_path / "outbox.db"), base_delay=10.0, lease_seconds=300.0, clock=clock, **kwargs)
+    finished = []
+    box.on_finish(lambda kind, payload, ok, outcome: finished.append((kind, payload, ok, outcome)))
+    return box, clock, finished
+
+
+def test_failed_job_is_retried_with_backoff(tmp_path):
+    box, clock, finished = make(tmp_path)
+    calls = []
+
+    @box.handler("email")
+    def send(payload):
+        calls.append(clock())
+        if len(calls) < 3:
+            raise RuntimeError("resend unavailable")
+        return "sent"
+
+    box.enqueue("email", {"to": "a@example.com"})
+    assert box.run_pending() == 1
+    assert box.counts() == {"pending": 1}
+    clock.advance(10 * 0.8 - 1)                      # earliest the first retry can be due
+    assert box.run_pending() == 0
+    clock.advance(10 * 0.4 + 1)
+    assert box.run_pending() == 1                    # second attempt, fails again
+    clock.advance(20 * 1.2)                          # backed off to twice the delay
+    assert box.run_pending() == 1
+    assert len(calls) == 3
+    assert box.counts() == {"done": 1}
+    assert finished == [("email", {"to": "a@example.com"}, True, "sent")]
+
+
+def test_job_gives_up_after_max_attempts(tmp_path):
+    box, clock, finished = make(tmp_path, max_attempts=2)
+    box.handler("sms")(lambda payload: (_ for _ in ()).throw(ValueError("bad number")))
+    box.enqueue("sms", {"to": "+0"})
+    assert box.run_pending() == 1
+    clock.advance(3600)
+    assert box.run_pending() == 1
+    clock.advance(3600)
+    assert box.run_pending() == 0
+    assert box.counts() == {"failed": 1}
+    assert finished == [("sms", {"to": "+0"}, False, "ValueError: bad number")]
+
+
+def test_lease_of_a_crashed_worker_expires(tmp_path):
+    box, clock, finished = make(tmp_path)
+    calls = []
+    box.handler("email")(calls.append)
+    box.enqueue("email", {"n": 1})
+    assert box._claim() is not None                  # claimed, then the worker dies
+
+    restarted = Outbox(str(tmp_path / "outbox.db"), lease_seconds=300.0, clock=clock)
+    restarted.handler("email")(calls.append)
+    assert restarted.run_pending() == 0              # still leased
+    clock.advance(300)
+    assert restarted.run_pending() == 1
+    assert calls == [{"n": 1}]
+    assert restarted.counts() == {"done": 1}
@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="test-reviews-")
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_KEY", "test")
+import main  # noqa: E402
+from fake_supabase import FakeSupabase  # noqa: E402
+
+
+def test_keyset_filter():
+    keys = main.REVIEW_SORTS["highest"]
+    assert main._keyset_filter(keys, [4, "2026-03-01T10:00:00+00:00", 17]) == (
+        'rating.lt."4",'
+        'and(rating.eq."4",created_at.lt."2026-03-01T10:00:00+00:00"),'
+        'and(rating.eq."4",created_at.eq."2026-03-01T10:00:00+00:00",id.lt."17")'
+    )
+
+
+def test_cursor_round_trip_and_rejects_tampering():
+    cursor = main._encode_cursor(5, "2026-03-01T10:00:00+00:00", 17)
+    assert main._decode_cursor(cursor, 3) == [5, "2026-03-01T10:00:00+00:00", 17]
+    for bad in ["not base64!", cursor[:-2], main._encode_cursor(5), main._encode_cursor('x"),id.gt.(0', 1),
+                main._encode_cursor([1], 2)]:
+        with pytest.raises(HTTPException):
+            main._decode_cursor(bad, 2)
+
+
+@pytest.mark.parametrize("sort", sorted(main.REVIEW_SORTS))
+def test_pages_cover_every_review_once_in_order(monkeypatch, sort):
+    db = FakeSupabase(0, 0)
+    # Few distinct ratings and timestamps, so most pages end in the middle of a tie
+    db.tables["product_reviews"] = [
+        {"id": i, "product_id": 1, "author_name": f"R{i}", "rating": 1 + i % 3, "review_text": "",
+         "photo_urls": [], "thumbnail_urls": [], "verified_purchase": False,
+         "created_at": f"2026-03-0{1 + i % 2}T10:00:00+00:00"}
+        for i in range(1, 24)
+    ] + [{"id": 99, "product_id": 2, "rating": 5, "created_at": "2026-03-01T10:00:00+00:00"}]
+    monkeypatch.setattr(main, "supabase", db)
+
+    seen, cursor = [], None
+    while True:
+        page = main.get_reviews(1, sort=sort, cursor=cursor, limit=4)
+        seen += page["reviews"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    expected = db.tables["product_reviews"][:-1]
+    for column, desc in reversed(main.REVIEW_SORTS[sort]):
+        expected = sorted(expected, key=lambda r: r[column], reverse=desc)
+    assert [r["id"] for r in seen] == [r["id"] for r in expected]
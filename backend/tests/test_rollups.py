@@ -0,0 +1,47 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rollups import OrderRollups  # noqa: E402
+
+DAY = "2026-03-01"
+
+
+def snapshot(rollups):
+    return (
+        rollups.stats(DAY),
+        rollups.customer_totals(["a@example.com"]),
+        rollups.top_city_products("Pune", 10),
+    )
+
+
+def test_transition_in_and_out_of_cancelled(tmp_path):
+    r = OrderRollups(str(tmp_path / "rollups.db"))
+    r.record_new(DAY, "confirmed", 100.0, "a@example.com", f"{DAY}T10:00:00+00:00", "Pune", [1, 2])
+    r.record_new(DAY, "confirmed", 40.0, "a@example.com", f"{DAY}T11:00:00+00:00", "Pune", [2])
+
+    r.record_transition(DAY, "confirmed", "cancelled", 100.0, "a@example.com", "Pune", [1, 2])
+    stats, customers, cities = snapshot(r)
+    assert stats["total_orders"] == 2 and stats["pending_count"] == 1
+    assert stats["revenue_total"] == 40.0 and stats["revenue_today"] == 40.0
+    assert customers["a@example.com"][:2] == (2, 40.0)      # still counted as an order, not as spend
+    assert cities == [(2, 1)]
+
+    r.record_transition(DAY, "cancelled", "preparing", 100.0, "a@example.com", "Pune", [1, 2])
+    stats, customers, cities = snapshot(r)
+    assert stats["revenue_total"] == 140.0 and stats["pending_count"] == 2
+    assert customers["a@example.com"][:2] == (2, 140.0)
+    assert cities == [(2, 2), (1, 1)]
+
+
+def test_transitions_match_a_rebuild(tmp_path):
+    r = OrderRollups(str(tmp_path / "rollups.db"))
+    r.record_new(DAY, "confirmed", 100.0, "a@example.com", f"{DAY}T10:00:00+00:00", "Pune", [1])
+    r.record_transition(DAY, "confirmed", "cancelled", 100.0, "a@example.com", "Pune", [1])
+    r.record_transition(DAY, "cancelled", "delivered", 100.0, "a@example.com", "Pune", [1])
+    r.record_transition(DAY, "delivered", "delivered", 100.0, "a@example.com", "Pune", [1])
+    incremental = snapshot(r)
+
+    r.rebuild([{"id": 7, "customer_email": "a@example.com", "status": "delivered", "total": 100.0,
+                "created_at": f"{DAY}T10:00:00+00:00", "city": "Pune"}], {7: [1]})
+    assert snapshot(r) == incremental
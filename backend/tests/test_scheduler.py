@@ -0,0 +1,79 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scheduler import FakeClock, Scheduler  # noqa: E402
+
+
+def make(tmp_path):
+    clock = FakeClock(1_000_000.0)
+    return Scheduler(str(tmp_path / "scheduler.db"), clock=clock), clock
+
+
+def test_fires_due_event_once(tmp_path):
+    s, clock = make(tmp_path)
+    calls = []
+    s.handler("ping")(calls.append)
+    s.schedule("ping:1", "ping", clock() + 10, {"n": 1})
+    assert s.run_due() == 0
+    clock.advance(10)
+    assert s.run_due() == 1
+    assert calls == [{"n": 1}]
+    clock.advance(10_000)
+    assert s.run_due() == 0
+    assert s.pending() == []
+
+
+def test_failing_handler_is_retried_with_backoff(tmp_path):
+    s, clock = make(tmp_path)
+    calls = []
+
+    @s.handler("roll")
+    def roll(payload):
+        calls.append(clock())
+        if len(calls) < 3:
+            raise RuntimeError("supabase unavailable")
+
+    s.schedule("sub:1:delivery", "roll", clock(), {"id": 1})
+    assert s.run_due() == 1
+    assert [key for key, _, _ in s.pending()] == ["sub:1:delivery"]
+
+    clock.advance(Scheduler.RETRY_SECONDS - 1)
+    assert s.run_due() == 0
+    clock.advance(1)
+    assert s.run_due() == 1                          # second attempt, fails again
+    clock.advance(Scheduler.RETRY_SECONDS)
+    assert s.run_due() == 0                          # backed off to twice the delay
+    clock.advance(Scheduler.RETRY_SECONDS)
+    assert s.run_due() == 1                          # third attempt succeeds
+    assert len(calls) == 3
+    assert s.pending() == []
+
+
+def test_lease_survives_restart(tmp_path):
+    s, clock = make(tmp_path)
+    s.handler("roll")(lambda payload: (_ for _ in ()).throw(RuntimeError("boom")))
+    s.schedule("corp:1:delivery", "roll", clock())
+    s.run_due()
+
+    calls = []
+    restarted = Scheduler(str(tmp_path / "scheduler.db"), clock=clock)
+    restarted.handler("roll")(calls.append)
+    assert restarted.run_due() == 0                  # still leased
+    clock.advance(Scheduler.RETRY_SECONDS)
+    assert restarted.run_due() == 1
+    assert calls == [{}]
+
+
+def test_handler_rescheduling_its_own_key_keeps_the_new_event(tmp_path):
+    s, clock = make(tmp_path)
+
+    @s.handler("roll")
+    def roll(payload):
+        s.cancel_prefix("sub:1:")
+        s.schedule("sub:1:delivery", "roll", clock() + 86400, {"n": payload["n"] + 1})
+
+    s.schedule("sub:1:delivery", "roll", clock(), {"n": 1})
+    assert s.run_due() == 1
+    assert s.pending() == [("sub:1:delivery", "roll", clock() + 86400)]
+    assert s.next_due() == clock() + 86400
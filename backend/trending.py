@@ -0,0 +1,98 @@
+"""Sliding-window product popularity, kept in memory.
+
+``TrendingCounter`` counts how often each product was ordered over the last
+``window_hours`` hours, in hourly buckets. Orders are added as they are placed
+and removed again if cancelled; whole buckets fall out of the running totals as
+the window slides, so ``top()`` never touches the database and only sorts the
+handful of products with a non-zero count.
+
+Each process has its own counter. Rebuild it from the database at startup, and
+periodically if several workers serve traffic, so orders placed on another
+worker are picked up.
+"""
+import heapq
+import threading
+import time
+from collections import Counter
+from typing import Callable, Iterable, Optional
+
+
+class TrendingCounter:
+    def __init__(self, window_hours: int = 168, clock: Callable[[], float] = time.time):
+        self.window_hours = window_hours
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._buckets: dict = {}      # hour -> Counter of product ids
+        self._bucket_orders: dict = {}  # hour -> [order ids]
+        self._orders: dict = {}       # order id -> (hour, [product ids])
+        self._totals: Counter = Counter()
+        self._top: Optional[list] = None
+        self._expired_at: Optional[int] = None
+
+    # ── Window upkeep ────────────────────────────────────────────────────────
+    def _expire(self, now_hour: int):
+        if now_hour == self._expired_at:
+            return
+        self._expired_at = now_hour
+        oldest = now_hour - self.window_hours + 1
+        expired = [h for h in self._buckets if h < oldest]
+        for hour in expired:
+            self._totals.subtract(self._buckets.pop(hour))
+            for order_id in self._bucket_orders.pop(hour, ()):
+                self._orders.pop(order_id, None)
+        if expired:
+            self._totals = +self._totals  # drop zero counts
+            self._top = None
+
+    def _add(self, order_id: str, product_ids: list, at: float, now_hour: int):
+        hour = int(at // 3600)
+        if hour < now_hour - self.window_hours + 1 or order_id in self._orders or not product_ids:
+            return
+        counts = Counter(product_ids)
+        self._buckets.setdefault(hour, Counter()).update(counts)
+        self._bucket_orders.setdefault(hour, []).append(order_id)
+        self._orders[order_id] = (hour, list(product_ids))
+        self._totals.update(counts)
+        self._top = None
+
+    # ── Updates ──────────────────────────────────────────────────────────────
+    def add(self, order_id: str, product_ids: list, at: Optional[float] = None):
+        """Count an order's products (one per order line) at time `at` (default now)."""
+        now_hour = int(self.clock() // 3600)
+        with self._lock:
+            self._expire(now_hour)
+            self._add(order_id, product_ids, self.clock() if at is None else at, now_hour)
+
+    def remove(self, order_id: str):
+        """Uncount a cancelled order; a no-op if it is unknown or already outside the window."""
+        with self._lock:
+            entry = self._orders.pop(order_id, None)
+            if entry is None:
+                return
+            hour, product_ids = entry
+            counts = Counter(product_ids)
+            self._buckets[hour].subtract(counts)
+            self._totals.subtract(counts)
+            self._totals = +self._totals
+            self._top = None
+
+    def rebuild(self, orders: Iterable[tuple]):
+        """Replace all counts with `orders`: (order_id, created_at epoch, [product ids])."""
+        now_hour = int(self.clock() // 3600)
+        with self._lock:
+            self._reset()
+            for order_id, at, product_ids in orders:
+                self._add(order_id, product_ids, at, now_hour)
+
+    # ── Reads ────────────────────────────────────────────────────────────────
+    def top(self, k: int) -> list:
+        """[(product_id, count)] for the `k` most ordered products, highest first."""
+        now_hour = int(self.clock() // 3600)
+        with self._lock:
+            self._expire(now_hour)
+            if self._top is None or len(self._top) < min(k, len(self._totals)):
+                self._top = heapq.nlargest(k, self._totals.items(), key=lambda kv: kv[1])
+            return self._top[:k]
@@ -0,0 +1,196 @@
+"""Concurrent, rate-limited SMS/WhatsApp sending.
+
+``Dispatcher`` runs its own asyncio loop on a background thread, so sync
+request handlers and outbox workers can hand it a batch of messages and block
+only until that batch is done. Inside the loop:
+
+* every message of a batch is sent concurrently (SMS and WhatsApp go out together);
+* a ``TokenBucket`` shared by the whole process keeps sends under the
+  account's messages-per-second limit;
+* 429 and 5xx responses (and network errors) are retried with jittered
+  exponential backoff, honouring Retry-After when Twilio sends one.
+
+A transport does the actual API call: ``SDKTransport`` wraps the Twilio client,
+``FakeTransport`` is an in-process stand-in for tests and benchmarks.
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Optional
+
+from twilio.base.exceptions import TwilioRestException
+
+
+class SendError(Exception):
+    def __init__(self, status: Optional[int], message: str = "", retry_after: Optional[float] = None):
+        super().__init__(message or f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self._tokens = burst
+        self._stamp = clock()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = self.clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SDKTransport:
+    """Sends through the (blocking) Twilio SDK client on the default thread pool."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def send(self, body: str, from_: str, to: str) -> str:
+        try:
+            msg = await asyncio.to_thread(self.client.messages.create, body=body, from_=from_, to=to)
+        except TwilioRestException as e:
+            raise SendError(e.status, e.msg) from e
+        except OSError as e:
+            raise SendError(None, str(e)) from e
+        return msg.sid
+
+
+class FakeTransport:
+    """In-process Twilio stand-in with configurable latency, rate limit and error rate."""
+
+    def __init__(self, latency: float = 0.05, rate_limit: Optional[float] = None,
+                 error_rate: float = 0.0, seed: int = 1):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.sent: list = []
+        self.rejected = {429: 0, 500: 0}
+        self._rng = random.Random(seed)
+        self._window: list = []
+
+    async def send(self, body: str, from_: str, to: str) -> str:
+        now = time.monotonic()
+        if self.rate_limit is not None:
+            self._window = [t for t in self._window if now - t < 1.0]
+            if len(self._window) >= self.rate_limit:
+                self.rejected[429] += 1
+                raise SendError(429, "Too Many Requests", retry_after=None)
+            self._window.append(now)
+        await asyncio.sleep(self.latency)
+        if self._rng.random() < self.error_rate:
+            self.rejected[500] += 1
+            raise SendError(500, "Internal Server Error")
+        self.sent.append((from_, to, body))
+        return f"SM{len(self.sent):032d}"
+
+
+class Dispatcher:
+    def __init__(self, transport, rate: float = 10.0, burst: float = 10.0, max_attempts: int = 4,
+                 base_delay: float = 0.5, max_delay: float = 8.0):
+        self.transport = transport
+        self.bucket = TokenBucket(rate, burst)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.counters = {"sent": 0, "failed": 0, "retries": 0, "throttled": 0}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    # ── Event loop thread ────────────────────────────────────────────────────
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name="twilio-dispatch", daemon=True)
+                self._thread.start()
+                self._loop = loop
+        return self._loop
+
+    def stop(self):
+        with self._start_lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(5)
+                self._loop.close()
+                self._loop = None
+
+    # ── Sending ──────────────────────────────────────────────────────────────
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after:
+            return retry_after
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(delay / 2, delay)
+
+    async def _send_one(self, msg: dict) -> dict:
+        result = {**msg, "sent": False, "attempts": 0, "error": None, "retryable": False}
+        if self.transport is None or not msg.get("from_"):
+            result["error"] = "not configured"
+            return result
+        for attempt in range(1, self.max_attempts + 1):
+            await self.bucket.acquire()
+            result["attempts"] = attempt
+            try:
+                result["sid"] = await self.transport.send(msg["body"], msg["from_"], msg["to"])
+                result["sent"] = True
+                self.counters["sent"] += 1
+                return result
+            except SendError as e:
+                result["error"] = str(e)
+                if e.status == 429:
+                    self.counters["throttled"] += 1
+                if not e.retryable or attempt == self.max_attempts:
+                    result["retryable"] = e.retryable
+                    break
+                self.counters["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt, e.retry_after))
+            except Exception as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+                break
+        self.counters["failed"] += 1
+        return result
+
+    async def _send_all(self, messages: list) -> list:
+        return list(await asyncio.gather(*[self._send_one(m) for m in messages]))
+
+    def submit(self, messages: list):
+        """Schedule a batch on the dispatcher loop; returns a concurrent.futures.Future of results."""
+        return asyncio.run_coroutine_threadsafe(self._send_all(messages), self._ensure_loop())
+
+    def send_batch(self, messages: list, timeout: Optional[float] = None) -> list:
+        """Send `messages` ({"channel", "from_", "to", "body"} dicts) concurrently; blocks until done.
+
+        Each result is the message plus ``sent``, ``attempts``, ``error`` and
+        ``retryable`` (it failed on a 429/5xx even after the last attempt).
+        """
+        if not messages:
+            return []
+        return self.submit(messages).result(timeout)
+
+    async def asend_batch(self, messages: list) -> list:
+        """``send_batch`` for callers already running on another event loop."""
+        if not messages:
+            return []
+        return await asyncio.wrap_future(self.submit(messages))
+
+    def stats(self) -> dict:
+        return {**self.counters, "rate_per_second": self.bucket.rate, "burst": self.bucket.burst}
@@ -36,32 +36,29 @@ export class Admin implements OnInit {
   // ── Orders ─────────────────────────────────────────────────────────────────
   orders = signal<any[]>([]);
   loadingOrders = signal(true);
+  loadingMore = signal(false);
+  nextCursor = signal<string | null>(null);
+  facets = signal<Record<string, number>>({});
   loadError = signal('');
   activeTab = signal(sessionStorage.getItem('admin_tab') || 'all');
   updatingId = signal<string | null>(null);
   searchQuery = signal('');
   selectedDate = signal('');
 
+  // Tab and date are filtered server-side; the tab check here only hides orders whose status changed after loading.
   visibleOrders = computed(() => {
     const tab = this.activeTab();
     const q = this.searchQuery().trim().toLowerCase();
-    const date = this.selectedDate();
     let list = tab === 'all' ? this.orders() : this.orders().filter(o => o.status === tab);
     if (q) list = list.filter(o =>
       (o.id || '').toLowerCase().includes(q) ||
       (o.customer_name || '').toLowerCase().includes(q) ||
       (o.customer_email || '').toLowerCase().includes(q)
     );
-    if (date) list = list.filter(o => (o.created_at || '').startsWith(date));
     return list;
   });
 
-  tabCount = computed(() => {
-    const all = this.orders();
-    const counts: Record<string, number> = { all: all.length };
-    for (const o of all) counts[o.status] = (counts[o.status] || 0) + 1;
-    return counts;
-  });
+  tabCount = computed(() => this.facets());
 
   readonly tabs = [
     { key: 'all', label: 'All' },
@@ -99,14 +96,12 @@ export class Admin implements OnInit {
   // ── Customers ──────────────────────────────────────────────────────────────
   customers = signal<any[]>([]);
   loadingCustomers = signal(true);
+  loadingMoreCustomers = signal(false);
   customerSearch = signal('');
-  filteredCustomers = computed(() => {
-    const q = this.customerSearch().toLowerCase();
-    return q ? this.customers().filter(c =>
-      (c.first_name + ' ' + c.last_name).toLowerCase().includes(q) ||
-      (c.email || '').toLowerCase().includes(q)
-    ) : this.customers();
-  });
+  customerSort = signal<'joined' | 'spend' | 'recent'>('joined');
+  customerTotal = signal(0);
+  customersCursor = signal<string | null>(null);
+  private customerSearchTimer: any = null;
 
   // ── Analytics ─────────────────────────────────────────────────────────────
   analytics = signal<any>(null);
@@ -163,11 +158,24 @@ export class Admin implements OnInit {
     });
   }
 
+  private ordersUrl(cursor?: string): string {
+    let url = `${environment.apiUrl}/api/admin/orders?token=${this.token}`;
+    if (this.activeTab() !== 'all') url += `&status=${this.activeTab()}`;
+    if (this.selectedDate()) url += `&from=${this.selectedDate()}&to=${this.selectedDate()}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    return url;
+  }
+
   loadOrders(): void {
     this.loadingOrders.set(true);
     this.loadError.set('');
-    this.http.get<any[]>(`${environment.apiUrl}/api/admin/orders?token=${this.token}`).subscribe({
-      next: (data) => { this.orders.set(data); this.loadingOrders.set(false); },
+    this.http.get<any>(this.ordersUrl()).subscribe({
+      next: (data) => {
+        this.orders.set(data.orders);
+        this.nextCursor.set(data.next_cursor);
+        this.facets.set(data.facets || {});
+        this.loadingOrders.set(false);
+      },
       error: (err) => {
         this.loadingOrders.set(false);
         if (err.status === 401) this.loadError.set('Session expired. Please log out and back in.');
@@ -177,6 +185,30 @@ export class Admin implements OnInit {
     });
   }
 
+  loadMoreOrders(): void {
+    const cursor = this.nextCursor();
+    if (!cursor || this.loadingMore()) return;
+    this.loadingMore.set(true);
+    this.http.get<any>(this.ordersUrl(cursor)).subscribe({
+      next: (data) => {
+        this.orders.update(list => [...list, ...data.orders]);
+        this.nextCursor.set(data.next_cursor);
+        this.loadingMore.set(false);
+      },
+      error: () => { this.loadingMore.set(false); this.toastService.show('Could not load more orders.'); }
+    });
+  }
+
+  setTab(tab: string): void {
+    this.activeTab.set(tab);
+    this.loadOrders();
+  }
+
+  setDate(date: string): void {
+    this.selectedDate.set(date);
+    this.loadOrders();
+  }
+
   refresh(): void {
     this.loadStats();
     this.loadOrders();
@@ -187,6 +219,7 @@ export class Admin implements OnInit {
     this.http.patch<{ status: string }>(`${environment.apiUrl}/api/orders/${order.id}/status`, { status: newStatus }).subscribe({
       next: (res) => {
         this.orders.update(list => list.map(o => o.id === order.id ? { ...o, status: res.status } : o));
+        this.facets.update(f => ({ ...f, [order.status]: (f[order.status] || 1) - 1, [res.status]: (f[res.status] || 0) + 1 }));
         this.loadStats();
         this.updatingId.set(null);
         this.toastService.show(`Order ${order.id} → ${this.STATUS_LABELS[res.status]}`);
@@ -230,14 +263,52 @@ export class Admin implements OnInit {
   }
 
   // ── Customers ────────────────────────────────────────────────────────────
+  private customersUrl(cursor?: string): string {
+    let url = `${environment.apiUrl}/api/admin/customers?token=${this.token}&sort=${this.customerSort()}`;
+    const q = this.customerSearch().trim();
+    if (q) url += `&q=${encodeURIComponent(q)}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    return url;
+  }
+
   loadCustomers(): void {
     this.loadingCustomers.set(true);
-    this.http.get<any[]>(`${environment.apiUrl}/api/admin/customers?token=${this.token}`).subscribe({
-      next: (data) => { this.customers.set(data || []); this.loadingCustomers.set(false); },
+    this.http.get<any>(this.customersUrl()).subscribe({
+      next: (data) => {
+        this.customers.set(data.customers || []);
+        this.customersCursor.set(data.next_cursor);
+        this.customerTotal.set(data.total || 0);
+        this.loadingCustomers.set(false);
+      },
       error: () => this.loadingCustomers.set(false)
     });
   }
 
+  loadMoreCustomers(): void {
+    const cursor = this.customersCursor();
+    if (!cursor || this.loadingMoreCustomers()) return;
+    this.loadingMoreCustomers.set(true);
+    this.http.get<any>(this.customersUrl(cursor)).subscribe({
+      next: (data) => {
+        this.customers.update(list => [...list, ...(data.customers || [])]);
+        this.customersCursor.set(data.next_cursor);
+        this.loadingMoreCustomers.set(false);
+      },
+      error: () => this.loadingMoreCustomers.set(false)
+    });
+  }
+
+  searchCustomers(q: string): void {
+    this.customerSearch.set(q);
+    clearTimeout(this.customerSearchTimer);
+    this.customerSearchTimer = setTimeout(() => this.loadCustomers(), 300);
+  }
+
+  sortCustomers(sort: 'joined' | 'spend' | 'recent'): void {
+    this.customerSort.set(sort);
+    this.loadCustomers();
+  }
+
   // ── Analytics ────────────────────────────────────────────────────────────
   loadAnalytics(): void {
     this.loadingAnalytics.set(true);
@@ -376,7 +447,7 @@ export class Admin implements OnInit {
     return `${h12}${suffix}`;
   }
 
-  clearDate(): void { this.selectedDate.set(''); }
+  clearDate(): void { this.setDate(''); }
 
   itemCount(order: any): number { return (order.items || []).length; }
 }
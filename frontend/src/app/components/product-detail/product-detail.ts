@@ -37,6 +37,10 @@ export class ProductDetail implements OnInit {
 
   // ── Review state ────────────────────────────────────────────────────────────
   loadingReviews  = signal(true);
+  loadingMoreReviews = signal(false);
+  reviewSort: 'newest' | 'oldest' | 'highest' | 'lowest' = 'newest';
+  reviewCursor: string | null = null;
+  reviewSummary: { count: number; average: number; histogram: Record<string, number> } | null = null;
   submittingReview = signal(false);
   reviewSubmitted = signal(false);
   canReviewStatus = signal<{ can_review: boolean; has_purchased: boolean; already_reviewed: boolean } | null>(null);
@@ -45,7 +49,7 @@ export class ProductDetail implements OnInit {
   reviewForm = {
     rating: 5,
     text: '',
-    photos: [] as { preview: string; b64: string }[]
+    photos: [] as { preview: string; blob: Blob }[]
   };
 
   constructor(
@@ -163,13 +167,22 @@ export class ProductDetail implements OnInit {
     this.toastService.show('Items added to cart!');
   }
 
+  get reviewCount(): number {
+    return this.reviewSummary?.count ?? this.reviews.length;
+  }
+
   get avgRating(): number {
+    if (this.reviewSummary) return this.reviewSummary.average;
     if (!this.reviews.length) return this.product?.rating ?? 0;
     return this.reviews.reduce((sum, r) => sum + r.rating, 0) / this.reviews.length;
   }
 
   get ratingCounts(): number[] {
     const counts = [0, 0, 0, 0, 0]; // index 0 = 5★, index 4 = 1★
+    if (this.reviewSummary) {
+      for (let n = 1; n <= 5; n++) counts[5 - n] = this.reviewSummary.histogram[n] ?? 0;
+      return counts;
+    }
     for (const r of this.reviews) {
       counts[5 - r.rating]++;
     }
@@ -185,11 +198,14 @@ export class ProductDetail implements OnInit {
   }
 
   // ── Review methods ───────────────────────────────────────────────────────────
-  loadReviews(productId: number): void {
-    this.loadingReviews.set(true);
-    this.http.get<any[]>(`${environment.apiUrl}/api/reviews?product_id=${productId}`).subscribe({
+  loadReviews(productId: number, more = false): void {
+    if (more && !this.reviewCursor) return;
+    (more ? this.loadingMoreReviews : this.loadingReviews).set(true);
+    let url = `${environment.apiUrl}/api/reviews?product_id=${productId}&sort=${this.reviewSort}`;
+    if (more) url += `&cursor=${encodeURIComponent(this.reviewCursor!)}`;
+    this.http.get<any>(url).subscribe({
       next: (data) => {
-        this.reviews = (data || []).map(r => ({
+        const page = (data?.reviews || []).map((r: any) => ({
           id: r.id,
           author: r.author_name,
           avatar: `https://ui-avatars.com/api/?name=${encodeURIComponent(r.author_name)}&background=6366f1&color=fff&size=60&bold=true`,
@@ -197,17 +213,32 @@ export class ProductDetail implements OnInit {
           date: new Date(r.created_at).toLocaleDateString('en-IN', { day: 'numeric', month: 'short', year: 'numeric' }),
           text: r.review_text,
           photos: r.photo_urls || [],
+          thumbnails: r.thumbnail_urls || [],
           verified: r.verified_purchase
         }));
+        this.reviews = more ? [...this.reviews, ...page] : page;
+        this.reviewCursor = data?.next_cursor ?? null;
+        if (data?.summary) this.reviewSummary = data.summary;
         this.loadingReviews.set(false);
+        this.loadingMoreReviews.set(false);
       },
       error: () => {
-        this.reviews = this.extrasService.getReviews(productId);
+        if (!more) {
+          this.reviews = this.extrasService.getReviews(productId);
+          this.reviewSummary = null;
+          this.reviewCursor = null;
+        }
         this.loadingReviews.set(false);
+        this.loadingMoreReviews.set(false);
       }
     });
   }
 
+  changeReviewSort(sort: 'newest' | 'oldest' | 'highest' | 'lowest'): void {
+    this.reviewSort = sort;
+    if (this.product) this.loadReviews(this.product.id);
+  }
+
   loadCanReview(productId: number): void {
     const email = this.authService.user()?.email;
     if (!email) return;
@@ -239,7 +270,7 @@ export class ProductDetail implements OnInit {
     this.reviewForm.photos.splice(i, 1);
   }
 
-  private compressImage(file: File): Promise<{ preview: string; b64: string }> {
+  private compressImage(file: File): Promise<{ preview: string; blob: Blob }> {
     return new Promise((resolve) => {
       const img = new Image();
       const url = URL.createObjectURL(file);
@@ -251,8 +282,8 @@ export class ProductDetail implements OnInit {
         const canvas = document.createElement('canvas');
         canvas.width = w; canvas.height = h;
         canvas.getContext('2d')!.drawImage(img, 0, 0, w, h);
-        const dataUrl = canvas.toDataURL('image/jpeg', 0.82);
-        resolve({ preview: dataUrl, b64: dataUrl.split(',')[1] });
+        canvas.toBlob(blob => resolve({ preview: canvas.toDataURL('image/jpeg', 0.6), blob: blob! }),
+                      'image/jpeg', 0.82);
       };
       img.src = url;
     });
@@ -267,10 +298,13 @@ export class ProductDetail implements OnInit {
       user_email: user.email,
       author_name: `${user.firstName} ${(user.lastName ?? '').charAt(0)}.`.trim(),
       rating: this.reviewForm.rating,
-      review_text: this.reviewForm.text,
-      photo_b64_list: this.reviewForm.photos.map(p => p.b64)
+      review_text: this.reviewForm.text
     };
-    this.http.post<any>(`${environment.apiUrl}/api/reviews`, body).subscribe({
+    // Multipart: photos go up as binary file parts instead of base64 inside JSON
+    const form = new FormData();
+    for (const [key, value] of Object.entries(body)) form.append(key, String(value));
+    this.reviewForm.photos.forEach((p, i) => form.append('photos', p.blob, `photo-${i}.jpg`));
+    this.http.post<any>(`${environment.apiUrl}/api/reviews/upload`, form).subscribe({
       next: (saved) => {
         this.submittingReview.set(false);
         this.reviewSubmitted.set(true);
@@ -286,6 +320,15 @@ export class ProductDetail implements OnInit {
           photos: this.reviewForm.photos.map(p => p.preview),
           verified: saved.verified_purchase ?? false
         }, ...this.reviews];
+        if (this.reviewSummary) {
+          const s = this.reviewSummary;
+          const histogram = { ...s.histogram, [body.rating]: (s.histogram[body.rating] ?? 0) + 1 };
+          this.reviewSummary = {
+            count: s.count + 1,
+            average: (s.average * s.count + body.rating) / (s.count + 1),
+            histogram
+          };
+        }
         this.reviewForm = { rating: 5, text: '', photos: [] };
         this.toastService.show('Review submitted! Thank you 🌸');
       },
@@ -16,6 +16,7 @@ export interface Review {
   date: string;
   text: string;
   photos?: string[];
+  thumbnails?: string[];
   verified: boolean;
 }
 